@@ -1,12 +1,22 @@
 from genanki.version import __version__ as __version__
 
+from genanki.batch import NoteBatch as NoteBatch
 from genanki.card import Card as Card
 from genanki.deck import Deck as Deck
+from genanki.deck import DuplicatePolicy as DuplicatePolicy
 from genanki.model import Model as Model
+from genanki.model import GuidStrategy as GuidStrategy
+from genanki.model import HtmlValidation as HtmlValidation
+from genanki.media import MediaFile as MediaFile
 from genanki.note import Note as Note
+from genanki.note import note_process_pool as note_process_pool
+from genanki.note import register_models as register_models
 from genanki.package import Package as Package
+from genanki.registry import IdRegistry as IdRegistry
+from genanki.store import NoteStore as NoteStore
 
 from genanki.util import guid_for as guid_for
+from genanki.util import guid_for_many as guid_for_many
 
 from genanki.builtin_models import BASIC_MODEL as BASIC_MODEL
 from genanki.builtin_models import (
@@ -0,0 +1,161 @@
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+import dataclasses
+from typing import Any, Protocol
+
+import attrs
+from attrs import define, field
+
+from anki import notes_pb2
+
+from genanki.model import FieldSpec, GuidStrategy, HtmlValidation, VirtualModel
+from genanki.note import Tag, _intern_tags, check_invalid_html_tags_in_values
+from genanki.util import guid_for_many
+
+
+class SupportsColumns(Protocol):
+    """A pandas DataFrame, or anything else that can be indexed by column name."""
+
+    def __getitem__(self, key: str, /) -> Any: ...
+
+
+def _to_list(column: Iterable[Any]) -> list[Any]:
+    # NumPy arrays and pandas Series convert to plain lists much faster than iterating them element by element
+    tolist: Callable[[], list[Any]] | None = getattr(column, "tolist", None)
+    return tolist() if tolist is not None else list(column)
+
+
+def _convert_columns(columns: Mapping[str, Iterable[str]]) -> dict[str, list[str]]:
+    return {name: _to_list(column) for name, column in columns.items()}
+
+
+def _convert_tags(tags: Iterable[str | Iterable[Tag | str]]) -> list[tuple[Tag, ...]]:
+    # a str entry holds all of that note's tags separated by spaces, as in Anki's notes table
+    return [_intern_tags(entry.split() if isinstance(entry, str) else entry) for entry in _to_list(tags)]
+
+
+@define(kw_only=True)
+class NoteBatch:
+    """
+    Many notes of a single model, stored as one column per field instead of one `Note` object per note.
+
+    `columns` maps every attribute name of the model's FieldSpec to that field's values, in any order; lists, NumPy
+    string arrays and pandas Series all work. `tags`, `guids`, `due` and `keys` (source keys, see `IdRegistry`) are
+    optional per-note columns. Validation, guid computation and card generation all run a column at a time.
+    """
+
+    model: VirtualModel[Any] = field()
+    columns: dict[str, list[str]] = field(converter=_convert_columns)
+    tags: list[tuple[Tag, ...]] | None = field(default=None, converter=attrs.converters.optional(_convert_tags))
+    guids: list[str] | None = field(default=None, converter=attrs.converters.optional(_to_list))
+    due: list[int] | None = field(default=None, converter=attrs.converters.optional(_to_list))
+    keys: list[str] | None = field(default=None, converter=attrs.converters.optional(_to_list))
+
+    _computed_guids: list[str] | None = field(default=None, init=False, repr=False, eq=False)
+
+    def __attrs_post_init__(self):
+        names = [f.name for f in dataclasses.fields(self.model.model_spec.fields)]
+        if sorted(names) != sorted(self.columns):
+            raise ValueError(
+                f"NoteBatch columns {list(self.columns)} do not match the fields of {self.model.name!r}: {names}"
+            )
+        # keep the columns in field order, so that zipping them gives rows in the order Anki expects
+        self.columns = {name: self.columns[name] for name in names}
+
+        length = len(self)
+        for name, column in [
+            *self.columns.items(), ("tags", self.tags), ("guids", self.guids), ("due", self.due), ("keys", self.keys),
+        ]:
+            if column is not None and len(column) != length:
+                raise ValueError(f"NoteBatch column {name!r} has {len(column)} values, expected {length}")
+
+        if self.model.html_validation is HtmlValidation.EAGER:
+            self.check_invalid_html_tags()
+
+    @classmethod
+    def from_frame(
+        cls,
+        model: VirtualModel[Any],
+        frame: SupportsColumns,
+        *,
+        fields: Mapping[str, str] | None = None,
+        tags: str | None = None,
+        guid: str | None = None,
+        due: str | None = None,
+        key: str | None = None,
+    ) -> "NoteBatch":
+        """
+        Build a batch from the columns of a pandas DataFrame (or a dict of columns).
+
+        `fields` maps FieldSpec attribute names to column names and defaults to using the attribute names directly.
+        `tags`, `guid`, `due` and `key` name optional columns holding those values.
+        """
+        names = [f.name for f in dataclasses.fields(model.model_spec.fields)]
+        fields = fields or {name: name for name in names}
+        return cls(
+            model=model,
+            columns={name: frame[fields[name]] for name in names},
+            tags=frame[tags] if tags is not None else None,
+            guids=frame[guid] if guid is not None else None,
+            due=frame[due] if due is not None else None,
+            keys=frame[key] if key is not None else None,
+        )
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ()))
+
+    def select(self, indices: Sequence[int]) -> "NoteBatch":
+        """A batch of just the notes at `indices`, keeping their guids."""
+        def pick[T](column: list[T]) -> list[T]:
+            return [column[i] for i in indices]
+
+        return NoteBatch(
+            model=self.model,
+            columns={name: pick(column) for name, column in self.columns.items()},
+            tags=pick(self.tags) if self.tags is not None else None,
+            guids=pick(self.compute_guids()),
+            due=pick(self.due) if self.due is not None else None,
+            keys=pick(self.keys) if self.keys is not None else None,
+        )
+
+    def rows(self) -> Iterator[tuple[str, ...]]:
+        """The field values of each note, like `FieldSpec.values()`."""
+        return zip(*self.columns.values())
+
+    def check_invalid_html_tags(self, *, max_workers: int | None = None) -> None:
+        check_invalid_html_tags_in_values(
+            (value for column in self.columns.values() for value in column), max_workers=max_workers,
+        )
+
+    def _field_specs(self) -> Iterator[FieldSpec]:
+        fields_cls = self.model.model_spec.fields
+        names = list(self.columns)
+        return (fields_cls(**dict(zip(names, row))) for row in self.rows())
+
+    def compute_guids(self) -> list[str]:
+        """The guid of each note: the `guids` column if given, else derived per the model's guid strategy."""
+        if self.guids is not None:
+            return self.guids
+
+        if self._computed_guids is None:
+            strategy = self.model.guid_strategy
+            if strategy is GuidStrategy.VALUES:
+                self._computed_guids = guid_for_many(self.rows())
+            elif isinstance(strategy, tuple):
+                self._computed_guids = guid_for_many(zip(*(self.columns[name] for name in strategy)))
+            elif strategy is GuidStrategy.REPR:
+                self._computed_guids = guid_for_many((fields,) for fields in self._field_specs())
+            else:
+                self._computed_guids = [strategy(fields) for fields in self._field_specs()]
+
+        return self._computed_guids
+
+    def reqs(self) -> Iterator[notes_pb2.Note]:
+        notetype_id = self.model.model_id or 0
+        tags = self.tags if self.tags is not None else [()] * len(self)
+        for values, guid, note_tags in zip(self.rows(), self.compute_guids(), tags):
+            yield notes_pb2.Note(
+                fields=values,
+                guid=guid,
+                notetype_id=notetype_id,
+                tags=[str(tag) for tag in note_tags],
+            )
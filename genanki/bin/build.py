@@ -0,0 +1,182 @@
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+import contextlib
+import csv
+import dataclasses
+import functools
+import importlib
+import itertools
+import json
+from pathlib import Path
+import sys
+from typing import Any, Literal, TextIO
+
+import tyro
+
+from genanki import builtin_models
+from genanki.batch import NoteBatch
+from genanki.deck import Deck
+from genanki.model import Model
+from genanki.package import PackageWriter
+
+type Format = Literal["csv", "tsv", "jsonl"]
+
+BUILTIN_MODELS: dict[str, Model[Any]] = {
+    "basic": builtin_models.BASIC_MODEL,
+    "basic-and-reversed": builtin_models.BASIC_AND_REVERSED_CARD_MODEL,
+    "basic-optional-reversed": builtin_models.BASIC_OPTIONAL_REVERSED_CARD_MODEL,
+    "basic-type-in-the-answer": builtin_models.BASIC_TYPE_IN_THE_ANSWER_MODEL,
+    "cloze": builtin_models.CLOZE_MODEL,
+}
+
+
+def load_model(ref: str) -> Model[Any]:
+    """Resolve the name of a builtin model, or a "package.module:ATTRIBUTE" reference to a model."""
+    if ref in BUILTIN_MODELS:
+        return BUILTIN_MODELS[ref]
+
+    module, sep, attr = ref.partition(":")
+    if not sep:
+        raise ValueError(f"Expected one of {sorted(BUILTIN_MODELS)} or module:attribute, got {ref!r}")
+    return getattr(importlib.import_module(module), attr)
+
+
+def _guess_format(path: Path) -> Format:
+    suffix = path.suffix.lower().lstrip(".")
+    if suffix in ("csv", "tsv", "jsonl"):
+        return suffix  # type: ignore
+    if suffix in ("tab", "txt"):
+        return "tsv"
+    if suffix in ("ndjson", "json"):
+        return "jsonl"
+    raise ValueError(f"Can't tell the format of {path} from its extension; pass --format")
+
+
+def read_rows(path: Path, format: Format | None = None) -> Iterator[dict[str, Any]]:
+    """Stream rows from a CSV, TSV or JSONL file, or from stdin when `path` is "-"."""
+    if str(path) == "-":
+        if format is None:
+            raise ValueError("--format is required when reading from stdin")
+        opened: contextlib.AbstractContextManager[TextIO] = contextlib.nullcontext(sys.stdin)
+    else:
+        format = format or _guess_format(path)
+        opened = path.open(newline="", encoding="utf-8")
+
+    with opened as fp:
+        if format == "jsonl":
+            for line in fp:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(fp, delimiter="\t" if format == "tsv" else ",")
+
+
+def _cell(value: Any) -> str:
+    return "" if value is None else str(value)
+
+
+def prepare_batch(
+    model_ref: str,
+    field_columns: dict[str, str],
+    tags_column: str | None,
+    guid_column: str | None,
+    rows: list[dict[str, Any]],
+) -> NoteBatch:
+    """Turn a chunk of rows into a validated NoteBatch with its guids already computed."""
+    return rows_to_batch(load_model(model_ref), field_columns, tags_column, guid_column, rows)
+
+
+def rows_to_batch(
+    model: Model[Any],
+    field_columns: dict[str, str],
+    tags_column: str | None,
+    guid_column: str | None,
+    rows: list[dict[str, Any]],
+) -> NoteBatch:
+    """Like `prepare_batch`, for a model object rather than a reference to one."""
+    missing = [column for column in [*field_columns.values(), tags_column, guid_column] if column and column not in rows[0]]
+    if missing:
+        raise ValueError(f"Input is missing columns {missing}; found {list(rows[0])}")
+
+    batch = NoteBatch(
+        model=model,
+        columns={name: [_cell(row[column]) for row in rows] for name, column in field_columns.items()},
+        tags=[row[tags_column] or () for row in rows] if tags_column else None,
+        guids=[_cell(row[guid_column]) for row in rows] if guid_column else None,
+    )
+    batch.compute_guids()
+    return batch
+
+
+def _map_bounded[T, R](fn: Callable[[T], R], items: Iterable[T], workers: int) -> Iterator[R]:
+    """Like `ProcessPoolExecutor.map`, but only keeps a few items in flight instead of submitting all of them up front."""
+    if workers <= 1:
+        yield from map(fn, items)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque[Future[R]] = deque()
+        for item in items:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main(
+    inputs: list[Path],
+    /,
+    output: Path,
+    model: str = "basic",
+    deck: str = "genanki",
+    field: tuple[str, ...] = (),
+    tags_column: str | None = None,
+    guid_column: str | None = None,
+    format: Format | None = None,
+    workers: int = 1,
+    batch_size: int = 10_000,
+):
+    """
+    Build an .apkg from CSV, TSV or JSONL rows ("-" reads stdin), streaming them through in chunks of --batch-size.
+
+    Args:
+        inputs: Files to read rows from.
+        output: Where to write the package.
+        model: A builtin model name or a "package.module:ATTRIBUTE" reference to a model.
+        deck: Name of the deck to put the notes in.
+        field: FIELD=COLUMN mappings from the model's field attributes to input columns. Fields that aren't mapped are
+            read from the column with the same name.
+        tags_column: Column holding each note's tags, space separated (or a list, for JSONL).
+        guid_column: Column holding each note's guid, instead of deriving it from the fields.
+        format: Input format; guessed from each file's extension when omitted.
+        workers: Number of processes used to validate rows and compute guids.
+        batch_size: Number of notes prepared and inserted at a time.
+    """
+    genanki_model = load_model(model)
+    field_columns = {f.name: f.name for f in dataclasses.fields(genanki_model.model_spec.fields)}
+    for mapping in field:
+        name, sep, column = mapping.partition("=")
+        if not sep or name not in field_columns:
+            raise ValueError(f"--field must be FIELD=COLUMN with FIELD one of {list(field_columns)}, got {mapping!r}")
+        field_columns[name] = column
+
+    rows = itertools.chain.from_iterable(read_rows(path, format) for path in inputs)
+    chunks = iter(lambda: list(itertools.islice(rows, batch_size)), [])
+    prepare = functools.partial(prepare_batch, model, field_columns, tags_column, guid_column)
+
+    genanki_deck = Deck(name=deck, models={}, notes=[])
+    genanki_deck.add_model(genanki_model)
+
+    with PackageWriter() as writer:
+        writer.add_deck(genanki_deck)
+        for batch in _map_bounded(prepare, chunks, workers):
+            # batches prepared in another process carry a copy of the model, without the id the writer assigned
+            batch.model = genanki_model
+            writer.add_batch(genanki_deck, batch, chunk_size=batch_size)
+        writer.write(output.as_posix())
+
+
+if __name__ == "__main__":
+    tyro.cli(main)
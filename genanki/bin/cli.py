@@ -0,0 +1,18 @@
+import tyro
+
+from genanki.bin import build, diff, dump_apkg, merge, preview, run
+
+
+def main():
+    tyro.extras.subcommand_cli_from_dict({
+        "build": build.main,
+        "diff": diff.main,
+        "dump": dump_apkg.main,
+        "merge": merge.main,
+        "preview": preview.main,
+        "run": run.main,
+    })
+
+
+if __name__ == "__main__":
+    main()
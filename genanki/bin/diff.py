@@ -0,0 +1,52 @@
+from collections.abc import Iterable
+import json
+from pathlib import Path
+from typing import Any, TextIO
+
+import tyro
+
+from genanki.bin.dump_apkg import _open_text
+from genanki.diff import PackageDiff
+
+
+def _write_array(fp: TextIO, items: Iterable[Any]) -> None:
+    # one item per line, written as it's read, so huge diffs needn't fit in memory
+    fp.write("[")
+    for i, item in enumerate(items):
+        fp.write(",\n    " if i else "\n    ")
+        fp.write(json.dumps(item, ensure_ascii=False))
+    fp.write("\n  ]")
+
+
+def main(a: Path, b: Path, /, output: Path | None = None, summary_only: bool = False):
+    """
+    Compare two .apkg files, matching notes by guid, and print the differences as JSON.
+
+    Args:
+        a: The old package.
+        b: The new package.
+        output: Where to write the JSON; defaults to stdout.
+        summary_only: Only count the notes added, removed and modified, and list notetype and media changes.
+    """
+    for file in (a, b):
+        if not file.exists():
+            raise FileNotFoundError(file)
+
+    with PackageDiff(a, b) as diff, _open_text(output) as fp:
+        fp.write("{\n")
+        fp.write(f'  "summary": {json.dumps(diff.summary())},\n')
+        fp.write(f'  "notetypes": {json.dumps(diff.notetypes(), ensure_ascii=False)},\n')
+        fp.write(f'  "media": {json.dumps(diff.media(), ensure_ascii=False)}')
+        if not summary_only:
+            for key, notes in [
+                ("added", diff.added_notes()),
+                ("removed", diff.removed_notes()),
+                ("modified", diff.modified_notes()),
+            ]:
+                fp.write(f',\n  "{key}": ')
+                _write_array(fp, notes)
+        fp.write("\n}\n")
+
+
+if __name__ == "__main__":
+    tyro.cli(main)
@@ -1,28 +1,141 @@
+import contextlib
+import csv
+import json
 from pathlib import Path
+import struct
+import sys
+from typing import Any, Literal, TextIO
 from zipfile import ZipFile
 
-import pyzstd
-
 import tyro
 
+from genanki.reader import (
+    COLLECTION_NAMES,
+    COPY_BUFFER_SIZE,
+    ApkgReader,
+    _decompressed,
+    extract_collection,
+    read_media_map,
+)
+
+type Format = Literal["sqlite", "jsonl", "csv", "media"]
+
+
+def _open_text(output: Path | None) -> contextlib.AbstractContextManager[TextIO]:
+    if output is None or str(output) == "-":
+        return contextlib.nullcontext(sys.stdout)
+    return output.open("w", encoding="utf-8", newline="")
+
+
+def _cell(value: Any) -> Any:
+    # notetype and deck configs are protobuf blobs
+    return value.hex() if isinstance(value, bytes) else value
+
+
+# the SQLite header: page size at offset 16, then the file change counter at 24, the size in pages at 28 and, at 92, the
+# change counter the size was last valid for
+_SQLITE_HEADER = struct.Struct(">16sH6xI I 60x I")
+
+
+def _collection_size(zip_file: ZipFile, name: str) -> int:
+    """The size of the decompressed collection, from its SQLite header, else by streaming through it."""
+    with zip_file.open(name) as fp, _decompressed(fp, name.endswith("b")) as src:
+        header = src.read(_SQLITE_HEADER.size)
+        if len(header) == _SQLITE_HEADER.size:
+            magic, page_size, change_counter, page_count, valid_for = _SQLITE_HEADER.unpack(header)
+            if magic == b"SQLite format 3\x00" and page_count and change_counter == valid_for:
+                return page_count * (65536 if page_size == 1 else page_size)
+        size = len(header)
+        while chunk := src.read(COPY_BUFFER_SIZE):
+            size += len(chunk)
+        return size
+
+
+def stats(file: Path, row_counts: bool = False) -> dict[str, Any]:
+    """
+    Sizes and the number of media files, read from the zip without extracting the collection. With `row_counts`, the
+    collection is extracted to count the rows of each table as well.
+    """
+    with ZipFile(file) as zip_file:
+        name = next((name for name in COLLECTION_NAMES if name in zip_file.NameToInfo), None)
+        if name is None:
+            raise ValueError(f"{file} has none of {list(COLLECTION_NAMES)}")
+        # legacy media maps don't record sizes
+        media_sizes = [entry.size for entry in read_media_map(zip_file)]
+        result: dict[str, Any] = {
+            "collection": name,
+            "collection_size": _collection_size(zip_file, name),
+            "media": len(media_sizes),
+            "media_size": None if None in media_sizes else sum(media_sizes),
+        }
+
+    if row_counts:
+        with ApkgReader(file) as reader:
+            result["tables"] = {
+                table: reader.conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0] for table in reader.tables()
+            }
+    return result
+
+
 def main(
     file: Path,
     /,
-    output: Path | None = None
+    output: Path | None = None,
+    format: Format = "sqlite",
+    stats_only: bool = False,
+    row_counts: bool = False,
+    tables: tuple[str, ...] = (),
 ):
+    """
+    Dump the contents of an .apkg. Everything is streamed, so memory use doesn't depend on the size of the package.
+    sqlite, media and --stats-only read the zip directly; jsonl and csv query the collection with SQLite, which needs
+    it extracted to a temporary file first.
+
+    Args:
+        file: The package to read.
+        output: Where to write the dump. For sqlite, defaults to FILE.sqlite3 in the current directory; for jsonl and
+            media, to stdout; for csv, to a FILE-csv directory in the current directory, with one file per table.
+        format: sqlite writes the decompressed collection; jsonl writes one JSON object per note; csv writes tables as
+            CSV; media lists the media files.
+        stats_only: Only print the collection's size and the number and size of media files, as JSON.
+        row_counts: With --stats-only, also print row counts per table (extracting the collection to count them).
+        tables: Tables to write with --format csv; all of them when omitted.
+    """
     if not file.exists():
         raise FileNotFoundError(file)
 
-    with ZipFile(file) as zip_file:
-        info = zip_file.getinfo("collection.anki21b")
-        with zip_file.open(info) as fp:
-            data = pyzstd.decompress(fp.read())
-
-            if output is None:
-                output = Path.cwd() / file.with_suffix(".sqlite3").name
-            
-            with output.open("wb") as fp:
-                fp.write(data)
+    if stats_only:
+        with _open_text(output) as fp:
+            json.dump(stats(file, row_counts=row_counts), fp, indent=2)
+            fp.write("\n")
+        return
+
+    if format == "sqlite":
+        output = output or Path.cwd() / file.with_suffix(".sqlite3").name
+        with ZipFile(file) as zip_file, output.open("wb") as fp:
+            extract_collection(zip_file, fp)
+
+    elif format == "media":
+        with ZipFile(file) as zip_file, _open_text(output) as fp:
+            for entry in read_media_map(zip_file):
+                fp.write(json.dumps(entry._asdict(), ensure_ascii=False) + "\n")
+
+    elif format == "jsonl":
+        with ApkgReader(file) as reader, _open_text(output) as fp:
+            for note in reader.notes():
+                fp.write(json.dumps(note._asdict(), ensure_ascii=False) + "\n")
+
+    else:
+        output = output or Path.cwd() / f"{file.stem}-csv"
+        output.mkdir(parents=True, exist_ok=True)
+        with ApkgReader(file) as reader:
+            for table in tables or reader.tables():
+                columns, rows = reader.table(table)
+                with (output / f"{table}.csv").open("w", encoding="utf-8", newline="") as fp:
+                    writer = csv.writer(fp)
+                    writer.writerow(columns)
+                    writer.writerows([_cell(value) for value in row] for row in rows)
+
 
 if __name__ == "__main__":
     tyro.cli(main)
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import tyro
+
+from genanki.merge import MergePolicy, merge_packages
+
+
+def main(
+    output: Path,
+    inputs: tuple[Path, ...],
+    /,
+    policy: MergePolicy = MergePolicy.FIRST,
+    batch_size: int = 100_000,
+    tmp_dir: Path | None = None,
+):
+    """
+    Merge .apkg files into one, keeping one note per guid.
+
+    Args:
+        output: The package to write.
+        inputs: The packages to merge, in order.
+        policy: Which of the notes sharing a guid to keep: the first one, the last one, or the most recently modified.
+        batch_size: Number of rows copied per transaction.
+        tmp_dir: Where to extract collections; the system temporary directory by default.
+    """
+    for file in inputs:
+        if not file.exists():
+            raise FileNotFoundError(file)
+
+    merge_packages(
+        output, inputs, policy=policy, batch_size=batch_size, tmp_dir=str(tmp_dir) if tmp_dir is not None else None,
+    )
+
+
+if __name__ == "__main__":
+    tyro.cli(main)
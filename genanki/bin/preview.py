@@ -0,0 +1,52 @@
+from collections.abc import Iterator
+import itertools
+from pathlib import Path
+from typing import Literal
+
+import tyro
+
+from genanki.bin.dump_apkg import _open_text
+from genanki.loader import PackageLoader
+from genanki.render import NoteToRender, render_cards, write_html, write_jsonl
+
+
+def main(
+    package: Path,
+    /,
+    output: Path | None = None,
+    format: Literal["html", "jsonl"] | None = None,
+    workers: int = 1,
+    limit: int | None = None,
+):
+    """
+    Render the question and answer of every card in an .apkg, to check them without importing the deck into Anki.
+
+    Args:
+        package: The package to preview.
+        output: Where to write the preview; defaults to stdout.
+        format: "html" for a static report showing each card with its model's styling, or "jsonl" for one card per
+            line. Guessed from the output's extension when omitted, else jsonl.
+        workers: Number of processes rendering cards.
+        limit: Only render the first LIMIT notes.
+    """
+    if not package.exists():
+        raise FileNotFoundError(package)
+    if format is None:
+        format = "html" if output is not None and output.suffix in (".html", ".htm") else "jsonl"
+
+    with PackageLoader(package) as loader, _open_text(output) as fp:
+        def notes() -> Iterator[NoteToRender]:
+            for note in itertools.islice(loader.notes(), limit):
+                deck = loader.decks.get(note.deck_id)
+                yield NoteToRender(note.model, note.guid, deck.name if deck is not None else "", note.tags, note.values)
+
+        cards = render_cards(notes(), max_workers=workers)
+        if format == "html":
+            css = {model.name: model.css for model in loader.models.values()}
+            write_html(fp, cards, css, title=package.name)
+        else:
+            write_jsonl(fp, cards)
+
+
+if __name__ == "__main__":
+    tyro.cli(main)
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import tyro
+
+from genanki import buildfile
+
+
+def main(
+    build_file: Path = Path("genanki.yaml"),
+    /,
+    targets: tuple[str, ...] = (),
+    jobs: int | None = None,
+    force: bool = False,
+    batch_size: int = 10_000,
+):
+    """
+    Build the packages declared in a YAML build file, skipping those whose inputs haven't changed.
+
+    Args:
+        build_file: The build file to read.
+        targets: Outputs to build; all of them when omitted.
+        jobs: Number of targets built at once; one per CPU by default.
+        force: Rebuild targets even if they are up to date.
+        batch_size: Number of notes prepared and inserted at a time.
+    """
+    for output, built in buildfile.build_all(
+        build_file, targets=targets or None, jobs=jobs, force=force, batch_size=batch_size,
+    ):
+        print(f"{'built' if built else 'up to date'}: {output}")
+
+
+if __name__ == "__main__":
+    tyro.cli(main)
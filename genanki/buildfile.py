@@ -0,0 +1,276 @@
+"""
+Declarative build files: a YAML document describing models, decks, their data sources and the packages to write.
+
+    models:
+      vocab:
+        name: Vocab
+        fields: [Word, Meaning]
+        templates:
+          - name: Recognition
+            qfmt: "{{Word}}"
+            afmt: "{{FrontSide}}<hr id=answer>{{Meaning}}"
+        guid_fields: [Word]
+
+    decks:
+      spanish:
+        name: Spanish::Vocab
+        model: vocab
+        sources: [data/spanish.csv]
+        fields: {Meaning: english}
+        tags_column: tags
+
+    packages:
+      spanish.apkg:
+        decks: [spanish]
+
+Relative paths are resolved against the build file's directory. Each package is an independent target: targets are
+built in parallel, and a target whose build file entries and source files are unchanged since its last successful
+build is skipped.
+"""
+
+from collections.abc import Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import dataclasses
+import hashlib
+import itertools
+import json
+from pathlib import Path
+from typing import Any, Literal
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+import yaml
+
+from genanki import model
+from genanki.bin.build import load_model, read_rows, rows_to_batch
+from genanki.deck import Deck
+from genanki.model import Model
+from genanki.package import PackageWriter
+from genanki.version import __version__
+
+CACHE_FILE_NAME = ".genanki-cache.json"
+
+
+class _Def(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+
+class TemplateDef(_Def):
+    name: str
+    qfmt: str
+    afmt: str
+
+
+class ModelDef(_Def):
+    name: str
+    type: Literal["front_back", "cloze"] = "front_back"
+    fields: list[str]
+    templates: list[TemplateDef]
+    css: str = ""
+    # names of the fields that identify a note; by default its guid depends on all of them
+    guid_fields: list[str] | None = None
+
+
+class DeckDef(_Def):
+    name: str
+    description: str = ""
+    # a key of `models`, a builtin model name, or a "package.module:ATTRIBUTE" reference
+    model: str
+    sources: list[str]
+    format: Literal["csv", "tsv", "jsonl"] | None = None
+    # model field names to source columns; unmapped fields are read from the column with the same name
+    fields: dict[str, str] = Field(default_factory=dict)
+    tags_column: str | None = None
+    guid_column: str | None = None
+
+
+class PackageDef(_Def):
+    decks: list[str]
+
+
+class BuildFile(_Def):
+    models: dict[str, ModelDef] = Field(default_factory=dict)
+    decks: dict[str, DeckDef] = Field(default_factory=dict)
+    packages: dict[str, PackageDef]
+
+    @model_validator(mode="after")
+    def _check_references(self) -> "BuildFile":
+        for output, package in self.packages.items():
+            for deck_key in package.decks:
+                if deck_key not in self.decks:
+                    raise ValueError(f"Package {output!r} references unknown deck {deck_key!r}")
+        return self
+
+
+def load_build_file(path: Path) -> BuildFile:
+    with path.open(encoding="utf-8") as fp:
+        return BuildFile.model_validate(yaml.safe_load(fp))
+
+
+# Models are built at most once per process, and shared by every target that process builds.
+_MODEL_CACHE: dict[str, Model[Any]] = {}
+
+
+def build_model(model_def: ModelDef) -> Model[Any]:
+    key = model_def.model_dump_json()
+    if key not in _MODEL_CACHE:
+        model_spec = model.make_model_spec(
+            model_def.name,
+            model_def.fields,
+            [{"name": t.name, "qfmt": t.qfmt, "afmt": t.afmt} for t in model_def.templates],  # type: ignore
+        )
+        guid_strategy: model.GuidStrategyOrKeys = model.GuidStrategy.REPR
+        if model_def.guid_fields is not None:
+            attributes = _field_attributes(model_spec)
+            unknown = [name for name in model_def.guid_fields if name not in attributes]
+            if unknown:
+                raise ValueError(
+                    f"Model {model_def.name!r} has unknown guid_fields {unknown}; its fields are {list(attributes)}"
+                )
+            guid_strategy = tuple(attributes[name] for name in model_def.guid_fields)
+
+        _MODEL_CACHE[key] = model.Model(
+            name=model_def.name,
+            model_spec=model_spec,
+            css=model_def.css,
+            model_type=model.ModelType.CLOZE if model_def.type == "cloze" else model.ModelType.FRONT_BACK,
+            guid_strategy=guid_strategy,
+        )
+    return _MODEL_CACHE[key]
+
+
+def _field_attributes(model_spec: type[model.ModelSpec[Any]]) -> dict[str, str]:
+    """Map the Anki name of each field of `model_spec` to its FieldSpec attribute name."""
+    return {
+        f.__genanki_field__["name"]: f.name
+        for f in dataclasses.fields(model_spec.fields)
+        if isinstance(f, model.ModelField)
+    }
+
+
+def resolve_model(build_file: BuildFile, ref: str) -> Model[Any]:
+    if ref in build_file.models:
+        return build_model(build_file.models[ref])
+    return load_model(ref)
+
+
+def target_digest(build_file: BuildFile, output: str, root: Path) -> str:
+    """Hash everything a target's output depends on: its build file entries, its sources and the genanki version."""
+    package = build_file.packages[output]
+    decks = {key: build_file.decks[key] for key in package.decks}
+    models = {deck.model: build_file.models[deck.model] for deck in decks.values() if deck.model in build_file.models}
+    # models defined in Python (or builtin) are hashed by what they are, so editing their module rebuilds the target
+    loaded_models = {deck.model for deck in decks.values() if deck.model not in build_file.models}
+
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        "version": __version__,
+        "package": package.model_dump(),
+        "decks": {key: deck.model_dump() for key, deck in decks.items()},
+        "models": {key: model_def.model_dump() for key, model_def in models.items()},
+        "loaded_models": {ref: load_model(ref).fingerprint for ref in loaded_models},
+    }, sort_keys=True).encode())
+
+    for deck in decks.values():
+        for source in deck.sources:
+            h.update(source.encode())
+            with (root / source).open("rb") as fp:
+                while chunk := fp.read(1 << 20):
+                    h.update(chunk)
+
+    return h.hexdigest()
+
+
+def build_target(build_file: BuildFile, output: str, root: Path, batch_size: int = 10_000) -> Path:
+    """Build one package of `build_file`, streaming each deck's sources into it `batch_size` rows at a time."""
+    out_path = root / output
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with PackageWriter() as writer:
+        for deck_key in build_file.packages[output].decks:
+            deck_def = build_file.decks[deck_key]
+            genanki_model = resolve_model(build_file, deck_def.model)
+            # the writer adds each model (by fingerprint) once, even for models with the same name
+            writer.add_model(genanki_model)
+
+            genanki_deck = Deck(name=deck_def.name, description=deck_def.description, models={}, notes=[])
+            writer.add_deck(genanki_deck)
+
+            attributes = _field_attributes(genanki_model.model_spec)
+            unknown = [name for name in deck_def.fields if name not in attributes]
+            if unknown:
+                raise ValueError(f"Deck {deck_key!r} maps unknown fields {unknown}; {genanki_model.name!r} has {list(attributes)}")
+            field_columns = {attr: deck_def.fields.get(name, name) for name, attr in attributes.items()}
+
+            rows = itertools.chain.from_iterable(read_rows(root / source, deck_def.format) for source in deck_def.sources)
+            for chunk in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+                batch = rows_to_batch(genanki_model, field_columns, deck_def.tags_column, deck_def.guid_column, chunk)
+                writer.add_batch(genanki_deck, batch, chunk_size=batch_size)
+
+        writer.write(out_path.as_posix())
+
+    return out_path
+
+
+def _load_cache(path: Path) -> dict[str, str]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+def build_all(
+    path: Path,
+    *,
+    targets: Sequence[str] | None = None,
+    jobs: int | None = None,
+    force: bool = False,
+    batch_size: int = 10_000,
+) -> Iterator[tuple[str, bool]]:
+    """
+    Build the packages of the build file at `path`, yielding `(output, built)` as each target finishes; `built` is
+    False for targets skipped because they are up to date.
+
+    `targets` restricts the build to some outputs. Targets are built by up to `jobs` processes (one per CPU by default).
+    Digests of successfully built targets are recorded next to the build file, so the next run can skip them.
+    """
+    build_file = load_build_file(path)
+    root = path.parent
+    cache_path = root / CACHE_FILE_NAME
+    cache = _load_cache(cache_path)
+
+    outputs = list(targets) if targets is not None else list(build_file.packages)
+    unknown = [output for output in outputs if output not in build_file.packages]
+    if unknown:
+        raise ValueError(f"Unknown targets {unknown}; {path} defines {list(build_file.packages)}")
+
+    digests = {output: target_digest(build_file, output, root) for output in outputs}
+    stale = [
+        output
+        for output in outputs
+        if force or cache.get(output) != digests[output] or not (root / output).exists()
+    ]
+    for output in outputs:
+        if output not in stale:
+            yield output, False
+
+    try:
+        if jobs == 1 or len(stale) <= 1:
+            for output in stale:
+                build_target(build_file, output, root, batch_size)
+                cache[output] = digests[output]
+                yield output, True
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = {
+                    pool.submit(build_target, build_file, output, root, batch_size): output
+                    for output in stale
+                }
+                for future in as_completed(futures):
+                    future.result()
+                    output = futures[future]
+                    cache[output] = digests[output]
+                    yield output, True
+    finally:
+        # record what did get built, even if another target failed
+        cache_path.write_text(json.dumps(cache, indent=2, sort_keys=True), encoding="utf-8")
+
@@ -0,0 +1,173 @@
+from collections.abc import Iterable, Sequence
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import TYPE_CHECKING, Any
+
+from anki.buildinfo import version as anki_version
+
+from genanki.card import Card
+from genanki.media import MediaFile, MediaSource, media_name
+from genanki.version import __version__
+
+if TYPE_CHECKING:
+    from genanki.package import Package
+    from genanki.registry import IdRegistry
+
+
+def _update(h: "hashlib._Hash", value: Any) -> None:
+    # JSON keeps the encoding unambiguous, e.g. ("a b", "c") and ("a", "b c") hash differently
+    h.update(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode())
+    h.update(b"\n")
+
+
+def _hash_file(path: str | os.PathLike[str]) -> str:
+    with open(path, "rb") as fp:
+        return hashlib.file_digest(fp, "sha256").hexdigest()
+
+
+def _media_key(source: MediaSource) -> str:
+    if not isinstance(source, MediaFile):
+        return _hash_file(source)
+    if source.key is not None:
+        return f"key:{source.key}"
+    if isinstance(source.data, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source.data).hexdigest()
+    raise ValueError(f"media file {source.name!r} is read from a stream, so it needs a key to be cached")
+
+
+def _card_scheduling(cards: Sequence[Card] | None) -> list[list[Any]]:
+    """The cards that aren't scheduled as new cards (those the writer updates after adding the note)."""
+    if cards is None:
+        return []
+    return [[card.ord, card.suspend, card.due, card.ivl, card.ease] for card in cards if card != Card(card.ord)]
+
+
+def package_key(
+    package: "Package",
+    media_files: Iterable[MediaSource] | None = None,
+    timestamp: float | None = None,
+    registry: "IdRegistry | None" = None,
+) -> str:
+    """
+    A hash of everything that determines the contents of the file `package.write_to_file` writes: genanki and Anki
+    versions, model fingerprints and notetype ids, deck layout, every note's guid, source key, fields, tags, due and
+    card scheduling, the contents of the media files (or, for a MediaFile with a `key`, the key) and the settings of
+    the media optimizer, and the state of the ID registry.
+    """
+    h = hashlib.sha256()
+    optimizer = package.media_optimizer
+    _update(h, {
+        "genanki": __version__,
+        "anki": anki_version,
+        "timestamp": timestamp,
+        "duplicate_policy": package.duplicate_policy,
+        # a model loaded from a package keeps its notetype id, which the writer uses instead of its stable_id
+        "notetype_ids": sorted(
+            [m.fingerprint, getattr(m, "model_id", None) or m.stable_id] for m in package._models()
+        ),
+        "media_optimizer": repr(optimizer.encoders) if optimizer is not None else None,
+        "registry": registry.digest() if registry is not None else None,
+    })
+
+    for deck in package.decks:
+        _update(h, {
+            "deck": deck.name,
+            "description": deck.description,
+            "models": sorted(model.fingerprint for model in deck.models.values()),
+        })
+        for note in deck.notes:
+            _update(h, [
+                note.model.fingerprint, note.guid, note._field_values(), [str(tag) for tag in note._tags], note.due,
+                note.sort_field, _card_scheduling(note._cards), note.source_key,
+            ])
+        for batch in deck.batches:
+            _update(h, ["batch", batch.model.fingerprint, len(batch)])
+            tags = batch.tags if batch.tags is not None else [()] * len(batch)
+            due = batch.due if batch.due is not None else [0] * len(batch)
+            keys = batch.keys if batch.keys is not None else [None] * len(batch)
+            for values, guid, note_tags, note_due, key in zip(batch.rows(), batch.compute_guids(), tags, due, keys):
+                _update(h, [guid, values, [str(tag) for tag in note_tags], note_due, key])
+        if deck.store is not None:
+            _update(h, ["store"])
+            for stored in deck.store.notes():
+                _update(h, [
+                    stored.model, stored.guid, stored.fields, stored.tags, stored.due, _card_scheduling(stored.cards),
+                    stored.source_key,
+                ])
+
+    for source in media_files if media_files is not None else package.media_files:
+        _update(h, ["media", media_name(source), _media_key(source)])
+
+    return h.hexdigest()
+
+
+class BuildCache:
+    """
+    A directory of previously written packages, named by `package_key`, so unchanged packages needn't be rebuilt.
+
+    Entries are hard-linked into place when possible (and copied otherwise). When the entries add up to more than
+    `max_bytes`, the least recently used ones are evicted.
+    """
+
+    def __init__(self, directory: str | os.PathLike[str], max_bytes: int = 1 << 30):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _entry(self, key: str) -> Path:
+        return self.directory / f"{key}.apkg"
+
+    def get(self, key: str, file: str | os.PathLike[str]) -> bool:
+        """Put the cached package for `key` at `file`, returning False if there is none."""
+        entry = self._entry(key)
+        try:
+            _link_or_copy(entry, Path(file))
+        except FileNotFoundError:
+            return False
+        # mark it as recently used
+        os.utime(entry)
+        return True
+
+    def put(self, key: str, file: str | os.PathLike[str]) -> None:
+        """Cache the package at `file` under `key`, then evict entries until the cache fits in `max_bytes`."""
+        _link_or_copy(Path(file), self._entry(key))
+        self.evict()
+
+    def evict(self) -> None:
+        entries: list[tuple[float, int, Path]] = []
+        for entry in self.directory.glob("*.apkg"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # evicted concurrently
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+
+
+def _link_or_copy(src: Path, dest: Path) -> None:
+    """Hard-link (or, across filesystems, copy) `src` to `dest`, atomically replacing anything already there."""
+    fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".tmp")
+    os.close(fd)
+    tmp = Path(tmp_name)
+    try:
+        tmp.unlink()
+        try:
+            os.link(src, tmp)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dest)
+    finally:
+        tmp.unlink(missing_ok=True)
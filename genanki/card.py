@@ -1,7 +1,61 @@
+from collections.abc import Iterable, Sequence
+
 import attrs
 
+import anki.collection
+from anki.consts import CARD_TYPE_NEW, CARD_TYPE_REV, QUEUE_TYPE_NEW, QUEUE_TYPE_REV, QUEUE_TYPE_SUSPENDED
+
+# Anki's starting ease for review cards, in permille
+DEFAULT_EASE = 2500
+
 
 @attrs.define
 class Card:
     ord: int = attrs.field()
     suspend: bool = attrs.field(default=False)
+    # for a new card, its position in the new queue (overriding the note's `due`); for a review card (`ivl` > 0), the
+    # number of days from the day the package is written until it's due, negative if it's overdue
+    due: int | None = attrs.field(default=None, kw_only=True)
+    # days between reviews; a card with an interval is a review card, e.g. one migrated from another program
+    ivl: int = attrs.field(default=0, kw_only=True)
+    # a review card's ease factor in permille, as Anki stores it; 0 means the default, 2500 (250%)
+    ease: int = attrs.field(default=0, kw_only=True)
+
+    @property
+    def is_default(self) -> bool:
+        """Whether the card has the scheduling Anki gives new cards, so it needn't be updated after adding it."""
+        return not self.suspend and self.due is None and self.ivl == 0
+
+
+def schedule_cards(
+    col: anki.collection.Collection, notes: Iterable[tuple[int, int, Sequence[Card] | None]],
+) -> None:
+    """
+    Apply the due positions of notes (by note id) and the scheduling of their cards to the cards the backend created,
+    with one UPDATE per chunk rather than a backend call per card.
+    """
+    today = col.sched.today
+    rows: list[tuple[int | None, ...]] = []
+    for nid, due, cards in notes:
+        if due:
+            # every new card of the note; None keeps the column as it is, and a NULL ord matches every card
+            rows.append((None, None, due, None, None, nid, None, None))
+        for card in cards or ():
+            if card.is_default:
+                continue
+            if card.ivl > 0:
+                card_type, queue = CARD_TYPE_REV, QUEUE_TYPE_REV
+                card_due = today + (card.due or 0)
+                factor = card.ease or DEFAULT_EASE
+            else:
+                card_type, queue, card_due, factor = CARD_TYPE_NEW, QUEUE_TYPE_NEW, card.due, 0
+            if card.suspend:
+                queue = QUEUE_TYPE_SUSPENDED
+            rows.append((card_type, queue, card_due, card.ivl, factor, nid, card.ord, card.ord))
+
+    if rows:
+        col.db.executemany(
+            "UPDATE cards SET type = coalesce(?, type), queue = coalesce(?, queue), due = coalesce(?, due), "
+            "ivl = coalesce(?, ivl), factor = coalesce(?, factor) WHERE nid = ? AND (? IS NULL OR ord = ?)",
+            rows,
+        )
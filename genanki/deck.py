@@ -1,3 +1,4 @@
+from enum import Enum
 from typing import Any
 import anki
 import anki.collection
@@ -8,29 +9,189 @@ import anki.decks
 from attrs import define, field
 
 # from .deck import Deck
+from genanki.batch import NoteBatch
 from genanki.model import Model
-from genanki.note import Note
+from genanki.note import Note, _first_field
+from genanki.store import NoteStore
+from genanki.util import field_checksum, strip_html_media
 
 
 if anki.lang.current_i18n is None:
     anki.lang.set_lang("en")
 
 
+class DuplicatePolicy(str, Enum):
+    """What to do with a note that duplicates one already added."""
+
+    # keep both, as genanki always has; Anki merges notes with the same guid on import. A deck with a `store` keeps one
+    # note per guid, so it can't use this.
+    ALLOW = "allow"
+    RAISE = "raise"
+    SKIP = "skip"
+    REPLACE = "replace"
+
+
+def _check_store_policy(deck: "Deck", attribute: Any, value: Any) -> None:
+    # also validates assignments, which are checked before the new value is set
+    store = value if attribute.name == "store" else deck.store
+    policy = value if attribute.name == "duplicate_policy" else deck.duplicate_policy
+    if store is not None and policy is DuplicatePolicy.ALLOW:
+        raise ValueError(
+            f"Deck {deck.name!r} has a store, which keeps one note per guid, so its duplicate_policy must be RAISE, "
+            "SKIP or REPLACE rather than ALLOW"
+        )
+
+
+# position of a note in Deck._guid_index for notes that are rows of a NoteBatch rather than entries of Deck.notes
+_BATCH_ROW = -1
+
+
 @define(kw_only=True)
 class Deck:
     name: str
     description: str = field(default="An Anki deck")
-    notes: list[Note[Any]] = field(default=[])
-    models: dict[str, Model[Any]] = field(default={})
+    notes: list[Note[Any]] = field(factory=list)
+    models: dict[str, Model[Any]] = field(factory=dict)
     deck_id: anki.decks.DeckId = field(default=anki.decks.DeckId(0))
+    batches: list[NoteBatch] = field(factory=list)
 
-    def add_note(self, note: Note[Any]) -> None:
-        if note.model.name not in self.models:
-            self.add_model(note.model)
-        elif note.model != self.models[note.model.name]:
-            raise ValueError("Note model does not match deck model")
+    duplicate_policy: DuplicatePolicy = field(
+        default=DuplicatePolicy.ALLOW, converter=DuplicatePolicy, validator=_check_store_policy,
+    )
+    # also count notes of the same model with the same first field as duplicates, like Anki's duplicate check does
+    check_first_field: bool = field(default=False)
+    # keep notes and batches in this store instead of `notes` and `batches`, for decks too big to hold in memory;
+    # needs a `duplicate_policy` other than ALLOW
+    store: NoteStore | None = field(default=None, eq=False, validator=_check_store_policy)
+
+    # guid -> position in `notes`, or _BATCH_ROW; with a `store`, positions are its seqs and these stay empty
+    _guid_index: dict[str, int] = field(factory=dict, init=False, repr=False, eq=False)
+    # (model name, checksum of the first field) -> positions in `notes`
+    _csum_index: dict[tuple[str, int], list[int]] = field(factory=dict, init=False, repr=False, eq=False)
+
+    def __attrs_post_init__(self):
+        notes, self.notes = self.notes, []
+        for note in notes:
+            self.add_note(note)
+
+        batches, self.batches = self.batches, []
+        for batch in batches:
+            self.add_batch(batch)
+
+    def add_note(self, note: Note[Any]) -> bool:
+        """
+        Add `note` to the deck, or handle it according to `duplicate_policy` if it has the same guid as a note already
+        in the deck (or, with `check_first_field`, the same model and first field). Returns whether it was added.
+        """
+        self._add_model_of(note.model)
+
+        allow = self.duplicate_policy is DuplicatePolicy.ALLOW
+        position = None if allow else self._find_duplicate(note)
+        if position is None:
+            if self.store is not None:
+                self.store.add(note, checksum=self.check_first_field)
+            else:
+                self._index_note(note, len(self.notes))
+                self.notes.append(note)
+            return True
+
+        if self.duplicate_policy is DuplicatePolicy.RAISE:
+            raise ValueError(f"Note with guid {note.guid!r} duplicates a note already in deck {self.name!r}")
+        if self.duplicate_policy is DuplicatePolicy.SKIP:
+            return False
+        if position == _BATCH_ROW:
+            raise ValueError(f"Note with guid {note.guid!r} duplicates a row of a NoteBatch, which can't be replaced")
 
-        self.notes.append(note)
+        if self.store is not None:
+            self.store.replace(position, note, checksum=self.check_first_field)
+            return True
+
+        self._unindex_note(self.notes[position], position)
+        self.notes[position] = note
+        self._index_note(note, position)
+        return True
+
+    def add_batch(self, batch: NoteBatch) -> NoteBatch:
+        """
+        Add `batch` to the deck, checking its guids against the notes already in the deck. With `DuplicatePolicy.SKIP`,
+        the duplicate rows are dropped and the batch actually added is returned.
+
+        Batches are only checked for duplicate guids, and can't `DuplicatePolicy.REPLACE` notes. With a `store`, the
+        batch is written to it instead (where replacing works) and returned as is.
+        """
+        self._add_model_of(batch.model)
+
+        if self.store is not None:
+            on_conflict = {
+                DuplicatePolicy.RAISE: "ABORT",
+                DuplicatePolicy.SKIP: "IGNORE",
+                DuplicatePolicy.REPLACE: "REPLACE",
+            }[self.duplicate_policy]
+            self.store.add_batch(batch, on_conflict=on_conflict)
+            return batch
+
+        guids = batch.compute_guids()
+        seen: set[str] = set()
+        keep: list[int] = []
+        duplicates: list[str] = []
+        for i, guid in enumerate(guids):
+            if guid in self._guid_index or guid in seen:
+                duplicates.append(guid)
+            else:
+                keep.append(i)
+            seen.add(guid)
+
+        if duplicates and self.duplicate_policy is not DuplicatePolicy.ALLOW:
+            if self.duplicate_policy is not DuplicatePolicy.SKIP:
+                raise ValueError(
+                    f"NoteBatch has {len(duplicates)} notes duplicating others in deck {self.name!r}, "
+                    f"for example guid {duplicates[0]!r}"
+                )
+            batch = batch.select(keep)
+            guids = batch.compute_guids()
+
+        self._guid_index.update(dict.fromkeys(guids, _BATCH_ROW))
+        self.batches.append(batch)
+        return batch
+
+    def _find_duplicate(self, note: Note[Any]) -> int | None:
+        if self.store is not None:
+            return self.store.find(note, check_first_field=self.check_first_field)
+
+        position = self._guid_index.get(note.guid)
+        if position is not None and position != _BATCH_ROW and self.notes[position].guid != note.guid:
+            # the indexed note's fields were edited since, changing its guid
+            del self._guid_index[note.guid]
+            position = None
+        if position is not None or not self.check_first_field:
+            return position
+
+        first_field = _first_field(note)
+        for position in self._csum_index.get((note.model.name, field_checksum(first_field)), ()):
+            # checksums can collide, so compare the stripped fields as well
+            if strip_html_media(_first_field(self.notes[position])) == strip_html_media(first_field):
+                return position
+        return None
+
+    def _index_note(self, note: Note[Any], position: int) -> None:
+        self._guid_index[note.guid] = position
+        if self.check_first_field:
+            self._csum_index.setdefault((note.model.name, field_checksum(_first_field(note))), []).append(position)
+
+    def _unindex_note(self, note: Note[Any], position: int) -> None:
+        # the note's guid or first field may have changed since it was indexed, leaving nothing to remove
+        if self._guid_index.get(note.guid) == position:
+            del self._guid_index[note.guid]
+        if self.check_first_field:
+            positions = self._csum_index.get((note.model.name, field_checksum(_first_field(note))), [])
+            if position in positions:
+                positions.remove(position)
+
+    def _add_model_of(self, model: Model[Any]) -> None:
+        if model.name not in self.models:
+            self.add_model(model)
+        elif model != self.models[model.name]:
+            raise ValueError("Note model does not match deck model")
 
     def add_model(self, model: Model[Any]):
         self.models[model.name] = model
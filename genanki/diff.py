@@ -0,0 +1,180 @@
+"""
+Compare two .apkg files note by note.
+
+Both collections are extracted with a guid index and ATTACHed to one SQLite connection, so notes are matched by indexed
+joins rather than by loading either package into memory.
+"""
+
+from collections.abc import Iterator
+import contextlib
+import hashlib
+from itertools import zip_longest
+import os
+import sqlite3
+from typing import Any
+
+from genanki.reader import ApkgReader
+
+# notetype keys that affect how notes are rendered or imported
+_NOTETYPE_KEYS = ("name", "type", "css", "sortf", "latexPre", "latexPost")
+
+
+def _notetype_summary(notetype: dict[str, Any]) -> dict[str, Any]:
+    return {
+        **{key: notetype.get(key) for key in _NOTETYPE_KEYS},
+        "fields": [field["name"] for field in notetype["flds"]],
+        "templates": [
+            {"name": template["name"], "qfmt": template["qfmt"], "afmt": template["afmt"]}
+            for template in notetype["tmpls"]
+        ],
+    }
+
+
+def _diff_notetypes(a: ApkgReader, b: ApkgReader) -> dict[str, list[Any]]:
+    old = {notetype["id"]: _notetype_summary(notetype) for notetype in a.notetypes()}
+    new = {notetype["id"]: _notetype_summary(notetype) for notetype in b.notetypes()}
+    return {
+        "added": [{"id": ntid, "name": new[ntid]["name"]} for ntid in sorted(new.keys() - old.keys())],
+        "removed": [{"id": ntid, "name": old[ntid]["name"]} for ntid in sorted(old.keys() - new.keys())],
+        "modified": [
+            {
+                "id": ntid,
+                "name": new[ntid]["name"],
+                "changed": {
+                    key: [old[ntid][key], new[ntid][key]] for key in new[ntid] if old[ntid][key] != new[ntid][key]
+                },
+            }
+            for ntid in sorted(old.keys() & new.keys())
+            if old[ntid] != new[ntid]
+        ],
+    }
+
+
+def _media_hashes(reader: ApkgReader) -> dict[str, str]:
+    hashes = {}
+    for entry in reader.media():
+        with reader.open_media(entry) as fp:
+            hashes[entry.filename] = hashlib.file_digest(fp, "sha1").hexdigest()
+    return hashes
+
+
+def _diff_media(a: ApkgReader, b: ApkgReader) -> dict[str, list[str]]:
+    old = _media_hashes(a)
+    new = _media_hashes(b)
+    return {
+        "added": sorted(new.keys() - old.keys()),
+        "removed": sorted(old.keys() - new.keys()),
+        "modified": sorted(name for name in old.keys() & new.keys() if old[name] != new[name]),
+    }
+
+
+def _rows(cursor: sqlite3.Cursor, fetch_size: int) -> Iterator[tuple[Any, ...]]:
+    while rows := cursor.fetchmany(fetch_size):
+        yield from rows
+
+
+class PackageDiff:
+    """
+    The differences between packages `a` (old) and `b` (new). Use as a context manager; the note differences are
+    streamed from the joined collections, so they can only be read while it's open.
+
+        with PackageDiff("old.apkg", "new.apkg") as diff:
+            for note in diff.modified_notes():
+                ...
+    """
+
+    def __init__(
+        self,
+        a: str | os.PathLike[str],
+        b: str | os.PathLike[str],
+        *,
+        fetch_size: int = 1000,
+        tmp_dir: str | None = None,
+    ):
+        self.fetch_size = fetch_size
+        self._stack = contextlib.ExitStack()
+        self.a = ApkgReader(a, fetch_size=fetch_size, tmp_dir=tmp_dir, guid_index=True)
+        self.b = ApkgReader(b, fetch_size=fetch_size, tmp_dir=tmp_dir, guid_index=True)
+        self.conn: sqlite3.Connection
+
+    def __enter__(self) -> "PackageDiff":
+        try:
+            self._stack.enter_context(self.a)
+            self._stack.enter_context(self.b)
+            self.conn = self._stack.enter_context(contextlib.closing(sqlite3.connect("file::memory:", uri=True)))
+            self.conn.execute("ATTACH DATABASE ? AS a", (self.a.uri(),))
+            self.conn.execute("ATTACH DATABASE ? AS b", (self.b.uri(),))
+        except BaseException:
+            self._stack.close()
+            raise
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._stack.close()
+
+    def _only_in(self, this: str, other: str) -> Iterator[dict[str, Any]]:
+        cursor = self.conn.execute(
+            f"SELECT n.guid, n.mid, n.flds FROM {this}.notes AS n "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {other}.notes AS o WHERE o.guid = n.guid) ORDER BY n.id"
+        )
+        for guid, mid, flds in _rows(cursor, self.fetch_size):
+            yield {"guid": guid, "notetype": mid, "fields": flds.split("\x1f")}
+
+    def added_notes(self) -> Iterator[dict[str, Any]]:
+        """Notes of `b` whose guids aren't in `a`."""
+        return self._only_in("b", "a")
+
+    def removed_notes(self) -> Iterator[dict[str, Any]]:
+        """Notes of `a` whose guids aren't in `b`."""
+        return self._only_in("a", "b")
+
+    def modified_notes(self) -> Iterator[dict[str, Any]]:
+        """
+        Notes in both packages whose notetype, fields or tags differ, with only what changed: changed fields as
+        `{name: [old, new]}`, and the tags added and removed.
+        """
+        field_names = {notetype["id"]: [field["name"] for field in notetype["flds"]] for notetype in self.b.notetypes()}
+        cursor = self.conn.execute(
+            "SELECT new.guid, old.mid, new.mid, old.flds, new.flds, old.tags, new.tags "
+            "FROM b.notes AS new JOIN a.notes AS old ON old.guid = new.guid "
+            "WHERE old.mid != new.mid OR old.flds != new.flds OR old.tags != new.tags ORDER BY new.id"
+        )
+        for guid, old_mid, new_mid, old_flds, new_flds, old_tags, new_tags in _rows(cursor, self.fetch_size):
+            change: dict[str, Any] = {"guid": guid}
+            if old_mid != new_mid:
+                change["notetype"] = [old_mid, new_mid]
+            if old_flds != new_flds:
+                names = field_names.get(new_mid, [])
+                # a notetype change can change the number of fields, so pad the shorter side with None
+                change["fields"] = {
+                    names[i] if i < len(names) else str(i): [old, new]
+                    for i, (old, new) in enumerate(zip_longest(old_flds.split("\x1f"), new_flds.split("\x1f")))
+                    if old != new
+                }
+            if old_tags != new_tags:
+                old_set = set(old_tags.split())
+                new_set = set(new_tags.split())
+                change["tags"] = {"added": sorted(new_set - old_set), "removed": sorted(old_set - new_set)}
+            yield change
+
+    def notetypes(self) -> dict[str, list[Any]]:
+        """Notetypes added, removed and modified, matched by id."""
+        return _diff_notetypes(self.a, self.b)
+
+    def media(self) -> dict[str, list[str]]:
+        """Media files added, removed and modified (by content hash), matched by filename."""
+        return _diff_media(self.a, self.b)
+
+    def summary(self) -> dict[str, int]:
+        """Counts of notes added, removed and modified, without reading the notes into Python."""
+        [(added,)] = self.conn.execute(
+            "SELECT count(*) FROM b.notes AS n WHERE NOT EXISTS (SELECT 1 FROM a.notes AS o WHERE o.guid = n.guid)"
+        )
+        [(removed,)] = self.conn.execute(
+            "SELECT count(*) FROM a.notes AS n WHERE NOT EXISTS (SELECT 1 FROM b.notes AS o WHERE o.guid = n.guid)"
+        )
+        [(modified,)] = self.conn.execute(
+            "SELECT count(*) FROM b.notes AS new JOIN a.notes AS old ON old.guid = new.guid "
+            "WHERE old.mid != new.mid OR old.flds != new.flds OR old.tags != new.tags"
+        )
+        return {"added": added, "removed": removed, "modified": modified}
@@ -0,0 +1,215 @@
+from collections import Counter
+from collections.abc import Iterable, Iterator, Sequence
+import contextlib
+import itertools
+import os
+from pathlib import Path
+import tempfile
+from typing import Any
+from zipfile import ZIP_STORED, ZipFile
+
+import pyzstd
+
+import anki.collection
+import anki.models
+import anki.notes
+from anki import import_export_pb2, notes_pb2
+
+from genanki.card import schedule_cards
+from genanki.media import MediaSource, write_media
+from genanki.merge import MODERN_COLLECTION, copy_member, write_collection
+from genanki.model import Model
+from genanki.note import Note
+from genanki.reader import extract_collection
+
+
+class ExistingPackage:
+    """
+    An .apkg opened for changes, from `Package.open_existing`. Notes are added, updated and removed in the package's
+    own collection, and `save` writes the package back: the collection (and, if media was added, the media map) is
+    rewritten, and every other member of the zip, including all existing media, is copied across as it is.
+
+        with genanki.Package.open_existing("deck.apkg") as package:
+            package.add_notes(new_notes, deck="Vocab")
+            package.remove_notes([old_guid])
+            package.save()
+
+    Closing without saving discards the changes.
+    """
+
+    def __init__(self, path: str | os.PathLike[str], *, tmp_dir: str | None = None):
+        self.path = Path(path)
+        self._tmp_dir = tmp_dir
+        self._stack = contextlib.ExitStack()
+        self._new_media: list[MediaSource] = []
+        # model fingerprint -> id of the notetype added for it; Anki renames a notetype whose name is taken
+        self._added_notetypes: dict[str, anki.models.NotetypeId] = {}
+        self.zip_file: ZipFile
+        self.col: anki.collection.Collection
+
+    def __enter__(self) -> "ExistingPackage":
+        try:
+            self.zip_file = self._stack.enter_context(ZipFile(self.path))
+            if MODERN_COLLECTION not in self.zip_file.namelist():
+                raise ValueError(f"{self.path} is in a legacy format; re-export it with a current version of Anki")
+            workdir = Path(self._stack.enter_context(tempfile.TemporaryDirectory(dir=self._tmp_dir)))
+            self._db_path = workdir / "collection.anki2"
+            with self._db_path.open("wb") as dest:
+                extract_collection(self.zip_file, dest)
+            self.col = anki.collection.Collection(str(self._db_path))
+            self._stack.callback(self._close_collection)
+            # Anki doesn't index notes by guid; the index is dropped again before saving
+            self.col.db.execute("CREATE INDEX IF NOT EXISTS ix_notes_guid ON notes (guid)")
+        except BaseException:
+            self._stack.close()
+            raise
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._stack.close()
+
+    def _close_collection(self) -> None:
+        if self.col.db is not None:
+            self.col.close(downgrade=False)
+
+    def _note_ids(self, guids: Sequence[str]) -> dict[str, anki.notes.NoteId]:
+        found: dict[str, anki.notes.NoteId] = {}
+        # stay under SQLite's limit on the number of parameters
+        for start in range(0, len(guids), 500):
+            chunk = guids[start:start + 500]
+            for nid, guid in self.col.db.all(
+                f"SELECT id, guid FROM notes WHERE guid IN ({', '.join('?' * len(chunk))})", *chunk,
+            ):
+                found[guid] = anki.notes.NoteId(nid)
+        return found
+
+    def _notetype_id(self, model: Model[Any]) -> anki.models.NotetypeId:
+        """
+        The id of the notetype with `model`'s name and field and template names, adding the model if the package has no
+        such notetype (even if it has an unrelated one with the same name).
+        """
+        fingerprint = model.fingerprint
+        if fingerprint in self._added_notetypes:
+            model.model_id = self._added_notetypes[fingerprint]
+            return model.model_id
+
+        definition = ([f["name"] for f in model.fields], [t["name"] for t in model.templates])
+        notetype = self.col.models.by_name(model.name)
+        if notetype is not None and definition == (
+            [f["name"] for f in notetype["flds"]], [t["name"] for t in notetype["tmpls"]],
+        ):
+            ntid = anki.models.NotetypeId(notetype["id"])
+        else:
+            ntid = anki.models.NotetypeId(self.col._backend.add_notetype(model.req).id)
+            self._added_notetypes[fingerprint] = ntid
+        model.model_id = ntid
+        return ntid
+
+    def add_notes(self, notes: Iterable[Note[Any]], *, deck: str, chunk_size: int = 10_000) -> int:
+        """
+        Add `notes` to the deck named `deck` (created if need be), with their due positions and card scheduling. Raises
+        ValueError, adding none of a chunk, if one of its notes has the guid of a note already in the package or of
+        another note in the chunk. Returns the number of notes added.
+        """
+        deck_id = self.col.decks.id(deck)
+        assert deck_id is not None
+        count = 0
+        iterator = iter(notes)
+        while chunk := list(itertools.islice(iterator, chunk_size)):
+            guids = [note.guid for note in chunk]
+            repeated = [guid for guid, n in Counter(guids).items() if n > 1]
+            if repeated:
+                raise ValueError(f"{len(repeated)} guids are repeated in the notes to add, e.g. {repeated[0]!r}")
+            existing = self._note_ids(guids)
+            if existing:
+                raise ValueError(f"{len(existing)} notes are already in the package, e.g. {next(iter(existing))!r}")
+            for model in {id(note.model): note.model for note in chunk}.values():
+                self._notetype_id(model)
+            added = self.col._backend.add_notes(
+                requests=[notes_pb2.AddNoteRequest(note=note.req, deck_id=deck_id) for note in chunk],
+            )
+            schedule_cards(self.col, ((nid, note.due, note._cards) for nid, note in zip(added.nids, chunk)))
+            count += len(chunk)
+        return count
+
+    def update_notes(self, notes: Iterable[Note[Any]], *, chunk_size: int = 10_000) -> int:
+        """
+        Replace the fields and tags of the notes in the package with the same guids as `notes`, keeping their cards and
+        scheduling. Raises KeyError for a note that isn't in the package. Returns the number of notes updated.
+        """
+        count = 0
+        iterator = iter(notes)
+        while chunk := list(itertools.islice(iterator, chunk_size)):
+            ids = self._note_ids([note.guid for note in chunk])
+            updated = []
+            for note in chunk:
+                if note.guid not in ids:
+                    raise KeyError(f"No note with guid {note.guid!r} in {self.path}")
+                anki_note = self.col.get_note(ids[note.guid])
+                if anki_note.note_type()["name"] != note.model.name:
+                    raise ValueError(
+                        f"Note {note.guid!r} is a {anki_note.note_type()['name']!r} note, not {note.model.name!r}"
+                    )
+                anki_note.fields = note._field_values()
+                anki_note.tags = [str(tag) for tag in note._tags]
+                updated.append(anki_note)
+            self.col.update_notes(updated)
+            count += len(updated)
+        return count
+
+    def remove_notes(self, guids: Iterable[str], *, chunk_size: int = 10_000) -> int:
+        """Remove the notes with `guids` and their cards, ignoring guids not in the package. Returns the number removed."""
+        count = 0
+        iterator = iter(guids)
+        while chunk := list(itertools.islice(iterator, chunk_size)):
+            ids = list(self._note_ids(chunk).values())
+            if ids:
+                self.col.remove_notes(ids)
+            count += len(ids)
+        return count
+
+    def add_media_files(self, sources: Iterable[MediaSource]) -> None:
+        """
+        Add media files (paths, or MediaFiles with their content) to the package when it's saved; existing media is
+        left as it is.
+        """
+        self._new_media.extend(sources)
+
+    def notes(self) -> Iterator[tuple[str, list[str]]]:
+        """The (guid, fields) of the notes currently in the package."""
+        for guid, flds in self.col.db.execute("SELECT guid, flds FROM notes ORDER BY id"):
+            yield guid, flds.split("\x1f")
+
+    def save(self, file: str | os.PathLike[str] | None = None) -> None:
+        """
+        Write the package to `file`, by default replacing the one it was opened from, and close it. Only the collection
+        and the media map are rewritten; other members are copied as they are.
+        """
+        target = Path(file) if file is not None else self.path
+        self.col.db.execute("DROP INDEX IF EXISTS ix_notes_guid")
+        self.col.close(downgrade=False)
+
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            with ZipFile(tmp_name, "w", ZIP_STORED) as out:
+                write_collection(out, self._db_path)
+                for info in self.zip_file.infolist():
+                    if info.filename == MODERN_COLLECTION or (info.filename == "media" and self._new_media):
+                        continue
+                    copy_member(self.zip_file, info.filename, out)
+                if self._new_media:
+                    self._write_media(out)
+            # close the original before replacing it
+            self._stack.close()
+            os.replace(tmp_name, target)
+        finally:
+            Path(tmp_name).unlink(missing_ok=True)
+            self._stack.close()
+
+    def _write_media(self, out: ZipFile) -> None:
+        try:
+            entries = import_export_pb2.MediaEntries.FromString(pyzstd.decompress(self.zip_file.read("media")))
+        except KeyError:
+            entries = import_export_pb2.MediaEntries()
+        write_media(out, self._new_media, entries)
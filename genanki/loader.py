@@ -0,0 +1,169 @@
+"""
+Load an .apkg back into genanki objects: notetypes become models (with FieldSpec and TemplateSpec classes made by
+`make_model_spec`), decks become `Deck`s, and notes are streamed as `LazyNote`s, which only decode their fields when
+they're accessed.
+"""
+
+from collections.abc import Iterator
+import os
+from typing import Any
+
+import anki.decks
+import anki.models
+
+from genanki.deck import Deck
+from genanki.model import (
+    FieldData,
+    FieldSpec,
+    HtmlValidation,
+    ModelType,
+    PartialUnnamedTemplateData,
+    RealizedModel,
+    make_model_spec,
+)
+from genanki.note import VirtualNote, _field_names
+from genanki.reader import ApkgReader
+
+_TEMPLATE_KEYS = PartialUnnamedTemplateData.__optional_keys__
+
+
+def model_from_notetype(notetype: dict[str, Any]) -> RealizedModel[Any]:
+    """A model equivalent to `notetype`, in the form `ApkgReader.notetypes` yields."""
+    fields = [
+        FieldData(
+            name=f["name"],
+            ord=f["ord"],
+            font=f.get("font"),
+            media=f.get("media", []),
+            rtl=f.get("rtl", False),
+            size=f.get("size", 20),
+            sticky=f.get("sticky", False),
+        )
+        for f in notetype["flds"]
+    ]
+    templates = [
+        {"name": t["name"], **{key: value for key, value in t.items() if key in _TEMPLATE_KEYS}}
+        for t in notetype["tmpls"]
+    ]
+    return RealizedModel(
+        model_id=anki.models.NotetypeId(notetype["id"]),
+        name=notetype["name"],
+        model_spec=make_model_spec(notetype["name"], fields, templates),  # type: ignore
+        css=notetype.get("css", ""),
+        latex_pre=notetype.get("latexPre", ""),
+        latex_post=notetype.get("latexPost", ""),
+        model_type=ModelType(notetype.get("type", ModelType.FRONT_BACK)),
+        sort_field_index=notetype.get("sortf", 0),
+        # Anki has accepted the fields already, and third-party decks often have tags genanki would reject
+        html_validation=HtmlValidation.OFF,
+    )
+
+
+class LazyNote:
+    """
+    A note read from a package. It holds the note's row as it was stored, and only splits and decodes its fields when
+    `values` or `fields` is accessed, so scanning a package (by tag, say) is cheap.
+    """
+
+    __slots__ = ("model", "guid", "deck_id", "due", "_tags", "_flds", "_fields")
+
+    def __init__(self, model: RealizedModel[Any], guid: str, deck_id: int, due: int, tags: str, flds: str):
+        self.model = model
+        self.guid = guid
+        self.deck_id = deck_id
+        self.due = due
+        self._tags = tags
+        self._flds = flds
+        self._fields: FieldSpec | None = None
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(model={self.model.name!r}, guid={self.guid!r})"
+
+    @property
+    def tags(self) -> list[str]:
+        return self._tags.split()
+
+    @property
+    def values(self) -> list[str]:
+        """The raw field values, in order."""
+        return self._flds.split("\x1f")
+
+    @property
+    def fields(self) -> FieldSpec:
+        """The fields as an instance of the model's FieldSpec, built on first access."""
+        if self._fields is None:
+            fields_cls = self.model.model_spec.fields
+            names = _field_names(fields_cls)
+            values = self.values
+            # tolerate notes with more or fewer fields than their notetype, as Anki does
+            values += [""] * (len(names) - len(values))
+            self._fields = fields_cls(**dict(zip(names, values)))
+        return self._fields
+
+    def to_note(self) -> VirtualNote[Any]:
+        """A genanki note with the same model, fields, tags, guid and due position."""
+        return VirtualNote(model=self.model, fields=self.fields, tags=self.tags, guid=self.guid, due=self.due)
+
+
+class PackageLoader:
+    """
+    Read the models, decks and notes of an .apkg as genanki objects.
+
+        with PackageLoader("shared.apkg") as loader:
+            tagged = [note.to_note() for note in loader.notes() if "verb" in note.tags]
+
+    `models` maps notetype ids to models and `decks` deck ids to (empty) `Deck`s; `notes` streams the notes.
+    """
+
+    def __init__(self, path: str | os.PathLike[str], *, fetch_size: int = 1000, tmp_dir: str | None = None):
+        self.reader = ApkgReader(path, fetch_size=fetch_size, tmp_dir=tmp_dir)
+        self.models: dict[int, RealizedModel[Any]] = {}
+        self.decks: dict[int, Deck] = {}
+
+    def __enter__(self) -> "PackageLoader":
+        self.reader.__enter__()
+        try:
+            self.models = {notetype["id"]: model_from_notetype(notetype) for notetype in self.reader.notetypes()}
+            self.decks = {
+                deck["id"]: Deck(name=deck["name"], description=deck["desc"], deck_id=anki.decks.DeckId(deck["id"]))
+                for deck in self.reader.decks()
+                if not deck["dyn"]
+            }
+        except BaseException:
+            self.reader.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.reader.__exit__(*exc_info)
+
+    def notes(self) -> Iterator[LazyNote]:
+        """
+        The notes, in the order they were added. A note's deck and due position are those of its first card (its
+        original deck, for a card in a filtered deck).
+        """
+        for guid, mid, tags, flds, did, odid, due, odue in self.reader._rows(
+            "SELECT n.guid, n.mid, n.tags, n.flds, c.did, c.odid, c.due, c.odue FROM notes AS n "
+            "LEFT JOIN cards AS c ON c.id = (SELECT id FROM cards WHERE nid = n.id ORDER BY ord LIMIT 1) "
+            "ORDER BY n.id"
+        ):
+            if odid:
+                did, due = odid, odue
+            yield LazyNote(self.models[mid], guid, did or 0, due or 0, tags, flds)
+
+
+def load_package(path: str | os.PathLike[str]) -> list[Deck]:
+    """
+    Load a package into `Deck`s holding its models and notes, e.g. to transform it and write it out again. Every note
+    is built, so for large packages iterate `PackageLoader.notes` instead.
+    """
+    with PackageLoader(path) as loader:
+        decks = dict(loader.decks)
+        for note in loader.notes():
+            deck = decks.get(note.deck_id)
+            if deck is None:
+                # cards in a deck the package doesn't include
+                deck = decks[note.deck_id] = Deck(name="Default", deck_id=anki.decks.DeckId(note.deck_id))
+            deck.add_note(note.to_note())
+    # Anki's empty Default deck is in every package
+    return [deck for deck in decks.values() if deck.notes]
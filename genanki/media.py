@@ -0,0 +1,206 @@
+"""
+Find the media files that notes and models refer to, and write media files into packages.
+"""
+
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import hashlib
+import html
+import io
+import os
+from pathlib import Path
+import re
+from typing import Any, BinaryIO, NamedTuple
+import warnings
+import weakref
+from zipfile import ZipFile
+
+import pyzstd
+
+from anki import import_export_pb2
+
+from genanki.model import VirtualModel
+from genanki.reader import COPY_BUFFER_SIZE
+
+# every kind of reference in one pattern, so text is scanned once: media tags (as Anki's media check finds them),
+# [sound:...] tags and CSS url(...)s, each quoted either way or unquoted
+_MEDIA_RE = re.compile(
+    r"""<(?:img|audio|video|source|object)\b[^>]*?\b(?:src|data)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))"""
+    r"""|\[sound:([^\]]+)\]"""
+    r"""|\burl\(\s*(?:"([^"]*)"|'([^']*)'|([^\s"')]+))\s*\)""",
+    re.IGNORECASE,
+)
+_REMOTE_RE = re.compile(r"^(?:[a-z][a-z0-9+.-]*:|//)", re.IGNORECASE)
+
+# unseekable streams that have been read, which would silently give empty media if read again
+_consumed_streams: "weakref.WeakSet[BinaryIO]" = weakref.WeakSet()
+
+
+class MissingMediaWarning(UserWarning):
+    pass
+
+
+class MediaFile(NamedTuple):
+    """
+    A media file that needn't be on disk, e.g. generated audio: its name in the package, and its content as bytes, a
+    binary stream, or a function that opens one. A function is only called when the file is written, and the stream it
+    returns is closed afterwards; a stream passed in is read from the start to the end but left open. A stream that
+    can't seek can only be read once, so writing its package again raises ValueError.
+    """
+
+    name: str
+    data: bytes | BinaryIO | Callable[[], BinaryIO]
+    # identifies the content for `genanki.cache.package_key`, which can't hash a stream without consuming it. Bytes are
+    # hashed when there's no key.
+    key: str | None = None
+
+
+type MediaSource = str | os.PathLike[str] | MediaFile
+
+
+def media_name(source: MediaSource) -> str:
+    """The name a media file has in the package."""
+    return source.name if isinstance(source, MediaFile) else os.path.basename(source)
+
+
+@contextmanager
+def open_media(source: MediaSource) -> Iterator[BinaryIO]:
+    """A binary stream of the media file's content."""
+    if not isinstance(source, MediaFile):
+        with open(source, "rb") as fp:
+            yield fp
+    elif isinstance(source.data, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source.data)
+    elif callable(source.data):
+        with source.data() as fp:
+            yield fp
+    elif source.data.seekable():
+        source.data.seek(0)
+        yield source.data
+    elif source.data in _consumed_streams:
+        raise ValueError(
+            f"the stream of media file {source.name!r} was already read and can't seek back; "
+            "pass a function that opens it instead",
+        )
+    else:
+        _consumed_streams.add(source.data)
+        yield source.data
+
+
+def media_references(text: str) -> set[str]:
+    """The names of the local media files `text` (a field value, template or stylesheet) refers to."""
+    names: set[str] = set()
+    for match in _MEDIA_RE.finditer(text):
+        name = html.unescape(next(group for group in match.groups() if group is not None)).strip()
+        # skip URLs and data: URIs, and template placeholders like src="{{Image}}"
+        if name and not _REMOTE_RE.match(name) and "{{" not in name:
+            names.add(name)
+    return names
+
+
+def model_media_references(model: VirtualModel[Any]) -> set[str]:
+    """The media files a model's templates and CSS refer to, like fonts and logos (usually named with a leading _)."""
+    return media_references("\n".join([model.css, *(t["qfmt"] + t["afmt"] for t in model.templates)]))
+
+
+def _references_in_chunk(values: list[str]) -> set[str]:
+    return set().union(*map(media_references, values))
+
+
+def scan_media_references(
+    values: Iterable[str], *, max_workers: int | None = None, chunk_size: int = 4096,
+) -> set[str]:
+    """
+    The media files referred to by any of `values`. Each distinct value is scanned only once; with `max_workers` > 1
+    the values are split into chunks of `chunk_size` and scanned across a process pool.
+    """
+    unique_values = list(dict.fromkeys(values))
+    chunks = [unique_values[i:i + chunk_size] for i in range(0, len(unique_values), chunk_size)]
+
+    if max_workers is not None and max_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_references_in_chunk, chunks))
+    else:
+        results = map(_references_in_chunk, chunks)
+
+    return set().union(*results)
+
+
+def resolve_media(
+    references: Iterable[str], media_files: Iterable[MediaSource], media_root: str | os.PathLike[str] | None = None,
+) -> list[MediaSource]:
+    """
+    The referenced media files: those in `media_files` (matched by name), then paths of those found in
+    `media_root`. Unreferenced entries of `media_files` are dropped, and a MissingMediaWarning lists references found
+    in neither.
+    """
+    wanted = set(references)
+    resolved: dict[str, MediaSource] = {}
+    for source in media_files:
+        name = media_name(source)
+        if name in wanted and name not in resolved:
+            resolved[name] = source
+
+    missing: list[str] = []
+    for name in sorted(wanted - resolved.keys()):
+        # media names are flat; a name with a directory in it can't be in the collection's media folder
+        candidate = Path(media_root, name) if media_root is not None and name == os.path.basename(name) else None
+        if candidate is not None and candidate.is_file():
+            resolved[name] = str(candidate)
+        else:
+            missing.append(name)
+
+    if missing:
+        warnings.warn(
+            MissingMediaWarning(f"{len(missing)} referenced media files weren't found, e.g. {missing[0]!r}"),
+            stacklevel=2,
+        )
+    return list(resolved.values())
+
+
+def _write_media_member(out: ZipFile, member: str, source: MediaSource) -> tuple[int, bytes]:
+    """Stream the media file into `out` zstd-compressed, returning its size and SHA-1."""
+    size = 0
+    sha1 = hashlib.sha1()
+    with open_media(source) as src, out.open(member, "w", force_zip64=True) as dest:
+        with pyzstd.ZstdFile(dest, "w") as compressed:
+            while chunk := src.read(COPY_BUFFER_SIZE):
+                size += len(chunk)
+                sha1.update(chunk)
+                compressed.write(chunk)
+    return size, sha1.digest()
+
+
+def write_media(
+    out: ZipFile,
+    sources: Iterable[MediaSource],
+    entries: import_export_pb2.MediaEntries | None = None,
+) -> None:
+    """
+    Add media files to a current-format package, after the files already listed in `entries`, and write its media map.
+    Members are named by their position in the map and each file is streamed in once, so none is held in memory.
+    """
+    entries = entries if entries is not None else import_export_pb2.MediaEntries()
+    for i, source in enumerate(sources, start=len(entries.entries)):
+        size, sha1 = _write_media_member(out, str(i), source)
+        entries.entries.add(name=media_name(source), size=size, sha1=sha1)
+    out.writestr("media", pyzstd.compress(entries.SerializeToString()))
+
+
+def rename_media_references(text: str, renames: dict[str, str]) -> str:
+    """`text` with its references to the media files in `renames` changed to their new names."""
+
+    def replace(match: re.Match[str]) -> str:
+        group = next(i for i, value in enumerate(match.groups(), start=1) if value is not None)
+        name = html.unescape(match[group]).strip()
+        if name not in renames:
+            return match[0]
+        new_name = renames[name]
+        if match[group].strip() != name:
+            # keep the reference HTML-escaped, as it was
+            new_name = html.escape(new_name, quote=False)
+        start, end = match.start(group) - match.start(), match.end(group) - match.start()
+        return match[0][:start] + new_name + match[0][end:]
+
+    return _MEDIA_RE.sub(replace, text)
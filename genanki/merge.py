@@ -0,0 +1,400 @@
+"""
+Merge .apkg files at the SQLite level.
+
+The first package's collection is extracted as the base of the output, and every other package is ATTACHed to it in
+turn and copied in with `INSERT ... SELECT`, a batch of rows at a time. Note, card and revlog ids are shifted past the
+ids already in the output, notetypes and decks are matched by definition and name, and notes are deduplicated by guid.
+Media files are deduplicated by content, and note fields are rewritten to refer to a file's name in the output where it
+differs. Only one input is extracted at a time, so memory and scratch space don't grow with the number of inputs.
+"""
+
+from collections.abc import Iterable, Sequence
+import contextlib
+from enum import Enum
+import os
+from pathlib import Path
+import shutil
+import sqlite3
+import tempfile
+from zipfile import ZIP_STORED, ZipFile
+
+import pyzstd
+
+from anki import import_export_pb2, notetypes_pb2
+
+from genanki.media import rename_media_references
+from genanki.reader import (
+    COPY_BUFFER_SIZE,
+    ApkgReader,
+    MediaEntry,
+    _unicase,
+    extract_collection,
+    read_media_map,
+)
+
+MODERN_COLLECTION = "collection.anki21b"
+
+
+class MergePolicy(str, Enum):
+    """Which note wins when packages have notes with the same guid."""
+
+    # the note from the package listed first
+    FIRST = "first"
+    # the note from the package listed last
+    LAST = "last"
+    # the most recently modified note
+    NEWEST = "newest"
+
+
+def write_collection(out: ZipFile, db_path: Path) -> None:
+    """Stream the collection at `db_path` into `out`, zstd-compressed, as a current-format collection."""
+    with db_path.open("rb") as src, out.open(MODERN_COLLECTION, "w", force_zip64=True) as dest:
+        with pyzstd.ZstdFile(dest, "w") as compressed:
+            shutil.copyfileobj(src, compressed, COPY_BUFFER_SIZE)
+
+
+def copy_member(src: ZipFile, name: str, out: ZipFile, dest_name: str | None = None) -> None:
+    """
+    Stream the member `name` of `src` into `out`. Current-format packages store their (already zstd-compressed)
+    members without zip compression, so this is a plain copy.
+    """
+    with src.open(name) as fp, out.open(dest_name or name, "w", force_zip64=True) as dest:
+        shutil.copyfileobj(fp, dest, COPY_BUFFER_SIZE)
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.create_collation("unicase", _unicase)
+    # a scratch database, rebuilt rather than recovered
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    return conn
+
+
+def _batches(conn: sqlite3.Connection, table: str, batch_size: int) -> Iterable[tuple[int, int]]:
+    """Consecutive (first id, last id) ranges of `table`, each covering at most `batch_size` rows."""
+    [(last,)] = conn.execute(f"SELECT min(id) - 1 FROM {table}")
+    while last is not None:
+        [(first, last)] = conn.execute(
+            f"SELECT min(id), max(id) FROM (SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?)", (last, batch_size),
+        )
+        if first is not None:
+            yield first, last
+
+
+def _offset(conn: sqlite3.Connection, table: str) -> int:
+    """How far to shift the ids of `src.table` so they all come after the ids of `main.table`."""
+    [(main_max,)] = conn.execute(f"SELECT max(id) FROM main.{table}")
+    [(src_min,)] = conn.execute(f"SELECT min(id) FROM src.{table}")
+    if main_max is None or src_min is None:
+        return 0
+    return max(0, main_max - src_min + 1)
+
+
+def _notetype_definition(conn: sqlite3.Connection, schema: str, ntid: int) -> tuple[object, ...]:
+    """
+    What makes two notetypes the same, for sharing one between packages. The config blobs themselves differ between
+    collections even for identical notetypes, e.g. in the random ids Anki gives fields and templates.
+    """
+    [(name, config_bytes)] = conn.execute(f"SELECT name, config FROM {schema}.notetypes WHERE id = ?", (ntid,))
+    config = notetypes_pb2.Notetype.Config.FromString(config_bytes)
+    fields = tuple(
+        name for (name,) in conn.execute(f"SELECT name FROM {schema}.fields WHERE ntid = ? ORDER BY ord", (ntid,))
+    )
+    templates = tuple(
+        (template_name, template_config.q_format, template_config.a_format)
+        for template_name, template_config in (
+            (template_name, notetypes_pb2.Notetype.Template.Config.FromString(template_config_bytes))
+            for template_name, template_config_bytes in conn.execute(
+                f"SELECT name, config FROM {schema}.templates WHERE ntid = ? ORDER BY ord", (ntid,),
+            )
+        )
+    )
+    return (
+        name, config.kind, config.css, config.latex_pre, config.latex_post, config.sort_field_idx, fields, templates,
+    )
+
+
+class _Merger:
+    def __init__(self, conn: sqlite3.Connection, policy: MergePolicy, batch_size: int):
+        self.conn = conn
+        self.policy = policy
+        self.batch_size = batch_size
+        # the media renames of the package being merged, applied to its notes' fields as they're copied
+        self.media_renames: dict[str, str] = {}
+        self.conn.create_function("rename_media", 1, self._rename_media, deterministic=True)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_notes_guid ON notes (guid)")
+        self.conn.execute("CREATE TEMP TABLE ntmap (old integer primary key, new integer not null)")
+        self.conn.execute("CREATE TEMP TABLE dmap (old integer primary key, new integer not null)")
+        # notetype definition -> id in the output, so identical notetypes from different packages are shared
+        self.notetypes = {
+            _notetype_definition(conn, "main", ntid): ntid for (ntid,) in conn.execute("SELECT id FROM main.notetypes")
+        }
+
+    def _rename_media(self, flds: str) -> str:
+        return rename_media_references(flds, self.media_renames) if self.media_renames else flds
+
+    def rename_base_media(self, renames: dict[str, str]) -> None:
+        """Rewrite the media references of the notes already in the output."""
+        if not renames:
+            return
+        self.media_renames = renames
+        self.conn.execute("BEGIN")
+        self.conn.execute("UPDATE main.notes SET flds = rename_media(flds)")
+        self.conn.execute("COMMIT")
+
+    def merge(self, uri: str, media_renames: dict[str, str]) -> None:
+        self.media_renames = media_renames
+        self.conn.execute("ATTACH DATABASE ? AS src", (uri,))
+        try:
+            [(version,)] = self.conn.execute("SELECT ver FROM main.col")
+            [(src_version,)] = self.conn.execute("SELECT ver FROM src.col")
+            if src_version != version:
+                raise ValueError(f"Can't merge a collection of schema {src_version} into one of schema {version}")
+            self.conn.execute("BEGIN")
+            self._map_notetypes()
+            self._map_decks()
+            self.conn.execute("INSERT OR IGNORE INTO main.deck_config SELECT * FROM src.deck_config")
+            self.conn.execute("INSERT OR IGNORE INTO main.tags SELECT * FROM src.tags")
+            self.conn.execute("COMMIT")
+            self._remove_losers()
+            self._copy_notes()
+        finally:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+            self.conn.execute("DELETE FROM temp.ntmap")
+            self.conn.execute("DELETE FROM temp.dmap")
+            self.conn.execute("DETACH DATABASE src")
+
+    def _map_notetypes(self) -> None:
+        for (ntid,) in self.conn.execute("SELECT id FROM src.notetypes").fetchall():
+            definition = _notetype_definition(self.conn, "src", ntid)
+            new_id = self.notetypes.get(definition)
+            if new_id is None:
+                new_id = self._free_id("notetypes", ntid)
+                name = self._free_name("notetypes", definition[0])
+                self.conn.execute(
+                    "INSERT INTO main.notetypes (id, name, mtime_secs, usn, config) "
+                    "SELECT ?, ?, mtime_secs, usn, config FROM src.notetypes WHERE id = ?",
+                    (new_id, name, ntid),
+                )
+                self.conn.execute(
+                    "INSERT INTO main.fields (ntid, ord, name, config) SELECT ?, ord, name, config FROM src.fields "
+                    "WHERE ntid = ?",
+                    (new_id, ntid),
+                )
+                self.conn.execute(
+                    "INSERT INTO main.templates (ntid, ord, name, mtime_secs, usn, config) "
+                    "SELECT ?, ord, name, mtime_secs, usn, config FROM src.templates WHERE ntid = ?",
+                    (new_id, ntid),
+                )
+                self.notetypes[definition] = new_id
+            self.conn.execute("INSERT INTO temp.ntmap VALUES (?, ?)", (ntid, new_id))
+
+    def _map_decks(self) -> None:
+        # decks with the same name (ignoring case, as Anki does) are merged
+        for deck_id, name in self.conn.execute("SELECT id, name FROM src.decks").fetchall():
+            found = self.conn.execute("SELECT id FROM main.decks WHERE name = ? COLLATE unicase", (name,)).fetchone()
+            if found is not None:
+                new_id = found[0]
+            else:
+                new_id = self._free_id("decks", deck_id)
+                self.conn.execute(
+                    "INSERT INTO main.decks (id, name, mtime_secs, usn, common, kind) "
+                    "SELECT ?, name, mtime_secs, usn, common, kind FROM src.decks WHERE id = ?",
+                    (new_id, deck_id),
+                )
+            self.conn.execute("INSERT INTO temp.dmap VALUES (?, ?)", (deck_id, new_id))
+
+    def _free_id(self, table: str, wanted: int) -> int:
+        if self.conn.execute(f"SELECT 1 FROM main.{table} WHERE id = ?", (wanted,)).fetchone() is None:
+            return wanted
+        return self.conn.execute(f"SELECT max(id) + 1 FROM main.{table}").fetchone()[0]
+
+    def _free_name(self, table: str, wanted: str) -> str:
+        name, n = wanted, 1
+        while self.conn.execute(f"SELECT 1 FROM main.{table} WHERE name = ? COLLATE unicase", (name,)).fetchone():
+            n += 1
+            name = f"{wanted} ({n})"
+        return name
+
+    def _remove_losers(self) -> None:
+        """With LAST and NEWEST, drop the notes already in the output that a note of `src` replaces."""
+        if self.policy is MergePolicy.FIRST:
+            return
+        newer = "AND n.mod > o.mod" if self.policy is MergePolicy.NEWEST else ""
+        losers = f"SELECT o.id FROM main.notes AS o JOIN src.notes AS n ON n.guid = o.guid {newer}"
+        self.conn.execute("BEGIN")
+        self.conn.execute(
+            f"DELETE FROM main.revlog WHERE cid IN (SELECT id FROM main.cards WHERE nid IN ({losers}))"
+        )
+        self.conn.execute(f"DELETE FROM main.cards WHERE nid IN ({losers})")
+        self.conn.execute(f"DELETE FROM main.notes WHERE id IN ({losers})")
+        self.conn.execute("COMMIT")
+
+    def _copy_notes(self) -> None:
+        note_offset = _offset(self.conn, "notes")
+        card_offset = _offset(self.conn, "cards")
+        revlog_offset = _offset(self.conn, "revlog")
+
+        # of notes sharing a guid within one package, keep the first or the last
+        pick = "min" if self.policy is MergePolicy.FIRST else "max"
+        for first, last in _batches(self.conn, "src.notes", self.batch_size):
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                "INSERT INTO main.notes (id, guid, mid, mod, usn, tags, flds, sfld, csum, flags, data) "
+                "SELECT n.id + :offset, n.guid, m.new, n.mod, n.usn, n.tags, rename_media(n.flds), n.sfld, n.csum, "
+                "n.flags, n.data "
+                "FROM src.notes AS n JOIN temp.ntmap AS m ON m.old = n.mid "
+                "WHERE n.id BETWEEN :first AND :last "
+                f"AND n.id = (SELECT {pick}(d.id) FROM src.notes AS d WHERE d.guid = n.guid) "
+                "AND NOT EXISTS (SELECT 1 FROM main.notes AS o WHERE o.guid = n.guid)",
+                {"offset": note_offset, "first": first, "last": last},
+            )
+            self.conn.execute("COMMIT")
+
+        # the shifted ids of copied notes are all new, so a card belongs to a copied note iff its shifted nid exists
+        for first, last in _batches(self.conn, "src.cards", self.batch_size):
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                "INSERT INTO main.cards (id, nid, did, ord, mod, usn, type, queue, due, ivl, factor, reps, lapses, "
+                "left, odue, odid, flags, data) "
+                "SELECT c.id + :card_offset, c.nid + :note_offset, d.new, c.ord, c.mod, c.usn, c.type, c.queue, c.due, "
+                "c.ivl, c.factor, c.reps, c.lapses, c.left, c.odue, coalesce(od.new, 0), c.flags, c.data "
+                "FROM src.cards AS c JOIN temp.dmap AS d ON d.old = c.did LEFT JOIN temp.dmap AS od ON od.old = c.odid "
+                "WHERE c.id BETWEEN :first AND :last "
+                "AND EXISTS (SELECT 1 FROM main.notes AS n WHERE n.id = c.nid + :note_offset)",
+                {"card_offset": card_offset, "note_offset": note_offset, "first": first, "last": last},
+            )
+            self.conn.execute("COMMIT")
+
+        for first, last in _batches(self.conn, "src.revlog", self.batch_size):
+            self.conn.execute("BEGIN")
+            self.conn.execute(
+                "INSERT INTO main.revlog (id, cid, usn, ease, ivl, lastIvl, factor, time, type) "
+                "SELECT r.id + :revlog_offset, r.cid + :card_offset, r.usn, r.ease, r.ivl, r.lastIvl, r.factor, "
+                "r.time, r.type FROM src.revlog AS r "
+                "WHERE r.id BETWEEN :first AND :last "
+                "AND EXISTS (SELECT 1 FROM main.cards AS c WHERE c.id = r.cid + :card_offset)",
+                {"revlog_offset": revlog_offset, "card_offset": card_offset, "first": first, "last": last},
+            )
+            self.conn.execute("COMMIT")
+
+    def finish(self) -> None:
+        self.conn.execute("DROP INDEX IF EXISTS ix_notes_guid")
+
+
+def _content(entry: MediaEntry) -> str:
+    return entry.sha1 or f"name:{entry.filename}"
+
+
+def _plan_media(
+    inputs: Sequence[str | os.PathLike[str]],
+) -> tuple[list[tuple[int, MediaEntry]], list[dict[str, str]]]:
+    """
+    The media files to copy, as (input index, entry named as in the output), and the renames to apply to each input's
+    notes. Files are deduplicated by SHA-1: content already copied under another name is referred to by that name, and
+    a file whose name is taken by different content gets its hash appended to its name. Files named with a leading
+    underscore, which templates rather than notes refer to, keep their names unless they clash.
+    """
+    media: list[tuple[int, MediaEntry]] = []
+    renames: list[dict[str, str]] = []
+    # content (SHA-1, or the name when there's none) -> name in the output, and the reverse
+    names: dict[str, str] = {}
+    contents: dict[str, str] = {}
+    for i, path in enumerate(inputs):
+        with ZipFile(path) as zip_file:
+            entries = read_media_map(zip_file)
+        renamed: dict[str, str] = {}
+        # files whose names are free go first, so that a clashing file can take the name of the same content instead
+        for entry in sorted(entries, key=lambda e: contents.get(e.filename, _content(e)) != _content(e)):
+            content = _content(entry)
+            name = names.get(content)
+            if name is not None and (name == entry.filename or not entry.filename.startswith("_")):
+                if name != entry.filename:
+                    renamed[entry.filename] = name
+                continue
+            name = entry.filename
+            if name in contents:
+                stem, extension = os.path.splitext(name)
+                name = f"{stem}-{content[:12]}{extension}"
+                renamed[entry.filename] = name
+            names[content] = name
+            contents[name] = content
+            media.append((i, entry._replace(filename=name)))
+        renames.append(renamed)
+    return media, renames
+
+
+def _write_media(
+    out: ZipFile, inputs: Sequence[str | os.PathLike[str]], media: Sequence[tuple[int, MediaEntry]],
+) -> None:
+    """
+    Copy `media` into `out` and write its media map, opening each input once, while its files are copied. Every entry
+    needs a member of its own (Anki's importer expects entry i in member "i"), so files with the same content under
+    different names are copied once per name.
+    """
+    entries = import_export_pb2.MediaEntries()
+    # input index -> (member in the input, member in the output)
+    copies: dict[int, list[tuple[str, int]]] = {}
+    for member, (i, entry) in enumerate(media):
+        copies.setdefault(i, []).append((entry.member, member))
+        entries.entries.add(name=entry.filename, size=entry.size or 0, sha1=bytes.fromhex(entry.sha1 or ""))
+
+    for i, files in sorted(copies.items()):
+        with ZipFile(inputs[i]) as zip_file:
+            for src_member, member in files:
+                copy_member(zip_file, src_member, out, str(member))
+
+    out.writestr("media", pyzstd.compress(entries.SerializeToString()))
+
+
+def merge_packages(
+    output: str | os.PathLike[str],
+    inputs: Sequence[str | os.PathLike[str]],
+    *,
+    policy: MergePolicy = MergePolicy.FIRST,
+    batch_size: int = 100_000,
+    tmp_dir: str | None = None,
+) -> None:
+    """
+    Merge the packages `inputs` into one package at `output`, keeping one note per guid (chosen by `policy`) and one
+    copy of each media file's content (see `_plan_media`).
+
+    The inputs must be in the current package format (as exported by Anki 2.1.50+ or genanki), whose media is stored
+    compressed and is copied into the output without being recompressed. Each input is only open while it's read, so
+    the number of inputs doesn't matter.
+    """
+    if not inputs:
+        raise ValueError("Nothing to merge")
+
+    for path in inputs:
+        with ZipFile(path) as zip_file:
+            if MODERN_COLLECTION not in zip_file.NameToInfo:
+                raise ValueError(f"{path} is in a legacy format; re-export it with a current version of Anki")
+
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as workdir:
+        db_path = Path(workdir) / "collection.sqlite3"
+        with ZipFile(inputs[0]) as zip_file, db_path.open("wb") as fp:
+            extract_collection(zip_file, fp)
+
+        media, media_renames = _plan_media(inputs)
+        with contextlib.closing(_connect(db_path)) as conn:
+            merger = _Merger(conn, policy, batch_size)
+            merger.rename_base_media(media_renames[0])
+            for path, renames in zip(inputs[1:], media_renames[1:]):
+                # the reader extracts the collection (with a guid index) and removes it again on exit
+                with ApkgReader(path, tmp_dir=tmp_dir, guid_index=True) as reader:
+                    merger.merge(reader.uri(), renames)
+            merger.finish()
+
+        with ZipFile(output, "w", ZIP_STORED) as out:
+            write_collection(out, db_path)
+
+            # the placeholder collection and metadata that tell old clients to upgrade
+            with ZipFile(inputs[0]) as first:
+                for name in ("collection.anki2", "meta"):
+                    if name in first.NameToInfo:
+                        out.writestr(first.getinfo(name), first.read(name))
+
+            _write_media(out, inputs, media)
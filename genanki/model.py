@@ -1,7 +1,14 @@
-from collections.abc import Sequence
+from collections.abc import Callable, Sequence
 import dataclasses
 from enum import Enum
-from typing import Any, Generic, Literal, NotRequired, TypeVar, TypedDict, dataclass_transform
+import functools
+import hashlib
+import json
+import keyword
+import operator
+import re
+import types
+from typing import Any, ClassVar, Generic, Literal, NotRequired, TypeVar, TypedDict, dataclass_transform, overload
 
 from pydantic import TypeAdapter, ValidationError
 
@@ -15,12 +22,33 @@ from anki import notetypes_pb2
 
 import attrs
 
+from genanki import util
+
 
 class ModelType(int, Enum):
     FRONT_BACK = 0
     CLOZE = 1
 
 
+class HtmlValidation(str, Enum):
+    """When notes check their fields for things that look like invalid HTML tags."""
+
+    # while constructing each note
+    EAGER = "eager"
+    # in bulk when the package is written (see `genanki.note.check_invalid_html_tags`)
+    DEFERRED = "deferred"
+    OFF = "off"
+
+
+class GuidStrategy(str, Enum):
+    """How a note's default guid is derived from its fields."""
+
+    # hash of str(fields), i.e. the dataclass repr; kept as the default so existing decks keep their guids
+    REPR = "repr"
+    # hash of the field values only, independent of the FieldSpec's class and attribute names
+    VALUES = "values"
+
+
 class UnnamedFieldData(TypedDict):
     ord: int
     font: str | None
@@ -173,10 +201,12 @@ def template(template_data: PartialUnnamedTemplateData, *, alias: str | None = N
         )
 
 
-@dataclasses.dataclass
 class FieldSpec:
+    __genanki_frozen__: ClassVar[bool] = False
+
     def values(self) -> tuple[str, ...]:
-        return dataclasses.astuple(self)
+        # `spec` replaces this with an accessor specialized to the decorated class
+        return tuple(getattr(self, f.name) for f in dataclasses.fields(self))  # type: ignore
 
     @classmethod
     def defs(cls) -> Sequence[FieldData]:
@@ -217,21 +247,136 @@ class ModelSpec(Generic[T_co]):
     templates: type[TemplateSpec[T_co]]
 
 
+def _values_accessor(names: Sequence[str]) -> Callable[[Any], tuple[str, ...]]:
+    """Build a `FieldSpec.values` implementation that reads `names` without going through `dataclasses.astuple`."""
+    if len(names) == 1:
+        # attrgetter returns a bare value rather than a 1-tuple for a single name
+        [name] = names
+
+        def values(self: Any) -> tuple[str, ...]:
+            return (getattr(self, name),)
+    elif names:
+        getter = operator.attrgetter(*names)
+
+        def values(self: Any) -> tuple[str, ...]:
+            return getter(self)
+    else:
+        def values(self: Any) -> tuple[str, ...]:
+            return ()
+
+    return values
+
+
+@overload
+def spec[T: ModelSpec[Any]](cls: type[T], /) -> type[T]: ...
+@overload
+def spec[T: ModelSpec[Any]](*, frozen: bool = False) -> Callable[[type[T]], type[T]]: ...
+
 @dataclass_transform(field_specifiers=(ModelField, field, ModelTemplate, template), kw_only_default=True)
-def spec[T: ModelSpec[Any]](cls: type[T]) -> type[T]:
-    new_cls = dataclasses.dataclass(cls)
+def spec[T: ModelSpec[Any]](cls: type[T] | None = None, /, *, frozen: bool = False) -> type[T] | Callable[[type[T]], type[T]]:
+    def wrap(cls: type[T]) -> type[T]:
+        new_cls = dataclasses.dataclass(cls, frozen=frozen)
+
+        if dataclasses.is_dataclass(new_cls):
+            field_ord = template_ord = 0
+            for k, v in new_cls.__dataclass_fields__.items():
+                if isinstance(v, ModelField):
+                    v.__genanki_field__["name"] = k if v.alias is None else v.alias
+                    v.__genanki_field__["ord"] = field_ord
+                    field_ord += 1
+                elif isinstance(v, ModelTemplate):
+                    v.__genanki_template__["name"] = k if v.alias is None else v.alias
+                    v.__genanki_template__["ord"] = template_ord
+                    template_ord += 1
+
+        if issubclass(new_cls, FieldSpec):
+            values = _values_accessor([f.name for f in dataclasses.fields(new_cls)])
+            values.__qualname__ = f"{new_cls.__qualname__}.values"
+            setattr(new_cls, "values", values)
+            setattr(new_cls, "__genanki_frozen__", frozen)
+
+        return new_cls
+
+    if cls is None:
+        return wrap
+
+    return wrap(cls)
+
+
+def _identifier(name: str, taken: set[str]) -> str:
+    ident = re.sub(r"\W", "_", name)
+    if not ident.isidentifier() or keyword.iskeyword(ident):
+        ident = f"_{ident}"
+    while ident in taken:
+        ident = f"{ident}_"
+    taken.add(ident)
+    return ident
+
+
+def make_model_spec(
+    name: str,
+    fields: Sequence[str | FieldData],
+    templates: Sequence[PartialUnnamedTemplateData | TemplateData],
+) -> type[ModelSpec[Any]]:
+    """
+    Create a ModelSpec at runtime, e.g. from a build file or an existing notetype, rather than with a class statement.
+
+    Anki field and template names that aren't Python identifiers (like "Back Extra") are mangled into attribute names,
+    and kept as the field's or template's alias.
+    """
+    taken: set[str] = set()
+    field_ns: dict[str, Any] = {"__annotations__": {}, "__module__": __name__}
+    for f in fields:
+        f_data = FieldData(name=f, font="Arial", media=[], ord=0, rtl=False, size=20, sticky=False) if isinstance(f, str) else f
+        attr = _identifier(f_data["name"], taken)
+        field_ns["__annotations__"][attr] = str
+        field_ns[attr] = ModelField(
+            UnnamedFieldData(
+                font=f_data["font"],
+                media=f_data["media"],
+                ord=f_data["ord"],
+                rtl=f_data["rtl"],
+                size=f_data["size"],
+                sticky=f_data["sticky"],
+            ),
+            alias=f_data["name"],
+        )
+    fields_cls: type[FieldSpec] = spec(types.new_class(f"{name}.fields", (FieldSpec,), exec_body=lambda ns: ns.update(field_ns)))  # type: ignore
 
-    if dataclasses.is_dataclass(new_cls):
-        for k, v in new_cls.__dataclass_fields__.items():
-            if isinstance(v, ModelField):
-                v.__genanki_field__["name"] = k if v.alias is None else v.alias
-            elif isinstance(v, ModelTemplate):
-                v.__genanki_template__["name"] = k
+    taken = set()
+    template_ns: dict[str, Any] = {"__annotations__": {}, "__module__": __name__}
+    for i, t in enumerate(templates):
+        t_name = str(t.get("name", f"Card {i + 1}"))
+        attr = _identifier(t_name, taken)
+        template_ns["__annotations__"][attr] = str
+        template_ns[attr] = template(PartialUnnamedTemplateData(**{k: v for k, v in t.items() if k != "name"}), alias=t_name)  # type: ignore
+    templates_cls = spec(types.new_class(  # type: ignore
+        f"{name}.templates", (TemplateSpec,), {"fields": fields_cls}, exec_body=lambda ns: ns.update(template_ns),
+    ))
 
-    return new_cls
+    return type(name, (ModelSpec,), {"fields": fields_cls, "templates": templates_cls, "__module__": __name__})
+
+
+type GuidStrategyOrKeys = GuidStrategy | tuple[str, ...] | Callable[[Any], str]
+
+
+def _convert_guid_strategy(val: str | Sequence[str] | Callable[[Any], str]) -> GuidStrategyOrKeys:
+    if isinstance(val, str):
+        return GuidStrategy(val)
+    if callable(val):
+        return val
+    return tuple(val)
+
+
+def _validate_guid_strategy(self: "VirtualModel[Any]", _attr: "attrs.Attribute[GuidStrategyOrKeys]", val: GuidStrategyOrKeys) -> None:
+    if isinstance(val, tuple):
+        names = {f.name for f in dataclasses.fields(self.model_spec.fields)}
+        if not val or any(name not in names for name in val):
+            raise ValueError(f"guid_strategy must name fields of {self.model_spec.fields.__qualname__}, got {val!r}")
 
 
 M_co = TypeVar("M_co", bound=ModelSpec[FieldSpec], covariant=True, default=ModelSpec[FieldSpec])
+
 # F_co = TypeVar("F_co", bound=FieldSpec, covariant=True, default=FieldSpec)
 
 @attrs.define
@@ -247,6 +392,22 @@ class VirtualModel(Generic[M_co]):
 
     _sort_field_index: int | None = attrs.field(default=None, alias="sort_field_index", kw_only=True)
 
+    # a GuidStrategy, the names of the FieldSpec attributes that identify a note, or a callable taking the FieldSpec
+    guid_strategy: GuidStrategyOrKeys = attrs.field(
+        default=GuidStrategy.REPR, kw_only=True, converter=_convert_guid_strategy, validator=_validate_guid_strategy,
+    )
+    html_validation: HtmlValidation = attrs.field(default=HtmlValidation.EAGER, kw_only=True, converter=HtmlValidation)
+
+    def guid_for_fields(self, fields: FieldSpec) -> str:
+        strategy = self.guid_strategy
+        if strategy is GuidStrategy.REPR:
+            return util.guid_for(fields)
+        if strategy is GuidStrategy.VALUES:
+            return util.guid_for(*fields.values())
+        if isinstance(strategy, tuple):
+            return util.guid_for(*(getattr(fields, name) for name in strategy))
+        return strategy(fields)
+
     @property
     def fields(self) -> Sequence[FieldData]:
 
@@ -262,6 +423,45 @@ class VirtualModel(Generic[M_co]):
     def templates(self) -> Sequence[TemplateData]:
         return self.model_spec.templates.templates()
 
+    @functools.cached_property
+    def fingerprint(self) -> str:
+        """
+        A hash of everything that defines the model, identifying it across processes (see `genanki.note.register_models`).
+        Computed once, so don't change a model after using its fingerprint.
+        """
+        strategy = self.guid_strategy
+        if isinstance(strategy, GuidStrategy):
+            guid_strategy: Any = strategy.value
+        elif isinstance(strategy, tuple):
+            guid_strategy = list(strategy)
+        else:
+            guid_strategy = f"{strategy.__module__}.{strategy.__qualname__}"
+
+        content = {
+            "name": self.name,
+            "fields_class": f"{self.model_spec.fields.__module__}.{self.model_spec.fields.__qualname__}",
+            "fields": list(self.fields),
+            "templates": list(self.templates),
+            "css": self.css,
+            "latex_pre": self.latex_pre,
+            "latex_post": self.latex_post,
+            "model_type": int(self.model_type),
+            "sort_field_index": self.sort_field_index,
+            "guid_strategy": guid_strategy,
+        }
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+    @functools.cached_property
+    def stable_id(self) -> anki.models.NotetypeId:
+        """
+        A notetype id derived from the model's name, field names and template names (what Anki compares to decide if an
+        imported notetype is one it already has), so every build of the model gives it the same id.
+        """
+        schema = [self.name, [f["name"] for f in self.fields], [t["name"] for t in self.templates]]
+        digest = hashlib.sha256(json.dumps(schema).encode()).digest()
+        # the range genanki has always drawn model ids from
+        return anki.models.NotetypeId((1 << 30) + int.from_bytes(digest[:8]) % (1 << 30))
+
     def render(self, string: str, data: dict[str, str] | None = None) -> str:
         return string
 
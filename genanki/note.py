@@ -1,26 +1,69 @@
-from collections.abc import Iterable
+from collections import OrderedDict
+from collections.abc import Iterable, MutableSequence, Sequence
+from concurrent.futures import ProcessPoolExecutor
+import dataclasses
+import functools
+import hashlib
+import pickle
 import re
-from typing import Any, Generic, SupportsIndex, TypeVar
+import sys
+import weakref
+from typing import Any, Generic, NamedTuple, Self, SupportsIndex, TypeVar, overload
 
 import attr
 from attrs import define, field
 
 from anki import notes_pb2
 
-from genanki.util import guid_for
-from genanki.model import FieldSpec, VirtualModel, RealizedModel, ModelSpec, ModelType
+from genanki.model import FieldSpec, HtmlValidation, VirtualModel, RealizedModel, ModelSpec, ModelType
 from genanki.card import Card
 
 
+# the Tags in use, by name; shared by all notes so that e.g. a million notes with the same 20 tags hold 20 Tags. A Tag
+# drops out once nothing refers to it, so long-running processes don't keep every tag they've seen.
+_TAG_TABLE: "weakref.WeakValueDictionary[str, Tag]" = weakref.WeakValueDictionary()
+
+
 class Tag:
+    """
+    A note tag. Tags are interned: `Tag("x") is Tag("x")`, so each distinct tag is stored and validated only once.
+    """
+
+    __slots__ = ("_tag", "__weakref__")
+
     _tag: str
 
-    def __init__(self, tag: str):
-        self._tag = self._validate_tag(tag)
+    def __new__(cls, tag: str) -> "Tag":
+        if (interned := _TAG_TABLE.get(tag)) is not None:
+            return interned
+
+        self = super().__new__(cls)
+        self._tag = cls._validate_tag(sys.intern(tag))
+        return _TAG_TABLE.setdefault(self._tag, self)
+
+    def __reduce__(self):
+        # re-intern on unpickling instead of restoring a duplicate
+        return (Tag, (self._tag,))
 
     def __contains__(self, key: str, /) -> bool:
         return self._tag.__contains__(key)
 
+    def __str__(self) -> str:
+        return self._tag
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self._tag!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Tag):
+            return self._tag == other._tag
+        if isinstance(other, str):
+            return self._tag == other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self._tag)
+
     @staticmethod
     def _validate_tag(tag: str):
         if " " in tag:
@@ -28,60 +71,181 @@ class Tag:
         return tag
 
 
-class _TagList(list[Tag]):
-    tags: list[Tag]
+def _intern_tags(tags: Iterable[Tag | str]) -> tuple[Tag, ...]:
+    return tuple(tag if isinstance(tag, Tag) else Tag(tag) for tag in tags)
 
-    @staticmethod
-    def _validate_tag(tag: Tag):
-        if " " in tag:
-            raise ValueError(f'Tag "{tag}" contains a space; this is not allowed!')
 
-    def __init__(self, tags: Iterable[Tag | str] = ()):
-        super().__init__()
-        self.extend(x if isinstance(x, Tag) else Tag(x) for x in tags)
+class _TagList(MutableSequence[Tag]):
+    """A list-like view of a note's tags, which the note stores as a tuple of interned `Tag`s."""
 
-    def __repr__(self):
-        return f"{self.__class__.__name__}({super().__repr__()})"
-
-    def __setitem__(self, key: slice | SupportsIndex, val: Tag | str | Iterable[Tag | str]):
-        if isinstance(val, str):
-            Tag._validate_tag(val)
-
-        if isinstance(key, SupportsIndex) and isinstance(val, Tag):
-            self._validate_tag(val)
-            super().__setitem__(key, val)
-        elif isinstance(key, slice):
-            # val may be an iterator, convert to a list so we can iterate multiple times
-            _val: list[Tag]
-            # list(val) if isinstance(val, Iterable) else [val]
-            if isinstance(val, str):
-                _val = [Tag(val)]
-            elif isinstance(val, Tag):
-                _val = [val]
-            else:
-                _val = [Tag(x) if isinstance(x, str) else x for x in val]
+    __slots__ = ("_note",)
 
-            for tag in _val:
-                self._validate_tag(tag)
+    def __init__(self, note: "VirtualNote[Any]"):
+        self._note = note
 
-            super().__setitem__(key, _val)
+    def __repr__(self):
+        return f"{self.__class__.__name__}({list(self._note._tags)!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, _TagList):
+            return self._note._tags == other._note._tags
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return list(self._note._tags) == list(other)  # type: ignore
+        return NotImplemented
+
+    def __len__(self) -> int:
+        return len(self._note._tags)
+
+    @overload
+    def __getitem__(self, key: SupportsIndex) -> Tag: ...
+    @overload
+    def __getitem__(self, key: slice) -> list[Tag]: ...
+
+    def __getitem__(self, key: SupportsIndex | slice) -> Tag | list[Tag]:
+        if isinstance(key, slice):
+            return list(self._note._tags[key])
+        return self._note._tags[key]
+
+    @overload
+    def __setitem__(self, key: SupportsIndex, val: Tag | str) -> None: ...
+    @overload
+    def __setitem__(self, key: slice, val: Tag | str | Iterable[Tag | str]) -> None: ...
+
+    def __setitem__(self, key: SupportsIndex | slice, val: Tag | str | Iterable[Tag | str]) -> None:
+        tags = list(self._note._tags)
+        if isinstance(key, slice):
+            tags[key] = _intern_tags([val] if isinstance(val, Tag | str) else val)
+        elif isinstance(val, Tag | str):
+            tags[key] = Tag(val) if isinstance(val, str) else val
+        else:
+            raise TypeError(f"can only assign a single tag to an index, not {val!r}")
+        self._note._tags = tuple(tags)
+
+    def __delitem__(self, key: SupportsIndex | slice) -> None:
+        tags = list(self._note._tags)
+        del tags[key]
+        self._note._tags = tuple(tags)
 
     def append(self, tag: str | Tag):
-        t = tag if isinstance(tag, Tag) else Tag(tag)
-        self._validate_tag(t)
-        super().append(t)
+        self._note._tags += _intern_tags([tag])
 
     def extend(self, tags: Iterable[Tag | str]):
-        # tags may be an iterator, convert to list so we can iterate multiple times
-        tags = [Tag(tag) if isinstance(tag, str) else tag for tag in tags]
-        for tag in tags:
-            self._validate_tag(tag)
-        super().extend(tags)
+        self._note._tags += _intern_tags(tags)
 
     def insert(self, i: SupportsIndex, tag: Tag | str):
-        t = tag if isinstance(tag, Tag) else Tag(tag)
-        self._validate_tag(t)
-        super().insert(i, t)
+        tags = list(self._note._tags)
+        tags.insert(i, Tag(tag) if isinstance(tag, str) else tag)
+        self._note._tags = tuple(tags)
+
+
+_TAG_NAME_RE = re.compile(r"/?[a-zA-Z0-9]+")
+
+
+_INVALID_HTML_TAGS_CACHE_SIZE = 1 << 16
+# digest of a field -> its invalid tags, least recently used first. Keyed by digest so large fields aren't kept alive.
+_invalid_html_tags_cache: OrderedDict[bytes, tuple[str, ...]] = OrderedDict()
+
+
+def _find_invalid_html_tags(field: str) -> tuple[str, ...]:
+    """
+    Find things that look like HTML tags but aren't. Results are cached by a digest of the field, so repeated identical
+    fields are only scanned once.
+    """
+    if "<" not in field:
+        return ()
+
+    key = hashlib.blake2b(field.encode(), digest_size=16).digest()
+    try:
+        invalid = _invalid_html_tags_cache[key]
+    except KeyError:
+        invalid = _invalid_html_tags_cache[key] = _scan_invalid_html_tags(field)
+        while len(_invalid_html_tags_cache) > _INVALID_HTML_TAGS_CACHE_SIZE:
+            _invalid_html_tags_cache.popitem(last=False)
+    else:
+        _invalid_html_tags_cache.move_to_end(key)
+    return invalid
+
+
+def _scan_invalid_html_tags(field: str) -> tuple[str, ...]:
+    r"""
+    Find things that look like HTML tags but aren't, in a single left-to-right pass.
+
+    Returns the same matches as `re.findall(r"<(?!/?[a-zA-Z0-9]+(?: .*|/?)>|!--|!\[CDATA\[)(?:.|\n)*?>", field)`, which
+    rescans to the end of the line (or field) for every "<" and so goes quadratic on long fields.
+    """
+    invalid: list[str] = []
+    length = len(field)
+    # position of the next ">" and "\n" at or after the last lookup (`length` if there is none; `% (length + 1)` maps
+    # find()'s -1 to it). Lookups only move forward, so each character is searched at most once.
+    next_gt = next_nl = -1
+
+    start = field.find("<")
+    while start != -1:
+        valid = field.startswith(("!--", "![CDATA["), start + 1)
+        if not valid and (name := _TAG_NAME_RE.match(field, start + 1)) is not None:
+            end = name.end()
+            if field.startswith((">", "/>"), end):
+                valid = True
+            elif field.startswith(" ", end):
+                # "<tag attrs...>" only counts if the ">" is on the same line
+                if next_gt <= end:
+                    next_gt = field.find(">", end + 1) % (length + 1)
+                if next_nl <= end:
+                    next_nl = field.find("\n", end + 1) % (length + 1)
+                valid = next_gt < min(next_nl, length)
+
+        if valid:
+            start = field.find("<", start + 1)
+            continue
+
+        if next_gt <= start:
+            next_gt = field.find(">", start + 1) % (length + 1)
+        if next_gt == length:
+            break
+        invalid.append(field[start:next_gt + 1])
+        start = field.find("<", next_gt + 1)
+
+    return tuple(invalid)
+
+
+def _invalid_html_tags_error(invalid_tags: Sequence[str]) -> ValueError:
+    # If you think you're getting a false positive for this error, please file an issue at
+    # https://github.com/kerrickstaley/genanki/issues
+    return ValueError(
+        "Field contained the following invalid HTML tags. Make sure you are calling html.escape() if"
+        " your field data isn't already HTML-encoded: {}".format(
+            " ".join(invalid_tags)
+        ),
+    )
+
+
+def _find_first_invalid_html_tags(fields: Sequence[str]) -> tuple[str, ...]:
+    for field_ in fields:
+        if invalid_tags := _find_invalid_html_tags(field_):
+            return invalid_tags
+    return ()
+
+
+def _cloze_field_indexes(model: VirtualModel[Any]) -> list[int]:
+    """Indexes of the fields referenced as cloze fields by the first template, or -1 for unknown field names."""
+    # find cloze replacements in first template's qfmt, e.g "{{cloze::Text}}"
+    qfmt = model.templates[0]["qfmt"]
+    cloze_replacements = set(
+        re.findall(r"{{[^}]*?cloze:(?:[^}]?:)*(.+?)}}", qfmt) + re.findall("<%cloze:(.+?)%>", qfmt)
+    )
+    return [
+        next((i for i, f in enumerate(model.fields) if f["name"] == field_name), -1)
+        for field_name in cloze_replacements
+    ]
+
+
+_CLOZE_REFERENCE_RE = re.compile(r"{{c(\d+)::.+?}}", re.DOTALL)
+
+
+def _cloze_ords(cloze_field_values: Iterable[str]) -> list[int]:
+    # each cloze reference N, e.g. "{{cN::...}}", makes a card with ord N - 1
+    card_ords = {m - 1 for value in cloze_field_values for m in map(int, _CLOZE_REFERENCE_RE.findall(value)) if m > 0}
+    return sorted(card_ords) or [0]
 
 
 def _validate_sort_field[F: FieldSpec](self: "VirtualNote[F]", _attr: "attr.Attribute[str]", val: str) -> bool:
@@ -90,47 +254,119 @@ def _validate_sort_field[F: FieldSpec](self: "VirtualNote[F]", _attr: "attr.Attr
 def _default_sort_field[F: FieldSpec](self: "VirtualNote[F]") -> str:
     return self.model.fields[0]["name"]
 
+def _reset_field_caches[F: FieldSpec, T](self: "VirtualNote[F]", _attr: "attr.Attribute[T]", val: T) -> T:
+    self._values = None
+    self._guid_cache = None
+    return val
+
+
+# Models known to this process, by fingerprint. Notes of these models pickle as a NoteWire, without their model.
+_MODEL_REGISTRY: dict[str, VirtualModel[Any]] = {}
+
+
+def register_models(*models: VirtualModel[Any]) -> None:
+    """
+    Register models in this process, so that their notes are pickled compactly and can be unpickled here.
+
+    Register the same models in the parent and, as the pool's initializer, in every worker, so each model crosses the
+    process boundary once per worker instead of once per note. `note_process_pool` does both.
+    """
+    for model in models:
+        _MODEL_REGISTRY[model.fingerprint] = model
+
+
+def note_process_pool(models: Iterable[VirtualModel[Any]], max_workers: int | None = None) -> ProcessPoolExecutor:
+    """A ProcessPoolExecutor whose workers can receive and return notes of `models` in their compact form."""
+    models = tuple(models)
+    register_models(*models)
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=register_models, initargs=models)
+
+
+class NoteWire(NamedTuple):
+    """The compact form of a note: everything but its model, which is identified by fingerprint."""
+
+    model: str
+    values: tuple[str, ...]
+    tags: tuple[str, ...]
+    # only a guid set explicitly; computed guids are recomputed from the values
+    guid: str | None
+    due: int
+    # None when it's the default
+    sort_field: str | None
+    source_key: str | None = None
+    # (ord, suspend, due, ivl, ease) of each card, when any card isn't scheduled as a new card; None when the cards can
+    # be recomputed from the values
+    cards: tuple[tuple[int, bool, int | None, int, int], ...] | None = None
+
+
+@functools.cache
+def _field_names(fields_cls: type[FieldSpec]) -> tuple[str, ...]:
+    return tuple(f.name for f in dataclasses.fields(fields_cls))
+
+
+def _note_from_wire[N: "VirtualNote[Any]"](cls: type[N], wire: NoteWire) -> N:
+    return cls.from_wire(wire)
+
 
 F_co = TypeVar("F_co", bound=FieldSpec, covariant=True, default=FieldSpec)
 
 
 @define(kw_only=True, slots=True)
 class VirtualNote(Generic[F_co]):
-    model: VirtualModel[ModelSpec[F_co]] = field()
-    fields: F_co = field()
+    model: VirtualModel[ModelSpec[F_co]] = field(on_setattr=_reset_field_caches)
+    fields: F_co = field(on_setattr=_reset_field_caches)
     due: int = field(default=0)
 
-    _INVALID_HTML_TAG_RE = re.compile(
-        r"<(?!/?[a-zA-Z0-9]+(?: .*|/?)>|!--|!\[CDATA\[)(?:.|\n)*?>"
-    )
-
     sort_field: str = field(validator=_validate_sort_field, default=attr.Factory(_default_sort_field, takes_self=True))
     _cards: list[Card] | None = field(default=None)
-    _tags: _TagList = field(factory=_TagList, alias="tags", converter=_TagList)
+    _tags: tuple[Tag, ...] = field(factory=tuple, alias="tags", converter=_intern_tags)
 
     _guid: str | None = field(default=None, alias="guid")
+    # identifies the note across builds in an `IdRegistry`, e.g. the key of the row it was made from
+    source_key: str | None = field(default=None)
+
+    _values: tuple[str, ...] | None = field(default=None, init=False, repr=False, eq=False)
+    _guid_cache: str | None = field(default=None, init=False, repr=False, eq=False)
 
     @property
     def guid(self) -> str:
         if self._guid is not None:
             return self._guid
-        return guid_for(self.fields)
+        # computed according to the model's guid_strategy, and cached when the FieldSpec is frozen (reassigning
+        # `fields` or `model` resets it)
+        if self._guid_cache is not None:
+            return self._guid_cache
+
+        guid = self.model.guid_for_fields(self.fields)
+        if self.fields.__genanki_frozen__:
+            self._guid_cache = guid
+        return guid
 
     def __attrs_post_init__(self):
         if not hasattr(self.__class__, "guid") or self.__class__.guid.__isabstractmethod__:
             raise NotImplementedError("Must implement guid property")
 
         self._check_number_model_fields_matches_num_fields()
-        self._check_invalid_html_tags_in_fields()
+        if self.model.html_validation is HtmlValidation.EAGER:
+            self._check_invalid_html_tags_in_fields()
+
+    def _field_values(self) -> tuple[str, ...]:
+        """The values of `fields`, cached on the note when the FieldSpec is frozen."""
+        if self._values is not None:
+            return self._values
+
+        values = self.fields.values()
+        if self.fields.__genanki_frozen__:
+            self._values = values
+        return values
 
     @property
     def tags(self) -> _TagList:
-        return self._tags
+        return _TagList(self)
 
     @tags.setter
     def tags(self, val: Iterable[Tag | str]):
-        self._tags = _TagList()
-        self._tags.extend(x if isinstance(x, Tag) else Tag(x) for x in val)
+        self._tags = _intern_tags(val)
 
     @property
     def cards(self) -> list[Card]:
@@ -150,43 +386,72 @@ class VirtualNote(Generic[F_co]):
     @property
     def req(self) -> notes_pb2.Note:
         result = notes_pb2.Note(
-            fields=self.fields.values(),
+            fields=self._field_values(),
             guid=self.guid,
             # id=,
             # mtime_secs=,
             notetype_id=self.model.model_id or 0,
-            # tags=,
+            tags=[str(tag) for tag in self._tags],
             # usn=,
         )
         return result
 
+    def to_wire(self) -> NoteWire:
+        sort_field = self.sort_field
+        cards = None
+        if self._cards is not None and any(card != Card(card.ord) for card in self._cards):
+            cards = tuple((card.ord, card.suspend, card.due, card.ivl, card.ease) for card in self._cards)
+        return NoteWire(
+            model=self.model.fingerprint,
+            values=self._field_values(),
+            tags=tuple(map(str, self._tags)),
+            guid=self._guid,
+            due=self.due,
+            sort_field=None if sort_field == _default_sort_field(self) else sort_field,
+            source_key=self.source_key,
+            cards=cards,
+        )
+
+    @classmethod
+    def from_wire(cls, wire: NoteWire) -> Self:
+        """Rebuild a note from `to_wire`; its model must have been registered with `register_models`."""
+        try:
+            model = _MODEL_REGISTRY[wire.model]
+        except KeyError:
+            raise LookupError(
+                f"No model with fingerprint {wire.model!r} is registered in this process; call register_models first, "
+                "e.g. as the process pool's initializer"
+            ) from None
+
+        optional: dict[str, Any] = {}
+        if wire.sort_field is not None:
+            optional["sort_field"] = wire.sort_field
+        if wire.cards is not None:
+            optional["cards"] = [
+                Card(ord_, suspend, due=due, ivl=ivl, ease=ease) for ord_, suspend, due, ivl, ease in wire.cards
+            ]
+        return cls(
+            model=model,
+            fields=model.model_spec.fields(**dict(zip(_field_names(model.model_spec.fields), wire.values))),
+            tags=wire.tags,
+            guid=wire.guid,
+            due=wire.due,
+            source_key=wire.source_key,
+            **optional,
+        )
+
+    def __reduce_ex__(self, protocol: SupportsIndex) -> Any:
+        if self.model.fingerprint in _MODEL_REGISTRY:
+            return (_note_from_wire, (type(self), self.to_wire()))
+        return super().__reduce_ex__(protocol)
+
     def _cloze_cards(self) -> list[Card]:
         """Returns a Card with unique ord for each unique cloze reference."""
-        card_ords: set[int] = set()
-        # find cloze replacements in first template's qfmt, e.g "{{cloze::Text}}"
-        cloze_replacements = set(
-            re.findall(
-                r"{{[^}]*?cloze:(?:[^}]?:)*(.+?)}}", self.model.templates[0]["qfmt"]
-            )
-            + re.findall("<%cloze:(.+?)%>", self.model.templates[0]["qfmt"])
-        )
-        for field_name in cloze_replacements:
-            field_index = next(
-                (i for i, f in enumerate(self.model.fields) if f["name"] == field_name),
-                -1,
-            )
-            field_value = self.fields.values()[field_index] if field_index >= 0 else ""
-            # update card_ords with each cloze reference N, e.g. "{{cN::...}}"
-            card_ords.update(
-                m - 1
-                for m in map(
-                    int, re.findall(r"{{c(\d+)::.+?}}", field_value, re.DOTALL)
-                )
-                if m > 0
-            )
-        if card_ords == set():
-            card_ords = {0}
-        return [Card(ord_) for ord_ in card_ords]
+        values = self._field_values()
+        return [
+            Card(ord_)
+            for ord_ in _cloze_ords(values[i] if i >= 0 else "" for i in _cloze_field_indexes(self.model))
+        ]
 
     def _front_back_cards(self) -> list[Card]:
         """Create Front/Back cards"""
@@ -207,28 +472,15 @@ class VirtualNote(Generic[F_co]):
             )
 
     @classmethod
-    def _find_invalid_html_tags_in_field(cls, field: str):
-        return cls._INVALID_HTML_TAG_RE.findall(field)
+    def _find_invalid_html_tags_in_field(cls, field: str) -> list[str]:
+        return list(_find_invalid_html_tags(field))
 
     def _check_invalid_html_tags_in_fields(self):
-        for _idx, field_ in enumerate(self.fields.values()):
-            invalid_tags = self._find_invalid_html_tags_in_field(field_)
-            if invalid_tags:
-                # You can disable the below warning by calling warnings.filterwarnings:
-                #
-                # warnings.filterwarnings('ignore', module='genanki', message='^Field contained the following invalid HTML tags')
-                #
-                # If you think you're getting a false positive for this warning, please file an issue at
-                # https://github.com/kerrickstaley/genanki/issues
-                raise ValueError(
-                    "Field contained the following invalid HTML tags. Make sure you are calling html.escape() if"
-                    " your field data isn't already HTML-encoded: {}".format(
-                        " ".join(invalid_tags)
-                    ),
-                )
+        if invalid_tags := _find_first_invalid_html_tags(self._field_values()):
+            raise _invalid_html_tags_error(invalid_tags)
 
     def _format_fields(self):
-        return "\x1f".join(self.fields.values())
+        return "\x1f".join(self._field_values())
 
     def _format_tags(self) -> str:
         return f" {" ".join(map(str, self.tags))} "
@@ -239,6 +491,57 @@ class VirtualNote(Generic[F_co]):
         return f"{self.__class__.__name__}({", ".join(pieces)})"
 
 
+def _first_field(note: VirtualNote[Any]) -> str:
+    values = note._field_values()
+    return values[0] if values else ""
+
+
+def encode_notes(notes: Iterable[VirtualNote[Any]]) -> bytes:
+    """Serialize notes to bytes in their compact form, e.g. to send them through a queue or pipe."""
+    return pickle.dumps([note.to_wire() for note in notes], protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode_notes(data: bytes) -> list[VirtualNote[Any]]:
+    """Rebuild notes from `encode_notes`. Like any unpickling, only do this with trusted data."""
+    return [VirtualNote.from_wire(NoteWire(*wire)) for wire in pickle.loads(data)]
+
+
+def check_invalid_html_tags(
+    notes: Iterable[VirtualNote[Any]], *, max_workers: int | None = None, chunk_size: int = 4096,
+) -> None:
+    """
+    Validate the fields of many notes at once, e.g. those whose model uses `HtmlValidation.DEFERRED`.
+
+    See `check_invalid_html_tags_in_values`.
+    """
+    check_invalid_html_tags_in_values(
+        (value for note in notes for value in note._field_values()), max_workers=max_workers, chunk_size=chunk_size,
+    )
+
+
+def check_invalid_html_tags_in_values(
+    values: Iterable[str], *, max_workers: int | None = None, chunk_size: int = 4096,
+) -> None:
+    """
+    Validate many field values at once.
+
+    Each distinct value is checked only once. With `max_workers` > 1 the values are split into chunks of `chunk_size`
+    and scanned across a process pool. Raises the same ValueError as eager validation.
+    """
+    unique_values = list(dict.fromkeys(values))
+    chunks = [unique_values[i:i + chunk_size] for i in range(0, len(unique_values), chunk_size)]
+
+    if max_workers is not None and max_workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_find_first_invalid_html_tags, chunks))
+    else:
+        results = map(_find_first_invalid_html_tags, chunks)
+
+    for invalid_tags in results:
+        if invalid_tags:
+            raise _invalid_html_tags_error(invalid_tags)
+
+
 @define(kw_only=True, slots=True)
 class RealizedNote(Generic[F_co]):
     pass
@@ -0,0 +1,176 @@
+"""
+Shrink a package's media before it's written: images are downsized and recompressed, and audio or video transcoded,
+by pluggable encoders running in a process pool. Results are cached by the input's content and the encoder's settings,
+so rebuilding only encodes new or changed files. When an encoder changes a file's name (e.g. photo.png to
+photo.webp), note fields are rewritten to refer to the new name as the notes are written.
+
+    optimizer = MediaOptimizer(
+        encoders=[ImageEncoder(max_size=1200), CommandEncoder(extensions=(".wav",), extension=".mp3", command=(...))],
+        cache_dir="media-cache",
+    )
+    genanki.Package(deck, media_root="media/", media_optimizer=optimizer).write_to_file("deck.apkg", max_workers=8)
+"""
+
+from collections.abc import Collection, Sequence
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import os
+from pathlib import Path
+import subprocess
+import tempfile
+from typing import Protocol
+
+from attrs import define, field
+
+from genanki.media import MediaFile, MediaSource, media_name
+from genanki.reader import COPY_BUFFER_SIZE
+
+
+class MediaEncoder(Protocol):
+    """
+    Turns a media file into a smaller one. An encoder's repr is part of the cache key, so it must show every setting
+    that affects the output (as the repr of an attrs class or dataclass does).
+    """
+
+    def output_name(self, name: str) -> str | None:
+        """The name of the encoded file, or None to leave the file `name` as it is."""
+        ...
+
+    def encode(self, src: Path, dest: Path) -> None:
+        """Encode `src` into `dest`, which already exists (empty), with the extension `output_name` chose."""
+        ...
+
+
+def _lower_extensions(extensions: Sequence[str]) -> tuple[str, ...]:
+    return tuple(extension.lower() for extension in extensions)
+
+
+@define(kw_only=True, frozen=True)
+class ImageEncoder:
+    """Downsize images to fit in `max_size` pixels, and re-save them as `format`. Needs Pillow."""
+
+    max_size: int | None = 1600
+    # a format Pillow can write, which is also the new file extension
+    format: str = "webp"
+    quality: int = 80
+    # animated GIFs aren't touched by default
+    extensions: tuple[str, ...] = field(
+        default=(".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"), converter=_lower_extensions,
+    )
+
+    def output_name(self, name: str) -> str | None:
+        stem, extension = os.path.splitext(name)
+        return f"{stem}.{self.format.lower()}" if extension.lower() in self.extensions else None
+
+    def encode(self, src: Path, dest: Path) -> None:
+        from PIL import Image
+
+        with Image.open(src) as image:
+            if self.max_size is not None:
+                image.thumbnail((self.max_size, self.max_size))
+            if self.format.lower() in ("jpg", "jpeg") and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            pillow_format = "JPEG" if self.format.lower() == "jpg" else self.format.upper()
+            image.save(dest, format=pillow_format, quality=self.quality)
+
+
+@define(kw_only=True, frozen=True)
+class CommandEncoder:
+    """
+    Encode files with a local program, e.g. ffmpeg for audio. `{input}` and `{output}` in `command` are replaced by the
+    paths; the output file already exists, so tell the program to overwrite it (`-y` for ffmpeg).
+    """
+
+    extensions: tuple[str, ...] = field(converter=_lower_extensions)
+    # the extension of the encoded files, e.g. ".mp3"
+    extension: str
+    command: tuple[str, ...] = field(converter=tuple)
+
+    def output_name(self, name: str) -> str | None:
+        stem, extension = os.path.splitext(name)
+        return f"{stem}{self.extension}" if extension.lower() in self.extensions else None
+
+    def encode(self, src: Path, dest: Path) -> None:
+        args = [arg.replace("{input}", str(src)).replace("{output}", str(dest)) for arg in self.command]
+        subprocess.run(args, check=True, stdin=subprocess.DEVNULL, capture_output=True)
+
+
+def _encode(encoder: MediaEncoder, src: str, output_name: str, cache_dir: str) -> str:
+    """The cached encoding of `src`, encoding it first if it isn't cached."""
+    h = hashlib.sha256(repr(encoder).encode())
+    with open(src, "rb") as fp:
+        while chunk := fp.read(COPY_BUFFER_SIZE):
+            h.update(chunk)
+    dest = Path(cache_dir, h.hexdigest(), output_name)
+    if dest.exists():
+        return str(dest)
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix=".", suffix=Path(output_name).suffix)
+    os.close(fd)
+    try:
+        encoder.encode(Path(src), Path(tmp_name))
+        # concurrent builds encoding the same file write the same result
+        os.replace(tmp_name, dest)
+    finally:
+        Path(tmp_name).unlink(missing_ok=True)
+    return str(dest)
+
+
+@define(kw_only=True)
+class MediaOptimizer:
+    """
+    Encodes media files with the first of `encoders` that takes each one, caching the results in `cache_dir`. Files
+    named with a leading underscore, which by Anki's convention are referred to by templates and CSS rather than notes,
+    are left alone, as is any file whose encoding isn't smaller than the original. So are MediaFiles, which aren't on
+    disk for an encoder to read (and would be read twice).
+    """
+
+    encoders: Sequence[MediaEncoder] = field(converter=tuple)
+    cache_dir: Path = field(converter=Path)
+
+    def optimize(
+        self, sources: Sequence[MediaSource], *, max_workers: int | None = None, keep_names: Collection[str] = (),
+    ) -> tuple[list[MediaSource], dict[str, str]]:
+        """
+        The media files to write instead of `sources`, and the renames (old name to new) to apply to note fields. Files
+        named in `keep_names`, e.g. those templates and CSS refer to, are only encoded if that keeps their name. With
+        `max_workers` > 1 files are encoded across a process pool.
+        """
+        taken = {media_name(source) for source in sources}
+        jobs: list[tuple[int, MediaEncoder, str, str]] = []
+        for i, path in enumerate(sources):
+            if isinstance(path, MediaFile):
+                continue
+            path = os.fspath(path)
+            name = os.path.basename(path)
+            if name.startswith("_"):
+                continue
+            for encoder in self.encoders:
+                output_name = encoder.output_name(name)
+                if output_name is None:
+                    continue
+                if output_name != name and name in keep_names:
+                    break
+                # a new name mustn't clash with another file (photo.png and photo.jpg can't both become photo.webp)
+                if output_name == name or output_name not in taken:
+                    taken.add(output_name)
+                    jobs.append((i, encoder, path, output_name))
+                break
+
+        encode_args = [(encoder, path, output_name, str(self.cache_dir)) for _, encoder, path, output_name in jobs]
+        if max_workers is not None and max_workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                encoded = list(pool.map(_encode, *zip(*encode_args)))
+        else:
+            encoded = [_encode(*args) for args in encode_args]
+
+        result = list(sources)
+        renames: dict[str, str] = {}
+        for (i, _, path, output_name), out in zip(jobs, encoded):
+            if os.path.getsize(out) < os.path.getsize(path):
+                result[i] = out
+                if output_name != os.path.basename(path):
+                    renames[os.path.basename(path)] = output_name
+        return result, renames
+
@@ -1,6 +1,13 @@
+import contextlib
+import itertools
+import json
+import os
 from pathlib import Path
-from typing import Protocol
-from collections.abc import Iterable
+import tempfile
+import time
+from typing import Any, NamedTuple, Protocol
+from zipfile import ZIP_STORED, ZipFile
+from collections.abc import Iterable, Iterator, Sequence
 
 import anki
 import anki.lang
@@ -9,11 +16,40 @@ import anki.decks
 import anki.models
 import anki.notes
 # from anki.exporting import AnkiPackageExporter
+from anki import notes_pb2
 from anki.import_export_pb2 import ExportAnkiPackageOptions
 
 from genanki import collection
+from genanki.batch import NoteBatch
+from genanki.cache import BuildCache, package_key
+from genanki.card import Card, schedule_cards
+from genanki.existing import ExistingPackage
+from genanki.media import (
+    MediaSource,
+    model_media_references,
+    rename_media_references,
+    resolve_media,
+    scan_media_references,
+    write_media,
+)
+from genanki.merge import copy_member
+from genanki.model import HtmlValidation, Model
+from genanki.note import Note, check_invalid_html_tags, check_invalid_html_tags_in_values
+from genanki.optimize import MediaOptimizer
+from genanki.registry import IdRegistry, RegisteredNotetype
+from genanki.render import NoteToRender, RenderedCard, render_cards
+from genanki.store import NoteStore
+
+from .deck import Deck, DuplicatePolicy
+
+
+class NoteToAdd(NamedTuple):
+    req: notes_pb2.Note
+    due: int
+    cards: Sequence[Card] | None
+    # the note's key in an IdRegistry; None uses its guid
+    source_key: str | None = None
 
-from .deck import Deck
 
 class SupportsNext[T](Protocol):
     def __next__(self) -> T: ...
@@ -26,8 +62,12 @@ class Package:
     def __init__(
         self,
         deck_or_decks: "Deck | Iterable[Deck] | None" = None,
-        media_files: Iterable[str] | None = None,
+        media_files: Iterable[MediaSource] | None = None,
         id_gen: SupportsNext[int] | None = None,
+        duplicate_policy: DuplicatePolicy | None = None,
+        media_root: str | os.PathLike[str] | None = None,
+        prune_media: bool = False,
+        media_optimizer: MediaOptimizer | None = None,
     ):
         if isinstance(deck_or_decks, Deck):
             self.decks = [deck_or_decks]
@@ -38,36 +78,440 @@ class Package:
 
         self.media_files = media_files or []
         self.id_gen = id_gen
+        # how to handle notes with the same guid in different decks; None writes them all, and Anki merges them on import.
+        # Notes kept in a deck's `store` aren't checked across decks.
+        self.duplicate_policy = DuplicatePolicy(duplicate_policy) if duplicate_policy is not None else None
+        # with a media root, the media files that notes and models refer to are found there (as well as in
+        # `media_files`); either that or `prune_media` leaves out files nothing refers to
+        self.media_root = media_root
+        self.prune_media = prune_media
+        # recompresses media files as the package is written; see `genanki.optimize`
+        self.media_optimizer = media_optimizer
+
+    @staticmethod
+    def open_existing(path: str | os.PathLike[str], *, tmp_dir: str | None = None) -> "ExistingPackage":
+        """
+        Open a package written before, to add, update or remove notes without rebuilding it. Use the result as a
+        context manager and call its `save`.
+        """
+        return ExistingPackage(path, tmp_dir=tmp_dir)
+
+    def _models(self) -> list[Model[Any]]:
+        models = {id(m): m for deck in self.decks for m in deck.models.values()}
+        models.update((id(note.model), note.model) for deck in self.decks for note in deck.notes)
+        models.update((id(batch.model), batch.model) for deck in self.decks for batch in deck.batches)
+        return list(models.values())
+
+    def referenced_media(self, *, max_workers: int | None = None) -> set[str]:
+        """The names of the media files referred to by the package's notes and by its models' templates and CSS."""
+
+        def values() -> Iterator[str]:
+            for deck in self.decks:
+                for note in deck.notes:
+                    yield from note._field_values()
+                for batch in deck.batches:
+                    for column in batch.columns.values():
+                        yield from column
+                if deck.store is not None:
+                    yield from deck.store.field_values(deck.models)
+
+        references = scan_media_references(values(), max_workers=max_workers)
+        return references.union(*map(model_media_references, self._models()))
+
+    def _media_to_write(self, max_workers: int | None) -> list[MediaSource]:
+        if self.media_root is None and not self.prune_media:
+            return list(self.media_files)
+        return resolve_media(self.referenced_media(max_workers=max_workers), self.media_files, self.media_root)
+
+    def render_cards(self, *, max_workers: int | None = None, chunk_size: int = 1000) -> Iterator[RenderedCard]:
+        """
+        The question and answer HTML of every card in the package, as Anki would show them, deck by deck. See
+        `genanki.render` for what's rendered and `genanki.render.write_html` for a report to look through.
+        """
+        return render_cards(self._notes_to_render(), max_workers=max_workers, chunk_size=chunk_size)
+
+    def _notes_to_render(self) -> Iterator[NoteToRender]:
+        for deck in self.decks:
+            for note in deck.notes:
+                tags = [str(tag) for tag in note._tags]
+                yield NoteToRender(note.model, note.guid, deck.name, tags, note._field_values())
+            for batch in deck.batches:
+                batch_tags = batch.tags if batch.tags is not None else itertools.repeat(())
+                for guid, note_tags, values in zip(batch.compute_guids(), batch_tags, batch.rows()):
+                    yield NoteToRender(batch.model, guid, deck.name, [str(tag) for tag in note_tags], values)
+            if deck.store is not None:
+                for stored in deck.store.notes():
+                    yield NoteToRender(deck.models[stored.model], stored.guid, deck.name, stored.tags, stored.fields)
+
+    def write_to_file(
+        self,
+        file: str,
+        timestamp: float | None = None,
+        id_gen: SupportsNext[int] | None = None,
+        max_workers: int | None = None,
+        cache: BuildCache | str | os.PathLike[str] | None = None,
+        registry: IdRegistry | str | os.PathLike[str] | None = None,
+    ) -> None:
+        """
+        Write the package to `file`.
+
+        With a `cache` (a BuildCache, or a directory to use as one), a package whose contents hash the same as one
+        written before is linked or copied from the cache instead of being rebuilt. Decks and models then don't get the
+        ids a build would assign them. The cache isn't used with an `id_gen`.
+
+        With a `registry` (an IdRegistry, or the path of its file), notes, cards, decks and notetypes get the guids and
+        ids they were given by earlier builds using it, so that re-importing the package updates them in place.
+        """
+        if registry is None or isinstance(registry, IdRegistry):
+            self._write(file, timestamp, id_gen, max_workers, cache, registry)
+        else:
+            with IdRegistry(registry) as opened:
+                self._write(file, timestamp, id_gen, max_workers, cache, opened)
+
+    def _write(
+        self,
+        file: str,
+        timestamp: float | None,
+        id_gen: SupportsNext[int] | None,
+        max_workers: int | None,
+        cache: BuildCache | str | os.PathLike[str] | None,
+        registry: IdRegistry | None,
+    ) -> None:
+        media_files = self._media_to_write(max_workers)
+        # an id generator's state can't be hashed
+        if id_gen is not None or self.id_gen is not None:
+            cache = None
+        if cache is not None:
+            if not isinstance(cache, BuildCache):
+                cache = BuildCache(cache)
+            key = package_key(self, media_files=media_files, timestamp=timestamp, registry=registry)
+            if cache.get(key, file):
+                return
+
+        optimized = media_files
+        media_renames: dict[str, str] = {}
+        if self.media_optimizer is not None:
+            # only note fields are rewritten, so files the templates and CSS refer to keep their names
+            template_media = set().union(*map(model_media_references, self._models()))
+            optimized, media_renames = self.media_optimizer.optimize(
+                media_files, max_workers=max_workers, keep_names=template_media,
+            )
+
+        target = Path(file)
+        if target.exists() and target.stat().st_nlink > 1:
+            # don't write through a hard link into a cache entry
+            target.unlink()
+
+        self._build(file, max_workers, optimized, media_renames, registry)
+
+        if cache is not None:
+            if registry is not None:
+                # the build registered the ids it gave out, so the package is what a build from the registry's new
+                # state writes; a hit then never hands out ids the registry doesn't have
+                key = package_key(self, media_files=media_files, timestamp=timestamp, registry=registry)
+            cache.put(key, file)
+
+    def _build(
+        self,
+        file: str,
+        max_workers: int | None,
+        media_files: Sequence[MediaSource],
+        media_renames: dict[str, str],
+        registry: IdRegistry | None = None,
+    ) -> None:
+        check_invalid_html_tags(
+            (
+                note
+                for deck in self.decks
+                for note in deck.notes
+                if note.model.html_validation is HtmlValidation.DEFERRED
+            ),
+            max_workers=max_workers,
+        )
+        for deck in self.decks:
+            for batch in deck.batches:
+                if batch.model.html_validation is HtmlValidation.DEFERRED:
+                    batch.check_invalid_html_tags(max_workers=max_workers)
+            if deck.store is not None:
+                deferred = [name for name, m in deck.models.items() if m.html_validation is HtmlValidation.DEFERRED]
+                if deferred:
+                    check_invalid_html_tags_in_values(deck.store.field_values(deferred), max_workers=max_workers)
+
+        contents = [(deck, deck.notes, deck.batches) for deck in self.decks]
+        if self.duplicate_policy not in (None, DuplicatePolicy.ALLOW):
+            contents = _dedupe_decks(self.decks, self.duplicate_policy)
+
+        with PackageWriter(registry=registry, media_renames=media_renames) as writer:
+            for genanki_deck, notes, batches in contents:
+                writer.add_deck(genanki_deck)
+                writer.add_notes(genanki_deck, notes)
+
+                for batch in batches:
+                    writer.add_batch(genanki_deck, batch)
+
+                if genanki_deck.store is not None:
+                    writer.add_store(genanki_deck, genanki_deck.store)
+
+            writer.write(file, media_files)
+
+
+def _dedupe_decks(
+    decks: list[Deck], policy: DuplicatePolicy,
+) -> list[tuple[Deck, list[Note[Any]], list[NoteBatch]]]:
+    """
+    Find guids shared by notes of different decks in one pass over a guid index, and resolve them per `policy`: raise,
+    keep the first note with each guid, or keep the last one.
+    """
+    # guid -> (deck index, batch index or -1 for `Deck.notes`, position)
+    winners: dict[str, tuple[int, int, int]] = {}
+    duplicates: list[str] = []
+
+    def claim(guid: str, key: tuple[int, int, int]) -> None:
+        if guid in winners:
+            duplicates.append(guid)
+            if policy is not DuplicatePolicy.REPLACE:
+                return
+        winners[guid] = key
+
+    for d, deck in enumerate(decks):
+        for i, note in enumerate(deck.notes):
+            claim(note.guid, (d, -1, i))
+        for b, batch in enumerate(deck.batches):
+            for i, guid in enumerate(batch.compute_guids()):
+                claim(guid, (d, b, i))
+
+    if not duplicates:
+        return [(deck, deck.notes, deck.batches) for deck in decks]
+    if policy is DuplicatePolicy.RAISE:
+        raise ValueError(f"{len(duplicates)} notes have guids used by other notes in the package, e.g. {duplicates[0]!r}")
+
+    return [
+        (
+            deck,
+            [note for i, note in enumerate(deck.notes) if winners[note.guid] == (d, -1, i)],
+            [
+                batch.select([i for i, guid in enumerate(batch.compute_guids()) if winners[guid] == (d, b, i)])
+                for b, batch in enumerate(deck.batches)
+            ],
+        )
+        for d, deck in enumerate(decks)
+    ]
+
+
+class PackageWriter:
+    """
+    Builds a package incrementally: decks, models and notes go into a scratch collection as they are added, and
+    `write` exports it. Unlike `Package`, nothing needs to be held in memory until the end.
+
+    With a `registry`, decks, notetypes, notes and cards keep the guids and ids recorded there by earlier builds, and
+    new ones are recorded. `media_renames` maps media file names to the names note fields should refer to instead.
+    """
+
+    def __init__(
+        self,
+        dir: str | None = None,
+        *,
+        registry: IdRegistry | None = None,
+        media_renames: dict[str, str] | None = None,
+    ):
+        self._dir = dir if dir is not None else Path(__file__).parent.parent.resolve().as_posix()
+        self._stack = contextlib.ExitStack()
+        self.registry = registry
+        self.media_renames = media_renames or {}
+        # registry keys of the notes added so far, so a key used twice in one build is only matched once
+        self._keys_used: set[str] = set()
+        # notetype ids by model fingerprint
+        self._notetypes: dict[str, anki.models.NotetypeId] = {}
+        self.col: anki.collection.Collection
+
+    def __enter__(self) -> "PackageWriter":
+        collection_path = self._stack.enter_context(collection.empty_collection(dir=self._dir))
+        self.col = anki.collection.Collection(collection_path)
+        self._stack.callback(self.col.close)
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._stack.close()
+
+    def add_deck(self, genanki_deck: Deck) -> anki.decks.DeckId:
+        """Add a deck and the models it currently holds; its notes and batches are added separately."""
+        registered = self.registry.deck_id(genanki_deck.name) if self.registry is not None else None
+        if registered is not None:
+            legacy = self.col.decks.new_deck_legacy(False)
+            legacy["name"] = genanki_deck.name
+            legacy["id"] = registered
+            self.col._backend.add_or_update_deck_legacy(
+                deck=json.dumps(legacy).encode(), preserve_usn_and_mtime=True,
+            )
+            genanki_deck.deck_id = anki.decks.DeckId(registered)
+        else:
+            anki_deck = self.col.decks.new_deck()
+            anki_deck.name = genanki_deck.name
+            out = self.col.decks.add_deck(anki_deck)
+            genanki_deck.deck_id = anki.decks.DeckId(out.id)
+            if self.registry is not None:
+                self.registry.add_deck(genanki_deck.name, genanki_deck.deck_id)
+
+        for m in genanki_deck.models.values():
+            self.add_model(m)
+
+        return genanki_deck.deck_id
+
+    def add_model(self, m: Model[Any]) -> anki.models.NotetypeId:
+        """
+        Add a model's notetype, once per package however many decks use it. It gets the model's own `model_id` if it has
+        one (e.g. a model loaded from a package), its registered id, or its `stable_id`.
+
+        Anki only takes a notetype's templates and styling from an import if its modification time is newer, so that
+        time is the current one, unless a registry shows the model unchanged since an earlier build.
+        """
+        fingerprint = m.fingerprint
+        if fingerprint in self._notetypes:
+            m.model_id = self._notetypes[fingerprint]
+            return m.model_id
+
+        ntid: int = getattr(m, "model_id", None) or m.stable_id
+        mtime = int(time.time())
+        registered = self.registry.notetype(m.name) if self.registry is not None else None
+        if registered is not None:
+            ntid = registered.notetype_id
+            if registered.fingerprint == fingerprint:
+                mtime = registered.mtime
+            else:
+                mtime = max(mtime, registered.mtime + 1)
+
+        a = self.col._backend.add_notetype(m.req)
+        assert a.id is not None
+        if ntid in self._notetypes.values():
+            # a different model with the same name, fields and templates; keep the id the backend gave it
+            m.model_id = anki.models.NotetypeId(a.id)
+        else:
+            m.model_id = self._set_notetype_id(a.id, ntid, mtime)
+            if self.registry is not None:
+                self.registry.set_notetype(m.name, RegisteredNotetype(ntid, fingerprint, mtime))
+        self._notetypes[fingerprint] = m.model_id
+        return m.model_id
+
+    def _set_notetype_id(self, ntid: int, new_id: int, mtime: int) -> anki.models.NotetypeId:
+        """Give the notetype `ntid` the id `new_id`; the backend only assigns ids to notetypes it adds itself."""
+        legacy = json.loads(self.col._backend.get_notetype_legacy(ntid))
+        self.col._backend.remove_notetype(ntid)
+        legacy["id"] = new_id
+        legacy["mod"] = mtime
+        self.col._backend.add_or_update_notetype(
+            json=json.dumps(legacy).encode(), preserve_usn_and_mtime=True, skip_checks=False,
+        )
+        return anki.models.NotetypeId(new_id)
+
+    def add_notes(self, genanki_deck: Deck, notes: Iterable[Note[Any]], chunk_size: int = 10_000) -> None:
+        self._add_reqs(
+            genanki_deck,
+            (NoteToAdd(note.req, note.due, note._cards, note.source_key) for note in notes),
+            chunk_size,
+        )
+
+    def add_batch(self, genanki_deck: Deck, batch: NoteBatch, chunk_size: int = 10_000) -> None:
+        due = batch.due if batch.due is not None else itertools.repeat(0)
+        keys = batch.keys if batch.keys is not None else itertools.repeat(None)
+        self._add_reqs(
+            genanki_deck,
+            (NoteToAdd(req, note_due, None, key) for req, note_due, key in zip(batch.reqs(), due, keys)),
+            chunk_size,
+        )
+
+    def add_store(self, genanki_deck: Deck, store: NoteStore, chunk_size: int = 10_000) -> None:
+        """Stream the notes of `store` into the deck, a chunk at a time."""
+        self._add_reqs(genanki_deck, (NoteToAdd(*item) for item in store.reqs(genanki_deck.models)), chunk_size)
+
+    def _add_reqs(self, genanki_deck: Deck, reqs: Iterator[NoteToAdd], chunk_size: int) -> None:
+        """Add notes a chunk at a time, each with its due position and (optionally) the scheduling of its cards."""
+        while chunk := list(itertools.islice(reqs, chunk_size)):
+            if self.media_renames:
+                for note in chunk:
+                    fields = [rename_media_references(value, self.media_renames) for value in note.req.fields]
+                    del note.req.fields[:]
+                    note.req.fields.extend(fields)
+            if self.registry is not None:
+                nids = self._add_registered(genanki_deck, chunk)
+            else:
+                nids = self._add_chunk(genanki_deck, chunk)
+            schedule_cards(self.col, ((nid, note.due, note.cards) for nid, note in zip(nids, chunk)))
+
+    def _add_chunk(self, genanki_deck: Deck, chunk: Sequence[NoteToAdd]) -> Sequence[int]:
+        added = self.col._backend.add_notes(
+            requests=[notes_pb2.AddNoteRequest(note=note.req, deck_id=genanki_deck.deck_id) for note in chunk],
+        )
+        return added.nids
+
+    def _add_registered(self, genanki_deck: Deck, chunk: Sequence[NoteToAdd]) -> list[int]:
+        """
+        Add a chunk of notes, giving those whose keys are in the registry their registered guids, note ids and card ids,
+        and registering the rest. Ids are rewritten with a few batched UPDATEs after the backend has added the notes.
+        """
+        assert self.registry is not None
+        keys = [note.source_key if note.source_key is not None else note.req.guid for note in chunk]
+        registered = self.registry.notes([key for key in keys if key not in self._keys_used])
+        for note, key in zip(chunk, keys):
+            if key in registered:
+                note.req.guid = registered[key].guid
+
+        (last_card_id,) = self.col.db.first("SELECT coalesce(max(id), 0) FROM cards")
+        nids = list(self._add_chunk(genanki_deck, chunk))
+
+        remapped: list[tuple[int, int]] = []
+        new_notes: list[tuple[str, str, int]] = []
+        for i, (note, key) in enumerate(zip(chunk, keys)):
+            if key in self._keys_used:
+                continue
+            self._keys_used.add(key)
+            if key in registered:
+                remapped.append((registered[key].note_id, nids[i]))
+                nids[i] = registered[key].note_id
+            else:
+                new_notes.append((key, note.req.guid, nids[i]))
+        if remapped:
+            self.col.db.executemany("UPDATE notes SET id = ? WHERE id = ?", remapped)
+            self.col.db.executemany("UPDATE cards SET nid = ? WHERE nid = ?", remapped)
+
+        # the backend gives new cards ids above every existing one
+        cards = self.col.db.all("SELECT id, nid, ord FROM cards WHERE id > ?", last_card_id)
+        card_ids = self.registry.cards([old for old, _ in remapped])
+        card_remapped: list[tuple[int, int]] = []
+        new_cards: list[tuple[int, int, int]] = []
+        # cards of notes whose key was already used in this build aren't registered
+        tracked = {old for old, _ in remapped} | {nid for _, _, nid in new_notes}
+        for cid, nid, ord_ in cards:
+            if (nid, ord_) in card_ids:
+                card_remapped.append((card_ids[nid, ord_], cid))
+            elif nid in tracked:
+                new_cards.append((nid, ord_, cid))
+        if card_remapped:
+            self.col.db.executemany("UPDATE cards SET id = ? WHERE id = ?", card_remapped)
+
+        self.registry.add_notes(new_notes)
+        self.registry.add_cards(new_cards)
+        return nids
+
+    def write(self, file: str, media_files: Iterable[MediaSource] = ()) -> None:
+        """Export the package to `file`, with `media_files` streamed into it."""
+        media_files = list(media_files)
+        options = ExportAnkiPackageOptions(with_deck_configs=True, with_media=True, with_scheduling=True)
+        if not media_files:
+            self.col.export_anki_package(out_path=file, options=options, limit=None)
+            return
 
-    def write_to_file(self, file: str, timestamp: float | None = None, id_gen: SupportsNext[int] | None = None) -> None:
-        root = Path(__file__).parent.parent.resolve()
-
-        with collection.empty_collection(dir=root.as_posix()) as collection_path:
-            col = anki.collection.Collection(collection_path)
-            for genanki_deck in self.decks:
-                anki_deck = col.decks.new_deck()
-                anki_deck.name = genanki_deck.name
-
-                out = col.decks.add_deck(anki_deck)
-                genanki_deck.deck_id = anki.decks.DeckId(out.id)
-
-                for m in genanki_deck.models.values():
-                    a = col._backend.add_notetype(m.req)
-                    assert a.id is not None
-                    m.model_id = anki.models.NotetypeId(a.id)
-
-                    for a in genanki_deck.notes:
-                        col._backend.add_note(
-                            deck_id=genanki_deck.deck_id,
-                            note=a.req,
-                        )
-
-                col.export_anki_package(
-                    out_path=file,
-                    options=ExportAnkiPackageOptions(
-                        with_deck_configs=True,
-                        with_media=True,
-                        with_scheduling=True,
-                    ),
-                    limit=None,
-                )
+        # Anki only exports media from the collection's media folder; rather than copying the files there, the export
+        # is copied member by member into the final package, and the media is added to it
+        target = Path(file)
+        fd, tmp_name = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            options.with_media = False
+            self.col.export_anki_package(out_path=tmp_name, options=options, limit=None)
+            with ZipFile(tmp_name) as exported, ZipFile(target, "w", ZIP_STORED) as out:
+                for info in exported.infolist():
+                    if info.filename != "media":
+                        copy_member(exported, info.filename, out)
+                write_media(out, media_files)
+        finally:
+            Path(tmp_name).unlink(missing_ok=True)
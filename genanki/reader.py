@@ -0,0 +1,276 @@
+"""
+Read .apkg files without loading them into memory.
+
+The collection is stream-decompressed (or, for legacy packages, stream-extracted) into a temporary SQLite file, opened
+read-only, and its rows are yielded lazily a batch at a time.
+"""
+
+from collections.abc import Iterator
+import contextlib
+import json
+import os
+from pathlib import Path
+import shutil
+import sqlite3
+import tempfile
+from typing import IO, Any, NamedTuple
+from zipfile import ZipFile
+
+import pyzstd
+
+from anki import decks_pb2, import_export_pb2, notetypes_pb2
+
+# newest first: modern packages also contain a legacy collection.anki2 that only tells old clients to upgrade
+COLLECTION_NAMES = ("collection.anki21b", "collection.anki21", "collection.anki2")
+
+COPY_BUFFER_SIZE = 1 << 20
+
+
+class NoteRow(NamedTuple):
+    id: int
+    guid: str
+    mid: int
+    mod: int
+    tags: list[str]
+    fields: list[str]
+
+
+class CardRow(NamedTuple):
+    id: int
+    nid: int
+    did: int
+    ord: int
+    type: int
+    queue: int
+    due: int
+    ivl: int
+    factor: int
+    reps: int
+    lapses: int
+
+
+class MediaEntry(NamedTuple):
+    # name of the file inside the zip
+    member: str
+    # name notes refer to it by
+    filename: str
+    # size and hex SHA-1 of the (uncompressed) file, which modern packages record in their media map
+    size: int | None = None
+    sha1: str | None = None
+
+
+def _unicase(a: str, b: str) -> int:
+    # Anki's collation for deck, notetype, field, template and tag names, needed to query the tables that use it
+    a, b = a.casefold(), b.casefold()
+    return (a > b) - (a < b)
+
+
+def _decompressed(fp: IO[bytes], compressed: bool) -> contextlib.AbstractContextManager[IO[bytes]]:
+    return pyzstd.ZstdFile(fp, "rb") if compressed else contextlib.nullcontext(fp)  # type: ignore
+
+
+def extract_collection(zip_file: ZipFile, dest: IO[bytes]) -> str:
+    """
+    Stream the newest collection in `zip_file` into `dest`, decompressing it with bounded buffers. Returns the name of
+    the collection member.
+    """
+    names = set(zip_file.namelist())
+    for name in COLLECTION_NAMES:
+        if name in names:
+            with zip_file.open(name) as fp, _decompressed(fp, name.endswith("b")) as src:
+                shutil.copyfileobj(src, dest, COPY_BUFFER_SIZE)
+            return name
+    raise ValueError(f"{zip_file.filename} has none of {list(COLLECTION_NAMES)}")
+
+
+def read_media_map(zip_file: ZipFile) -> list[MediaEntry]:
+    """The media files in `zip_file`, from its legacy JSON "media" map or its zstd-compressed protobuf one."""
+    try:
+        data = zip_file.read("media")
+    except KeyError:
+        return []
+
+    try:
+        legacy: dict[str, str] = json.loads(data)
+    except (UnicodeDecodeError, ValueError):
+        entries = import_export_pb2.MediaEntries.FromString(pyzstd.decompress(data))
+        return [
+            MediaEntry(
+                member=str(entry.legacy_zip_filename if entry.HasField("legacy_zip_filename") else i),
+                filename=entry.name,
+                size=entry.size,
+                sha1=entry.sha1.hex(),
+            )
+            for i, entry in enumerate(entries.entries)
+        ]
+    return [MediaEntry(member=member, filename=filename) for member, filename in legacy.items()]
+
+
+class ApkgReader:
+    """
+    Lazily read the notes, cards, decks, notetypes and media of an .apkg.
+
+        with ApkgReader("deck.apkg") as reader:
+            for note in reader.notes():
+                ...
+
+    Rows are fetched `fetch_size` at a time. The extracted collection lives in a temporary directory (under `tmp_dir`,
+    if given) at `db_path` until the reader is closed. Anki doesn't index notes by guid; pass `guid_index=True` to add
+    an index to the extracted copy, for joining packages on it.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        *,
+        fetch_size: int = 1000,
+        tmp_dir: str | None = None,
+        guid_index: bool = False,
+    ):
+        self.path = Path(path)
+        self.fetch_size = fetch_size
+        self._tmp_dir = tmp_dir
+        self._guid_index = guid_index
+        self._stack = contextlib.ExitStack()
+        self.zip_file: ZipFile
+        self.collection_name: str
+        self.db_path: Path
+        self.conn: sqlite3.Connection
+
+    def __enter__(self) -> "ApkgReader":
+        try:
+            self.zip_file = self._stack.enter_context(ZipFile(self.path))
+            workdir = Path(self._stack.enter_context(tempfile.TemporaryDirectory(dir=self._tmp_dir)))
+            self.db_path = workdir / "collection.sqlite3"
+            with self.db_path.open("wb") as dest:
+                self.collection_name = extract_collection(self.zip_file, dest)
+            if self._guid_index:
+                with contextlib.closing(sqlite3.connect(self.db_path)) as conn:
+                    conn.execute("CREATE INDEX IF NOT EXISTS ix_notes_guid ON notes (guid)")
+            # immutable: nothing else writes to it, so sqlite needn't lock it or look for a journal
+            self.conn = sqlite3.connect(self.uri(), uri=True)
+            self._stack.callback(self.conn.close)
+            self.conn.create_collation("unicase", _unicase)
+        except BaseException:
+            self._stack.close()
+            raise
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._stack.close()
+
+    def uri(self) -> str:
+        """A read-only SQLite URI for the extracted collection, e.g. to ATTACH it to another connection."""
+        return f"{self.db_path.as_uri()}?mode=ro&immutable=1"
+
+    def _rows(self, sql: str, *params: Any) -> Iterator[tuple[Any, ...]]:
+        cursor = self.conn.execute(sql, params)
+        while rows := cursor.fetchmany(self.fetch_size):
+            yield from rows
+
+    def _has_table(self, name: str) -> bool:
+        found = self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+        return found is not None
+
+    def count(self, table: str) -> int:
+        """The number of rows in the notes, cards or revlog table."""
+        if table not in ("notes", "cards", "revlog"):
+            raise ValueError(f"Can't count {table!r}")
+        return self.conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+
+    def tables(self) -> list[str]:
+        return [name for (name,) in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+
+    def table(self, name: str) -> tuple[list[str], Iterator[tuple[Any, ...]]]:
+        """The column names and (lazily fetched) rows of any table in the collection."""
+        if name not in self.tables():
+            raise ValueError(f"No table {name!r} in {self.path}")
+        columns = [column for _, column, *_ in self.conn.execute(f"PRAGMA table_info({name})")]
+        return columns, self._rows(f"SELECT * FROM {name}")
+
+    def notes(self) -> Iterator[NoteRow]:
+        for id_, guid, mid, mod, tags, flds in self._rows("SELECT id, guid, mid, mod, tags, flds FROM notes ORDER BY id"):
+            yield NoteRow(id_, guid, mid, mod, tags.split(), flds.split("\x1f"))
+
+    def cards(self) -> Iterator[CardRow]:
+        for row in self._rows(
+            "SELECT id, nid, did, ord, type, queue, due, ivl, factor, reps, lapses FROM cards ORDER BY id"
+        ):
+            yield CardRow(*row)
+
+    def notetypes(self) -> Iterator[dict[str, Any]]:
+        """
+        The notetypes, as dicts with the keys of Anki's legacy model JSON ("id", "name", "type", "css", "sortf",
+        "flds", "tmpls", ...) whatever the collection's schema.
+        """
+        if not self._has_table("notetypes"):
+            # schema 11 keeps them as JSON in the col table
+            [models] = self.conn.execute("SELECT models FROM col").fetchone()
+            yield from json.loads(models).values()
+            return
+
+        for ntid, name, config_bytes in self._rows("SELECT id, name, config FROM notetypes ORDER BY id"):
+            config = notetypes_pb2.Notetype.Config.FromString(config_bytes)
+            fields = []
+            for ord_, field_name, field_config_bytes in self.conn.execute(
+                "SELECT ord, name, config FROM fields WHERE ntid = ? ORDER BY ord", (ntid,),
+            ):
+                field_config = notetypes_pb2.Notetype.Field.Config.FromString(field_config_bytes)
+                fields.append({
+                    "name": field_name,
+                    "ord": ord_,
+                    "font": field_config.font_name,
+                    "size": field_config.font_size,
+                    "rtl": field_config.rtl,
+                    "sticky": field_config.sticky,
+                })
+            templates = []
+            for ord_, template_name, template_config_bytes in self.conn.execute(
+                "SELECT ord, name, config FROM templates WHERE ntid = ? ORDER BY ord", (ntid,),
+            ):
+                template_config = notetypes_pb2.Notetype.Template.Config.FromString(template_config_bytes)
+                templates.append({
+                    "name": template_name,
+                    "ord": ord_,
+                    "qfmt": template_config.q_format,
+                    "afmt": template_config.a_format,
+                    "bqfmt": template_config.q_format_browser,
+                    "bafmt": template_config.a_format_browser,
+                })
+            yield {
+                "id": ntid,
+                "name": name,
+                "type": config.kind,
+                "css": config.css,
+                "latexPre": config.latex_pre,
+                "latexPost": config.latex_post,
+                "sortf": config.sort_field_idx,
+                "flds": fields,
+                "tmpls": templates,
+            }
+
+    def decks(self) -> Iterator[dict[str, Any]]:
+        """The decks, as dicts with the keys of Anki's legacy deck JSON ("id", "name", "desc", "dyn", ...)."""
+        if not self._has_table("decks"):
+            [decks] = self.conn.execute("SELECT decks FROM col").fetchone()
+            yield from json.loads(decks).values()
+            return
+
+        for deck_id, name, kind_bytes in self._rows("SELECT id, name, kind FROM decks ORDER BY id"):
+            kind = decks_pb2.Deck.KindContainer.FromString(kind_bytes)
+            yield {
+                "id": deck_id,
+                # the schema separates the levels of deck names with \x1f rather than ::
+                "name": name.replace("\x1f", "::"),
+                "desc": kind.normal.description if kind.HasField("normal") else "",
+                "dyn": int(kind.HasField("filtered")),
+            }
+
+    def media(self) -> list[MediaEntry]:
+        return read_media_map(self.zip_file)
+
+    @contextlib.contextmanager
+    def open_media(self, entry: MediaEntry) -> Iterator[IO[bytes]]:
+        """Open a media file for streaming; modern packages store media zstd-compressed."""
+        with self.zip_file.open(entry.member) as fp, _decompressed(fp, self.collection_name.endswith("b")) as src:
+            yield src
@@ -0,0 +1,148 @@
+from collections.abc import Iterable, Sequence
+import hashlib
+import json
+import os
+from pathlib import Path
+import sqlite3
+from typing import NamedTuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    key             text primary key,
+    guid            text not null,
+    note_id         integer not null unique
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cards (
+    note_id         integer not null,
+    ord             integer not null,
+    card_id         integer not null unique,
+    primary key (note_id, ord)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS decks (
+    name            text primary key,
+    deck_id         integer not null unique
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS notetypes (
+    name            text primary key,
+    notetype_id     integer not null unique,
+    fingerprint     text not null,
+    mtime           integer not null
+) WITHOUT ROWID;
+"""
+
+# SQLite's default limit on the number of parameters in a statement is 32766; stay well below it
+_CHUNK = 1000
+
+
+class RegisteredNote(NamedTuple):
+    guid: str
+    note_id: int
+
+
+class RegisteredNotetype(NamedTuple):
+    notetype_id: int
+    # the fingerprint of the model when the modification time was recorded
+    fingerprint: str
+    mtime: int
+
+
+def _chunks[T](items: Sequence[T]) -> Iterable[Sequence[T]]:
+    return (items[start:start + _CHUNK] for start in range(0, len(items), _CHUNK))
+
+
+class IdRegistry:
+    """
+    A SQLite file that remembers the guids and ids a package's notes, cards, decks and notetypes were given, so that
+    rebuilding the package gives them the same ones again. Pass one to `Package.write_to_file(registry=...)`.
+
+    Notes are keyed by their `source_key` (e.g. the primary key of the row a note was made from), or by their guid if
+    they have none. A note whose key is registered keeps its registered guid, even if its fields (and so its computed
+    guid) have changed. Decks and notetypes are keyed by name; a notetype's modification time moves forward whenever
+    its model's fingerprint changes, so that Anki takes the new templates and styling on import.
+
+    Lookups and inserts are batched and go through primary key indexes, so they stay fast with millions of keys.
+    """
+
+    def __init__(self, path: str | os.PathLike[str]):
+        self.path = Path(path)
+        # transactions are managed explicitly, one per batch
+        self._conn = sqlite3.connect(self.path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self) -> "IdRegistry":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT count(*) FROM notes").fetchone()[0]
+
+    def digest(self) -> str:
+        """A hash of everything registered, which changes whenever a build registers something new."""
+        h = hashlib.sha256()
+        for table, order in (("notes", "key"), ("cards", "note_id, ord"), ("decks", "name"), ("notetypes", "name")):
+            h.update(f"{table}\n".encode())
+            for row in self._conn.execute(f"SELECT * FROM {table} ORDER BY {order}"):
+                h.update(json.dumps(row, ensure_ascii=False).encode())
+                h.update(b"\n")
+        return h.hexdigest()
+
+    def notes(self, keys: Sequence[str]) -> dict[str, RegisteredNote]:
+        """The registered guid and note id of each of `keys` that is registered."""
+        found: dict[str, RegisteredNote] = {}
+        for chunk in _chunks(keys):
+            found.update(
+                (key, RegisteredNote(guid, note_id))
+                for key, guid, note_id in self._conn.execute(
+                    f"SELECT key, guid, note_id FROM notes WHERE key IN ({', '.join('?' * len(chunk))})", chunk,
+                )
+            )
+        return found
+
+    def cards(self, note_ids: Sequence[int]) -> dict[tuple[int, int], int]:
+        """The registered card ids of the notes `note_ids`, by (note id, ord)."""
+        found: dict[tuple[int, int], int] = {}
+        for chunk in _chunks(note_ids):
+            found.update(
+                ((note_id, ord_), card_id)
+                for note_id, ord_, card_id in self._conn.execute(
+                    f"SELECT note_id, ord, card_id FROM cards WHERE note_id IN ({', '.join('?' * len(chunk))})", chunk,
+                )
+            )
+        return found
+
+    def add_notes(self, notes: Iterable[tuple[str, str, int]]) -> None:
+        """Register (key, guid, note id) triples, in one transaction."""
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT INTO notes (key, guid, note_id) VALUES (?, ?, ?)", notes)
+
+    def add_cards(self, cards: Iterable[tuple[int, int, int]]) -> None:
+        """Register (note id, ord, card id) triples, in one transaction."""
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT INTO cards (note_id, ord, card_id) VALUES (?, ?, ?)", cards)
+
+    def deck_id(self, name: str) -> int | None:
+        found = self._conn.execute("SELECT deck_id FROM decks WHERE name = ?", (name,)).fetchone()
+        return found[0] if found is not None else None
+
+    def add_deck(self, name: str, deck_id: int) -> None:
+        self._conn.execute("INSERT INTO decks (name, deck_id) VALUES (?, ?)", (name, deck_id))
+
+    def notetype(self, name: str) -> RegisteredNotetype | None:
+        found = self._conn.execute(
+            "SELECT notetype_id, fingerprint, mtime FROM notetypes WHERE name = ?", (name,),
+        ).fetchone()
+        return RegisteredNotetype(*found) if found is not None else None
+
+    def set_notetype(self, name: str, notetype: RegisteredNotetype) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO notetypes (name, notetype_id, fingerprint, mtime) VALUES (?, ?, ?, ?)",
+            (name, *notetype),
+        )
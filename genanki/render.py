@@ -0,0 +1,282 @@
+"""
+Render the question and answer HTML of cards, to check a deck without importing it into Anki.
+
+Templates are compiled once per process with chevron, after which each card is a render of a cached token list. Anki's
+template additions are handled on top of Mustache: field filters (`{{text:Field}}`, `{{hint:Field}}`, ...), cloze
+deletions and the special fields `FrontSide`, `Tags`, `Deck`, `Subdeck`, `Card` and `Type`. Filters Anki implements in
+the reviewer (like `tts` or `furigana`) leave the field as it is.
+"""
+
+from collections import deque
+from collections.abc import Iterable, Iterator, Sequence
+from concurrent.futures import Future, ProcessPoolExecutor
+import functools
+import hashlib
+import html
+import itertools
+import json
+import re
+from typing import Any, NamedTuple, TextIO
+
+import chevron
+from chevron.tokenizer import tokenize
+
+from genanki.model import ModelType, VirtualModel
+from genanki.note import _cloze_ords
+
+_CLOZE_RE = re.compile(r"{{c(\d+)::(.*?)(?:::(.*?))?}}", re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]*>")
+_SPECIAL_FIELDS = frozenset({"FrontSide", "Tags", "Deck", "Subdeck", "Card", "Type", "CardFlag"})
+
+
+class RenderedCard(NamedTuple):
+    guid: str
+    deck: str
+    model: str
+    template: str
+    ord: int
+    question: str
+    answer: str
+
+
+class NoteToRender(NamedTuple):
+    model: VirtualModel[Any]
+    guid: str
+    deck: str
+    tags: Sequence[str]
+    values: Sequence[str]
+
+
+class _ModelSource(NamedTuple):
+    """What rendering needs of a model, in a form that pickles (models made by `make_model_spec` don't)."""
+
+    name: str
+    cloze: bool
+    fields: tuple[str, ...]
+    # (name, qfmt, afmt) of each template
+    templates: tuple[tuple[str, str, str], ...]
+
+    @classmethod
+    def of(cls, model: VirtualModel[Any]) -> "_ModelSource":
+        return cls(
+            name=model.name,
+            cloze=model.model_type is ModelType.CLOZE,
+            fields=tuple(f["name"] for f in model.fields),
+            templates=tuple((t["name"], t["qfmt"], t["afmt"]) for t in model.templates),
+        )
+
+
+class _CompiledTemplate(NamedTuple):
+    tokens: list[tuple[str, str]]
+    # the template's tag keys, e.g. "Front" or "cloze:Text"; tokens refer to them by position as "k0", "k1", ...
+    keys: tuple[str, ...]
+
+
+@functools.cache
+def _compile(source: str) -> _CompiledTemplate:
+    keys: dict[str, str] = {}
+    tokens: list[tuple[str, str]] = []
+    for kind, key in tokenize(source):
+        if kind in ("variable", "no escape", "section", "inverted section", "end") and key != ".":
+            key = keys.setdefault(key.strip(), f"k{len(keys)}")
+            # Anki doesn't escape field values
+            kind = "no escape" if kind == "variable" else kind
+        tokens.append((kind, key))
+    return _CompiledTemplate(tokens, tuple(keys))
+
+
+def _cloze(value: str, ord_: int, answer: bool) -> str:
+    def replace(match: re.Match[str]) -> str:
+        if int(match[1]) != ord_ + 1:
+            return match[2]
+        if answer:
+            return f'<span class="cloze">{match[2]}</span>'
+        return f'<span class="cloze">[{match[3] or "..."}]</span>'
+
+    return _CLOZE_RE.sub(replace, value)
+
+
+def _hint(value: str, field_name: str) -> str:
+    """A link that reveals the field, as Anki renders `{{hint:Field}}`."""
+    if not value.strip():
+        return value
+    # Anki numbers the element by a hash of the text too
+    element_id = int.from_bytes(hashlib.sha1(value.encode()).digest()[:8])
+    return (
+        f'<a class=hint href="#" onclick="this.style.display=\'none\';'
+        f"document.getElementById('hint{element_id}').style.display='block';return false;\" draggable=false>"
+        f'{html.escape(field_name)}</a><div id="hint{element_id}" class=hint style="display: none">{value}</div>'
+    )
+
+
+def _apply_filter(name: str, value: str, ord_: int, answer: bool, field_name: str) -> str:
+    if name == "cloze":
+        return _cloze(value, ord_, answer)
+    if name == "text":
+        return html.unescape(_TAG_RE.sub("", value))
+    if name == "type" and not answer:
+        return '<input type="text" id="typeans">'
+    if name == "hint":
+        return _hint(value, field_name)
+    return value
+
+
+class _CardRenderer:
+    def __init__(self, source: _ModelSource):
+        self.source = source
+        self.templates = [(name, _compile(qfmt), _compile(afmt)) for name, qfmt, afmt in source.templates]
+        # the fields the first question uses as cloze fields, which decide the cards of a cloze note
+        self._cloze_fields = [
+            source.fields.index(name)
+            for *filters, name in (key.split(":") for key in self.templates[0][1].keys)
+            if "cloze" in filters and name in source.fields
+        ]
+        # what each question renders to with every field empty; other models only make a card if its question differs
+        empty = dict.fromkeys(source.fields, "")
+        self._empty = [self._render(q, empty, {}, ord_, False) for ord_, (_, q, _) in enumerate(self.templates)]
+
+    def _render(
+        self, template: _CompiledTemplate, fields: dict[str, str], special: dict[str, str], ord_: int, answer: bool,
+    ) -> str:
+        data: dict[str, str] = {}
+        for i, key in enumerate(template.keys):
+            *filters, name = key.split(":")
+            if name in fields:
+                value = fields[name]
+            elif name in _SPECIAL_FIELDS:
+                value = special.get(name, "")
+            else:
+                value = f"{{unknown field {name}}}"
+            for filter_name in reversed(filters):
+                value = _apply_filter(filter_name.strip(), value, ord_, answer, name)
+            data[f"k{i}"] = value
+        return chevron.render(template.tokens, data)
+
+    def render(self, guid: str, deck: str, tags: Sequence[str], values: Sequence[str]) -> list[RenderedCard]:
+        source = self.source
+        fields = dict(itertools.zip_longest(source.fields, values[:len(source.fields)], fillvalue=""))
+        special = {"Tags": " ".join(tags), "Deck": deck, "Subdeck": deck.rpartition("::")[2], "Type": source.name}
+
+        if source.cloze:
+            name, question_template, answer_template = self.templates[0]
+            cloze_values = [fields[source.fields[i]] for i in self._cloze_fields]
+            cards = [(ord_, name, question_template, answer_template) for ord_ in _cloze_ords(cloze_values)]
+        else:
+            cards = [(ord_, name, q, a) for ord_, (name, q, a) in enumerate(self.templates)]
+
+        rendered: list[RenderedCard] = []
+        for ord_, name, question_template, answer_template in cards:
+            special["Card"] = name
+            question = self._render(question_template, fields, special, ord_, False)
+            if not source.cloze and question == self._empty[ord_]:
+                continue
+            answer = self._render(answer_template, fields, {**special, "FrontSide": question}, ord_, True)
+            rendered.append(RenderedCard(guid, deck, source.name, name, ord_, question, answer))
+        return rendered
+
+
+# The models this process has rendered, by fingerprint
+_SOURCES: dict[str, _ModelSource] = {}
+
+
+@functools.cache
+def _renderer(fingerprint: str) -> _CardRenderer:
+    return _CardRenderer(_SOURCES[fingerprint])
+
+
+type _WireNote = tuple[str, str, str, Sequence[str], Sequence[str]]
+
+
+def _render_chunk(sources: dict[str, _ModelSource], chunk: list[_WireNote]) -> list[RenderedCard]:
+    _SOURCES.update(sources)
+    return [card for fingerprint, *note in chunk for card in _renderer(fingerprint).render(*note)]
+
+
+def render_cards(
+    notes: Iterable[NoteToRender], *, max_workers: int | None = None, chunk_size: int = 1000,
+) -> Iterator[RenderedCard]:
+    """
+    Render every card of `notes`, in order. With `max_workers` > 1, chunks of `chunk_size` notes are rendered across a
+    process pool, with only a few chunks in flight at a time.
+    """
+    sources: dict[str, _ModelSource] = {}
+
+    def wire(chunk: list[NoteToRender]) -> tuple[dict[str, _ModelSource], list[_WireNote]]:
+        # each chunk carries the (small) sources of its models, so workers need no setup
+        used: dict[str, _ModelSource] = {}
+        notes: list[_WireNote] = []
+        for note in chunk:
+            fingerprint = note.model.fingerprint
+            if fingerprint not in used:
+                if fingerprint not in sources:
+                    sources[fingerprint] = _ModelSource.of(note.model)
+                used[fingerprint] = sources[fingerprint]
+            notes.append((fingerprint, note.guid, note.deck, tuple(note.tags), tuple(note.values)))
+        return used, notes
+
+    iterator = iter(notes)
+    chunks = (wire(chunk) for chunk in iter(lambda: list(itertools.islice(iterator, chunk_size)), []))
+
+    if max_workers is None or max_workers <= 1:
+        for chunk in chunks:
+            yield from _render_chunk(*chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending: deque[Future[list[RenderedCard]]] = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_render_chunk, *chunk))
+            if len(pending) >= 2 * max_workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def write_jsonl(fp: TextIO, cards: Iterable[RenderedCard]) -> int:
+    """Write one JSON object per card; returns the number written."""
+    count = 0
+    for card in cards:
+        fp.write(json.dumps(card._asdict(), ensure_ascii=False))
+        fp.write("\n")
+        count += 1
+    return count
+
+
+_REPORT_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+section {{ margin-bottom: 2em; }}
+h2 {{ font-size: 1em; font-weight: normal; color: #555; }}
+.sides {{ display: flex; gap: 1em; }}
+iframe {{ flex: 1; height: 16em; border: 1px solid #ccc; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+"""
+
+
+def write_html(fp: TextIO, cards: Iterable[RenderedCard], css: dict[str, str], *, title: str = "Card preview") -> int:
+    """
+    Write a static report showing each card's question and answer side by side, with its model's CSS (from `css`, by
+    model name). Each side is its own iframe, so the styles of different models don't mix. Returns the number written.
+    """
+    fp.write(_REPORT_HEAD.format(title=html.escape(title)))
+    count = 0
+    for card in cards:
+        style = f"<style>{css.get(card.model, '')}</style>"
+        fp.write(
+            f"<section>\n<h2>{html.escape(card.deck)} &middot; {html.escape(card.model)} &middot; "
+            f"{html.escape(card.template)} &middot; {html.escape(card.guid)}</h2>\n<div class=\"sides\">\n"
+        )
+        for side in (card.question, card.answer):
+            doc = f'{style}<div class="card card{card.ord + 1}">{side}</div>'
+            fp.write(f'<iframe srcdoc="{html.escape(doc)}"></iframe>\n')
+        fp.write("</div>\n</section>\n")
+        count += 1
+    fp.write("</body>\n</html>\n")
+    return count
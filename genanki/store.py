@@ -0,0 +1,251 @@
+from collections.abc import Iterable, Iterator, Mapping
+import json
+import os
+from pathlib import Path
+import sqlite3
+import tempfile
+from typing import Any, NamedTuple
+
+from anki import notes_pb2
+
+from genanki.batch import NoteBatch
+from genanki.card import Card
+from genanki.model import Model
+from genanki.note import Note, _first_field
+from genanki.util import field_checksum, strip_html_media
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    seq             integer primary key,
+    guid            text not null unique,
+    model           text not null,
+    flds            text not null,
+    tags            text not null,
+    due             integer not null,
+    csum            integer,
+    -- JSON [ord, suspend, due, ivl, ease] of each card, when any card isn't scheduled as a new card
+    cards           text,
+    -- the note's key in an `IdRegistry`, when it isn't the guid
+    source_key      text
+);
+CREATE INDEX IF NOT EXISTS ix_notes_csum ON notes (model, csum) WHERE csum IS NOT NULL;
+"""
+
+_COLUMNS = "guid, model, flds, tags, due, csum, cards, source_key"
+
+
+class StoredNote(NamedTuple):
+    seq: int
+    guid: str
+    model: str
+    fields: list[str]
+    tags: list[str]
+    due: int
+    # None when the cards are scheduled as new cards
+    cards: list[Card] | None = None
+    source_key: str | None = None
+
+
+def _encode_cards(cards: list[Card] | None) -> str | None:
+    if cards is None or all(card == Card(card.ord) for card in cards):
+        return None
+    return json.dumps([[card.ord, card.suspend, card.due, card.ivl, card.ease] for card in cards])
+
+
+def _decode_cards(data: str | None) -> list[Card] | None:
+    if data is None:
+        return None
+    return [Card(ord_, suspend, due=due, ivl=ivl, ease=ease) for ord_, suspend, due, ivl, ease in json.loads(data)]
+
+
+class NoteStore:
+    """
+    A staging SQLite database that holds the notes of a deck on disk instead of as `Note` objects, for decks too big to
+    keep in memory. Pass one to `Deck(store=...)`.
+
+    Notes are stored compactly as rows of the notes table Anki uses (fields joined by "\\x1f", tags by spaces), and
+    streamed back in the order they were added. The database uses WAL and a large page size, since it's written once in
+    bulk and then read sequentially. Without a `path`, it's a temporary file removed by `close`.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str] | None = None,
+        *,
+        page_size: int = 65536,
+        cache_size_kib: int = 65536,
+        commit_every: int = 100_000,
+    ):
+        self._temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="genanki-", suffix=".sqlite")
+            os.close(fd)
+        self.path = Path(path)
+        self._commit_every = commit_every
+        self._pending = 0
+
+        # transactions are managed explicitly, so that many inserts share one
+        self._conn = sqlite3.connect(self.path, isolation_level=None)
+        # page_size only takes effect before the first table is created
+        self._conn.execute(f"PRAGMA page_size = {int(page_size)}")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        # a staging database is rebuilt rather than recovered after a crash
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._conn.execute(f"PRAGMA cache_size = {-int(cache_size_kib)}")
+        self._conn.executescript(_SCHEMA)
+        # stores written before cards or source keys were kept
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(notes)")}
+        for column in ("cards", "source_key"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE notes ADD COLUMN {column} text")
+
+    def __enter__(self) -> "NoteStore":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT count(*) FROM notes").fetchone()[0]
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+        if self._temporary:
+            for suffix in ("", "-wal", "-shm"):
+                Path(f"{self.path}{suffix}").unlink(missing_ok=True)
+
+    def flush(self) -> None:
+        """Commit the notes added so far."""
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+        self._pending = 0
+
+    def _written(self, count: int) -> None:
+        self._pending += count
+        if self._pending >= self._commit_every:
+            self.flush()
+
+    def _begin(self) -> None:
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+
+    @staticmethod
+    def _row(note: Note[Any], checksum: bool) -> tuple[str, str, str, str, int, int | None, str | None, str | None]:
+        return (
+            note.guid,
+            note.model.name,
+            note._format_fields(),
+            " ".join(map(str, note._tags)),
+            note.due,
+            field_checksum(_first_field(note)) if checksum else None,
+            _encode_cards(note._cards),
+            note.source_key,
+        )
+
+    def find(self, note: Note[Any], *, check_first_field: bool = False) -> int | None:
+        """The seq of a stored note with the same guid as `note` or, with `check_first_field`, the same first field."""
+        found = self._conn.execute("SELECT seq FROM notes WHERE guid = ?", (note.guid,)).fetchone()
+        if found is not None or not check_first_field:
+            return found[0] if found is not None else None
+
+        first_field = strip_html_media(_first_field(note))
+        candidates = self._conn.execute(
+            "SELECT seq, flds FROM notes WHERE model = ? AND csum = ?",
+            (note.model.name, field_checksum(_first_field(note))),
+        )
+        for seq, flds in candidates:
+            # checksums can collide, so compare the stripped fields as well
+            if strip_html_media(flds.split("\x1f", 1)[0]) == first_field:
+                return seq
+        return None
+
+    def add(self, note: Note[Any], *, checksum: bool = False) -> None:
+        """Append `note`; `checksum` also stores its first-field checksum, for `find(check_first_field=True)`."""
+        self._begin()
+        self._conn.execute(f"INSERT INTO notes ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._row(note, checksum))
+        self._written(1)
+
+    def replace(self, seq: int, note: Note[Any], *, checksum: bool = False) -> None:
+        """Overwrite the note stored at `seq` with `note`, keeping its place in the order."""
+        self._begin()
+        self._conn.execute(
+            "UPDATE notes SET guid = ?, model = ?, flds = ?, tags = ?, due = ?, csum = ?, cards = ?, source_key = ? "
+            "WHERE seq = ?",
+            (*self._row(note, checksum), seq),
+        )
+        self._written(1)
+
+    def add_batch(self, batch: NoteBatch, *, on_conflict: str = "ABORT") -> int:
+        """
+        Append the notes of `batch`. A note whose guid is already stored fails the whole batch with
+        `on_conflict="ABORT"`, is dropped with "IGNORE", and overwrites the stored note with "REPLACE".
+        Returns the number of notes added or replaced.
+        """
+        tags = batch.tags if batch.tags is not None else [()] * len(batch)
+        due = batch.due if batch.due is not None else [0] * len(batch)
+        keys = batch.keys if batch.keys is not None else [None] * len(batch)
+        rows = (
+            (guid, batch.model.name, "\x1f".join(values), " ".join(map(str, note_tags)), note_due, None, None, key)
+            for values, guid, note_tags, note_due, key in zip(batch.rows(), batch.compute_guids(), tags, due, keys)
+        )
+
+        if on_conflict == "ABORT":
+            sql = f"INSERT INTO notes ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        elif on_conflict == "IGNORE":
+            sql = f"INSERT OR IGNORE INTO notes ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        elif on_conflict == "REPLACE":
+            # an upsert, unlike INSERT OR REPLACE, keeps the stored note's seq and so its place in the order
+            sql = (
+                f"INSERT INTO notes ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (guid) DO UPDATE SET "
+                "model = excluded.model, flds = excluded.flds, tags = excluded.tags, due = excluded.due, csum = NULL, "
+                "cards = NULL, source_key = excluded.source_key"
+            )
+        else:
+            raise ValueError(f"on_conflict must be ABORT, IGNORE or REPLACE, got {on_conflict!r}")
+
+        self._begin()
+        self._conn.execute("SAVEPOINT add_batch")
+        try:
+            count = self._conn.executemany(sql, rows).rowcount
+        except sqlite3.IntegrityError as e:
+            self._conn.execute("ROLLBACK TO add_batch")
+            self._conn.execute("RELEASE add_batch")
+            raise ValueError(f"NoteBatch has notes whose guids are already in the store: {e}") from e
+        self._conn.execute("RELEASE add_batch")
+        self._written(count)
+        return count
+
+    def notes(self, fetch_size: int = 10_000) -> Iterator[StoredNote]:
+        """Stream the stored notes back in the order they were added."""
+        self.flush()
+        cursor = self._conn.execute(
+            "SELECT seq, guid, model, flds, tags, due, cards, source_key FROM notes ORDER BY seq",
+        )
+        while rows := cursor.fetchmany(fetch_size):
+            for seq, guid, model, flds, tags, due, cards, source_key in rows:
+                yield StoredNote(
+                    seq, guid, model, flds.split("\x1f"), tags.split(), due, _decode_cards(cards), source_key,
+                )
+
+    def reqs(
+        self, models: Mapping[str, Model[Any]],
+    ) -> Iterator[tuple[notes_pb2.Note, int, list[Card] | None, str | None]]:
+        """
+        The stored notes as Anki notes, with notetype ids from `models` (by model name), each with its due position, the
+        scheduling of its cards (None when they're new cards) and its source key.
+        """
+        for note in self.notes():
+            req = notes_pb2.Note(
+                fields=note.fields,
+                guid=note.guid,
+                notetype_id=models[note.model].model_id or 0,
+                tags=note.tags,
+            )
+            yield req, note.due, note.cards, note.source_key
+
+    def field_values(self, model_names: Iterable[str]) -> Iterator[str]:
+        """Every field value of the notes of the given models, e.g. to validate them."""
+        names = set(model_names)
+        return (value for note in self.notes() if note.model in names for value in note.fields)
+
@@ -1,4 +1,7 @@
+from collections.abc import Iterable, Sequence
 import hashlib
+import html
+import re
 from typing import Protocol
 
 BASE91_TABLE = [
@@ -96,26 +99,90 @@ BASE91_TABLE = [
 ]
 
 
+# every two-digit base91 string, indexed by its value, so `_base91` can emit two digits per divmod
+_BASE91_PAIRS = [hi + lo for hi in BASE91_TABLE for lo in BASE91_TABLE]
+
+
 class SupportsStr(Protocol):
     def __str__(self) -> str: ...
 
 
-def guid_for(*values: SupportsStr):
+def _hash_int(values: Iterable[SupportsStr]) -> int:
     hash_str = "__".join(str(val) for val in values)
 
     # get the first 8 bytes of the SHA256 of hash_str as an int
-    m = hashlib.sha256()
-    m.update(hash_str.encode("utf-8"))
-    hash_bytes = m.digest()[:8]
-    hash_int = 0
-    for b in hash_bytes:
-        hash_int <<= 8
-        hash_int += b
+    return int.from_bytes(hashlib.sha256(hash_str.encode("utf-8")).digest()[:8], "big")
+
 
+def _base91(hash_int: int) -> str:
     # convert to the weird base91 format that Anki uses
     rv_reversed: list[str] = []
     while hash_int > 0:
-        rv_reversed.append(BASE91_TABLE[hash_int % len(BASE91_TABLE)])
-        hash_int //= len(BASE91_TABLE)
+        hash_int, rem = divmod(hash_int, len(_BASE91_PAIRS))
+        rv_reversed.append(_BASE91_PAIRS[rem])
+
+    # the most significant pair may start with a zero digit, which Anki's encoding never emits
+    return "".join(reversed(rv_reversed)).lstrip(BASE91_TABLE[0])
+
+
+def _base91_numpy(hash_ints: Sequence[int]) -> list[str]:
+    import numpy as np
+
+    remaining = np.array(hash_ints, dtype=np.uint64)
+    # 91 ** 10 > 2 ** 64, so ten digits always suffice
+    digits = np.empty((len(hash_ints), 10), dtype=np.uint8)
+    for i in reversed(range(10)):
+        remaining, digits[:, i] = np.divmod(remaining, np.uint64(len(BASE91_TABLE)))
+
+    chars = np.array(BASE91_TABLE)[digits]
+    return [s.lstrip(BASE91_TABLE[0]) for s in chars.view("<U10").ravel().tolist()]
+
+
+def guid_for(*values: SupportsStr) -> str:
+    return _base91(_hash_int(values))
+
+
+def guid_for_many(rows: Iterable[str | Iterable[SupportsStr]], *, use_numpy: bool | None = None) -> list[str]:
+    """
+    Compute `guid_for(*row)` for every row, e.g. for a whole column of field values at once.
+
+    A row that is a plain `str` is treated as a single value rather than a sequence of characters. The base91 encoding
+    is vectorized with NumPy when `use_numpy` is true, or when it is `None` and NumPy is installed.
+    """
+    hash_ints = [_hash_int((row,) if isinstance(row, str) else row) for row in rows]
+
+    if use_numpy is None:
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            use_numpy = False
+        else:
+            use_numpy = True
+
+    if use_numpy and hash_ints:
+        return _base91_numpy(hash_ints)
+
+    return [_base91(hash_int) for hash_int in hash_ints]
+
+
+# the same patterns Anki uses to strip a field before checksumming it
+_HTML_MEDIA_TAGS_RE = re.compile(
+    r"""<\b(?:img|audio|video|object)\b[^>]+\b(?:src|data)\b=(?:"([^"]+)"|'([^']+)'|([^ "'>]+))[^>]*>""",
+    re.IGNORECASE | re.DOTALL,
+)
+_HTML_COMMENTS_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_HTML_TAGS_RE = re.compile(r"<.*?>", re.DOTALL)
+
+
+def strip_html_media(text: str) -> str:
+    """Strip HTML from `text`, keeping the file names of any media it references, as Anki does for duplicate checks."""
+    text = _HTML_MEDIA_TAGS_RE.sub(r" \1\2\3 ", text)
+    text = _HTML_TAGS_RE.sub("", _HTML_COMMENTS_RE.sub("", text))
+    if "&" in text:
+        text = html.unescape(text.replace("&nbsp;", " "))
+    return text
+
 
-    return "".join(reversed(rv_reversed))
+def field_checksum(text: str) -> int:
+    """The checksum Anki stores in the `csum` column of the notes table, for a note whose first field is `text`."""
+    return int(hashlib.sha1(strip_html_media(text).encode("utf-8")).hexdigest()[:8], 16)
@@ -0,0 +1,88 @@
+from typing import Any
+import tempfile
+
+import anki.decks
+import pytest
+
+import genanki
+from genanki import model
+
+
+DECK_ID = anki.decks.DeckId(1447215863)
+
+
+class QAModelSpec(model.ModelSpec[Any]):
+    @model.spec
+    class fields(model.FieldSpec):
+        Question: str = model.field()
+        Answer: str = model.field()
+
+    @model.spec
+    class templates(model.TemplateSpec[fields], fields=fields):
+        card1: str = model.template({
+            "qfmt": "{{Question}}",
+            "afmt": '{{FrontSide}}<hr id="answer">{{Answer}}',
+        })
+
+
+QA_MODEL = genanki.Model(name="QA", model_spec=QAModelSpec)
+
+
+def test_columns_follow_field_order():
+    batch = genanki.NoteBatch(model=QA_MODEL, columns={"Answer": ["a1", "a2"], "Question": ["q1", "q2"]})
+
+    assert len(batch) == 2
+    assert list(batch.rows()) == [("q1", "a1"), ("q2", "a2")]
+
+
+def test_guids_match_notes():
+    batch = genanki.NoteBatch(model=QA_MODEL, columns={"Question": ["q1", "q2"], "Answer": ["a1", "a2"]})
+    notes = [
+        genanki.Note(model=QA_MODEL, fields=QAModelSpec.fields(Question=q, Answer=a))
+        for q, a in [("q1", "a1"), ("q2", "a2")]
+    ]
+
+    assert batch.compute_guids() == [n.guid for n in notes]
+
+
+def test_explicit_guids_and_tags():
+    batch = genanki.NoteBatch(
+        model=QA_MODEL,
+        columns={"Question": ["q1"], "Answer": ["a1"]},
+        guids=["abc"],
+        tags=["foo bar"],
+    )
+
+    [req] = batch.reqs()
+    assert req.guid == "abc"
+    assert list(req.tags) == ["foo", "bar"]
+
+
+def test_mismatched_columns():
+    with pytest.raises(ValueError):
+        genanki.NoteBatch(model=QA_MODEL, columns={"Question": ["q1"]})
+
+    with pytest.raises(ValueError):
+        genanki.NoteBatch(model=QA_MODEL, columns={"Question": ["q1"], "Answer": ["a1", "a2"]})
+
+
+def test_invalid_html():
+    with pytest.raises(ValueError, match="^Field contained the following invalid HTML tags"):
+        genanki.NoteBatch(model=QA_MODEL, columns={"Question": ["<$>"], "Answer": [""]})
+
+
+def test_from_frame():
+    frame = {"q": ["q1"], "a": ["a1"], "t": [["foo"]]}
+
+    batch = genanki.NoteBatch.from_frame(QA_MODEL, frame, fields={"Question": "q", "Answer": "a"}, tags="t")
+
+    assert list(batch.rows()) == [("q1", "a1")]
+    assert batch.tags == [(genanki.note.Tag("foo"),)]
+
+
+def test_write_batch():
+    deck = genanki.Deck(deck_id=DECK_ID, name="Batch")
+    deck.add_batch(genanki.NoteBatch(model=QA_MODEL, columns={"Question": ["q1", "q2"], "Answer": ["a1", "a2"]}))
+
+    with tempfile.NamedTemporaryFile(delete=True, delete_on_close=False) as tempf:
+        genanki.Package(deck).write_to_file(tempf.name)
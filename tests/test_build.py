@@ -0,0 +1,34 @@
+from pathlib import Path
+import zipfile
+
+from genanki.bin import build
+
+
+def test_read_rows(tmp_path: Path):
+    (tmp_path / "in.tsv").write_text("Front\tBack\nq1\ta1\n", encoding="utf-8")
+    (tmp_path / "in.jsonl").write_text('{"Front": "q2", "Back": 2}\n\n', encoding="utf-8")
+
+    assert list(build.read_rows(tmp_path / "in.tsv")) == [{"Front": "q1", "Back": "a1"}]
+    assert list(build.read_rows(tmp_path / "in.jsonl")) == [{"Front": "q2", "Back": 2}]
+
+
+def test_prepare_batch():
+    rows = [{"q": "q1", "a": "a1", "tags": "foo bar"}, {"q": "q2", "a": 2, "tags": ""}]
+
+    batch = build.prepare_batch("basic", {"Front": "q", "Back": "a"}, "tags", None, rows)
+
+    assert list(batch.rows()) == [("q1", "a1"), ("q2", "2")]
+    assert [[str(tag) for tag in tags] for tags in batch.tags or []] == [["foo", "bar"], []]
+
+
+def test_build(tmp_path: Path):
+    (tmp_path / "in.csv").write_text("question,answer\n" + "".join(f"q{i},a{i}\n" for i in range(25)), encoding="utf-8")
+
+    build.main(
+        [tmp_path / "in.csv"],
+        output=tmp_path / "out.apkg",
+        field=("Front=question", "Back=answer"),
+        batch_size=10,
+    )
+
+    assert zipfile.is_zipfile(tmp_path / "out.apkg")
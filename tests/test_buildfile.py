@@ -0,0 +1,115 @@
+from pathlib import Path
+import zipfile
+
+import pydantic
+import pytest
+
+from genanki import buildfile
+from genanki.reader import ApkgReader
+
+BUILD_FILE = """
+models:
+  vocab:
+    name: Vocab
+    fields: [Word, Back Extra]
+    templates:
+      - name: Recognition
+        qfmt: "{{Word}}"
+        afmt: "{{FrontSide}}<hr id=answer>{{Back Extra}}"
+    guid_fields: [Word]
+
+decks:
+  spanish:
+    name: Spanish::Vocab
+    model: vocab
+    sources: [spanish.csv]
+    fields: {Back Extra: english}
+  basic:
+    name: Basic
+    model: basic
+    sources: [basic.jsonl]
+
+packages:
+  out/spanish.apkg:
+    decks: [spanish]
+  out/all.apkg:
+    decks: [spanish, basic]
+"""
+
+
+@pytest.fixture
+def build_path(tmp_path: Path) -> Path:
+    (tmp_path / "genanki.yaml").write_text(BUILD_FILE, encoding="utf-8")
+    (tmp_path / "spanish.csv").write_text("Word,english\nperro,dog\ngato,cat\n", encoding="utf-8")
+    (tmp_path / "basic.jsonl").write_text('{"Front": "q", "Back": "a"}\n', encoding="utf-8")
+    return tmp_path / "genanki.yaml"
+
+
+def test_build_model(build_path: Path):
+    build_file = buildfile.load_build_file(build_path)
+
+    vocab = buildfile.build_model(build_file.models["vocab"])
+
+    assert vocab is buildfile.build_model(build_file.models["vocab"])
+    assert [f["name"] for f in vocab.fields] == ["Word", "Back Extra"]
+    assert [t["name"] for t in vocab.templates] == ["Recognition"]
+    assert vocab.guid_strategy == ("Word",)
+
+
+def test_unknown_guid_field(build_path: Path):
+    build_file = buildfile.load_build_file(build_path)
+    model_def = build_file.models["vocab"].model_copy(update={"guid_fields": ["Nope"]})
+
+    with pytest.raises(ValueError, match="'Vocab' has unknown guid_fields \\['Nope'\\]"):
+        buildfile.build_model(model_def)
+
+
+def test_digest_covers_loaded_models(build_path: Path, monkeypatch: pytest.MonkeyPatch):
+    build_file = buildfile.load_build_file(build_path)
+    before = buildfile.target_digest(build_file, "out/all.apkg", build_path.parent)
+
+    changed = buildfile.build_model(build_file.models["vocab"])
+    monkeypatch.setattr(buildfile, "load_model", lambda ref: changed)
+    assert buildfile.target_digest(build_file, "out/all.apkg", build_path.parent) != before
+
+
+def test_unknown_deck():
+    with pytest.raises(pydantic.ValidationError, match="unknown deck 'nope'"):
+        buildfile.BuildFile.model_validate({"packages": {"out.apkg": {"decks": ["nope"]}}})
+
+
+def test_build_all(build_path: Path):
+    assert sorted(buildfile.build_all(build_path, jobs=1)) == [("out/all.apkg", True), ("out/spanish.apkg", True)]
+    assert zipfile.is_zipfile(build_path.parent / "out" / "all.apkg")
+
+    # nothing changed, so nothing is rebuilt
+    assert sorted(buildfile.build_all(build_path, jobs=1)) == [("out/all.apkg", False), ("out/spanish.apkg", False)]
+
+    (build_path.parent / "basic.jsonl").write_text('{"Front": "q2", "Back": "a2"}\n', encoding="utf-8")
+    assert sorted(buildfile.build_all(build_path, jobs=1)) == [("out/all.apkg", True), ("out/spanish.apkg", False)]
+
+
+def test_models_with_the_same_name(build_path: Path):
+    template = {"name": "Card 1", "qfmt": "{{Word}}", "afmt": "{{FrontSide}}"}
+    build_file = buildfile.BuildFile.model_validate({
+        "models": {
+            "one": {"name": "Vocab", "fields": ["Word", "Meaning"], "templates": [template]},
+            "two": {"name": "Vocab", "fields": ["Word"], "templates": [template]},
+        },
+        "decks": {
+            "first": {"name": "First", "model": "one", "sources": ["first.csv"]},
+            "second": {"name": "Second", "model": "two", "sources": ["second.csv"]},
+        },
+        "packages": {"out.apkg": {"decks": ["first", "second"]}},
+    })
+    (build_path.parent / "first.csv").write_text("Word,Meaning\nperro,dog\n", encoding="utf-8")
+    (build_path.parent / "second.csv").write_text("Word\ngato\n", encoding="utf-8")
+
+    out = buildfile.build_target(build_file, "out.apkg", build_path.parent)
+
+    with ApkgReader(out) as reader:
+        notetypes = {notetype["id"]: notetype for notetype in reader.notetypes()}
+        assert len(notetypes) == 2
+        assert sorted(
+            (note.fields, len(notetypes[note.mid]["flds"])) for note in reader.notes()
+        ) == [(["gato"], 1), (["perro", "dog"], 2)]
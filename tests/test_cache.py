@@ -0,0 +1,89 @@
+import os
+from pathlib import Path
+
+import genanki
+from genanki.cache import BuildCache, package_key
+from genanki.reader import ApkgReader
+
+from tests.test_deck import QAModelSpec, qa_note
+
+
+def test_package_key():
+    deck = genanki.Deck(name="d")
+    deck.add_note(qa_note("a"))
+    package = genanki.Package(deck)
+    key = package_key(package)
+
+    assert package_key(package) == key
+
+    deck.add_note(qa_note("b"))
+    assert package_key(package) != key
+
+
+def test_package_key_covers_card_scheduling():
+    note = qa_note("a")
+    package = genanki.Package(genanki.Deck(name="d", notes=[note]))
+    key = package_key(package)
+
+    note.cards[0].suspend = True
+    assert package_key(package) != key
+
+
+def test_hit_links_cached_package(tmp_path: Path):
+    deck = genanki.Deck(name="d")
+    deck.add_note(qa_note("a"))
+    package = genanki.Package(deck)
+
+    package.write_to_file(str(tmp_path / "first.apkg"), cache=tmp_path / "cache")
+    package.write_to_file(str(tmp_path / "second.apkg"), cache=tmp_path / "cache")
+
+    assert (tmp_path / "first.apkg").read_bytes() == (tmp_path / "second.apkg").read_bytes()
+    assert os.path.samefile(tmp_path / "second.apkg", tmp_path / "cache" / f"{package_key(package)}.apkg")
+
+
+def cached_packages(cache: Path) -> int:
+    return len(list(cache.glob("*.apkg")))
+
+
+def test_registry_change_misses(tmp_path: Path):
+    package = genanki.Package(genanki.Deck(name="d", notes=[qa_note("a")]))
+    cache = tmp_path / "cache"
+
+    package.write_to_file(str(tmp_path / "first.apkg"), cache=cache, registry=tmp_path / "one.db")
+    package.write_to_file(str(tmp_path / "second.apkg"), cache=cache, registry=tmp_path / "one.db")
+    assert cached_packages(cache) == 1 and os.path.samefile(tmp_path / "first.apkg", tmp_path / "second.apkg")
+
+    # a registry without the ids the cached package was given
+    package.write_to_file(str(tmp_path / "third.apkg"), cache=cache, registry=tmp_path / "two.db")
+    assert cached_packages(cache) == 2
+    with genanki.IdRegistry(tmp_path / "two.db") as registry:
+        assert len(registry) == 1
+
+
+def test_model_id_change_misses(tmp_path: Path):
+    model = genanki.Model(name="Cached", model_spec=QAModelSpec, guid_strategy=("Question",))
+    note = genanki.Note(model=model, fields=QAModelSpec.fields(Question="a", Answer=""))
+    package = genanki.Package(genanki.Deck(name="d", notes=[note]))
+    cache = tmp_path / "cache"
+
+    package.write_to_file(str(tmp_path / "first.apkg"), cache=cache)
+    model.model_id = 1234567
+    package.write_to_file(str(tmp_path / "second.apkg"), cache=cache)
+
+    assert cached_packages(cache) == 2
+    with ApkgReader(tmp_path / "second.apkg") as reader:
+        assert [notetype["id"] for notetype in reader.notetypes()] == [1234567]
+
+
+def test_evicts_least_recently_used(tmp_path: Path):
+    cache = BuildCache(tmp_path / "cache")
+    for i in range(3):
+        (tmp_path / f"{i}.apkg").write_bytes(b"x" * 100)
+        cache.put(str(i), tmp_path / f"{i}.apkg")
+    for i in range(3):
+        os.utime(tmp_path / "cache" / f"{i}.apkg", (i, i))
+    assert cache.get("0", tmp_path / "out.apkg")
+    cache.max_bytes = 250
+    cache.evict()
+
+    assert sorted(path.name for path in (tmp_path / "cache").iterdir()) == ["0.apkg", "2.apkg"]
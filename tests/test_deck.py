@@ -0,0 +1,87 @@
+from typing import Any
+
+import pytest
+
+import genanki
+from genanki import model
+
+
+class QAModelSpec(model.ModelSpec[Any]):
+    @model.spec
+    class fields(model.FieldSpec):
+        Question: str = model.field()
+        Answer: str = model.field()
+
+    @model.spec
+    class templates(model.TemplateSpec[fields], fields=fields):
+        card1: str = model.template({
+            "qfmt": "{{Question}}",
+            "afmt": '{{FrontSide}}<hr id="answer">{{Answer}}',
+        })
+
+
+QA_MODEL = genanki.Model(name="QA", model_spec=QAModelSpec, guid_strategy=("Question",))
+
+
+def qa_note(question: str, answer: str = "") -> genanki.Note[Any]:
+    return genanki.Note(model=QA_MODEL, fields=QAModelSpec.fields(Question=question, Answer=answer))
+
+
+class TestDuplicates:
+    def test_allow_by_default(self):
+        deck = genanki.Deck(name="d")
+        deck.add_note(qa_note("a", "1"))
+        deck.add_batch(genanki.NoteBatch(model=QA_MODEL, columns={"Question": ["a"], "Answer": ["2"]}))
+
+        assert deck.add_note(qa_note("a", "3"))
+        assert [note.fields.Answer for note in deck.notes] == ["1", "3"]
+
+    def test_raise(self):
+        deck = genanki.Deck(name="d", duplicate_policy=genanki.DuplicatePolicy.RAISE)
+        deck.add_note(qa_note("a", "1"))
+
+        with pytest.raises(ValueError, match="duplicates a note"):
+            deck.add_note(qa_note("a", "2"))
+
+    def test_skip(self):
+        deck = genanki.Deck(name="d", duplicate_policy=genanki.DuplicatePolicy.SKIP)
+
+        assert deck.add_note(qa_note("a", "1"))
+        assert not deck.add_note(qa_note("a", "2"))
+        assert [note.fields.Answer for note in deck.notes] == ["1"]
+
+    def test_replace(self):
+        deck = genanki.Deck(name="d", duplicate_policy=genanki.DuplicatePolicy.REPLACE)
+        deck.add_note(qa_note("a", "1"))
+        deck.add_note(qa_note("b", "1"))
+
+        assert deck.add_note(qa_note("a", "2"))
+        assert [(note.fields.Question, note.fields.Answer) for note in deck.notes] == [("a", "2"), ("b", "1")]
+
+    def test_guid_changed_after_indexing(self):
+        deck = genanki.Deck(name="d", duplicate_policy=genanki.DuplicatePolicy.REPLACE)
+        edited = qa_note("a", "1")
+        deck.add_note(edited)
+        edited.fields.Question = "b"
+
+        # the stale entry for "a" neither matches the edited note nor breaks replacing it
+        assert deck.add_note(qa_note("a", "2"))
+        assert deck.add_note(qa_note("a", "3"))
+        assert [(note.fields.Question, note.fields.Answer) for note in deck.notes] == [("b", "1"), ("a", "3")]
+
+    def test_first_field(self):
+        by_values = genanki.Model(name="QA", model_spec=QAModelSpec, guid_strategy=genanki.GuidStrategy.VALUES)
+        deck = genanki.Deck(name="d", duplicate_policy="skip", check_first_field=True)
+        deck.add_note(genanki.Note(model=by_values, fields=QAModelSpec.fields(Question="<b>dog</b>", Answer="1")))
+
+        assert not deck.add_note(genanki.Note(model=by_values, fields=QAModelSpec.fields(Question="dog", Answer="2")))
+        assert deck.add_note(genanki.Note(model=by_values, fields=QAModelSpec.fields(Question="cat", Answer="2")))
+
+    def test_batch_skip(self):
+        deck = genanki.Deck(name="d", duplicate_policy="skip")
+        deck.add_note(qa_note("a"))
+
+        batch = deck.add_batch(genanki.NoteBatch(model=QA_MODEL, columns={"Question": ["a", "b", "b"], "Answer": ["", "", ""]}))
+
+        assert list(batch.rows()) == [("b", "")]
+        assert deck.batches == [batch]
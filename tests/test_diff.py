@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import genanki
+from genanki.diff import PackageDiff
+
+from tests.test_deck import qa_note
+
+
+def write_package(path: Path, *notes: genanki.Note) -> Path:
+    deck = genanki.Deck(name="Diff")
+    for note in notes:
+        deck.add_note(note)
+    genanki.Package(deck).write_to_file(str(path))
+    return path
+
+
+def test_diff(tmp_path: Path):
+    kept = qa_note("kept", "same")
+    changed = qa_note("changed", "old")
+    removed = qa_note("removed", "gone")
+    a = write_package(tmp_path / "a.apkg", kept, changed, removed)
+
+    # the QA model's guids only hash the question
+    changed_again = qa_note("changed", "new")
+    changed_again.tags = ["edited"]
+    added = qa_note("added", "new")
+    b = write_package(tmp_path / "b.apkg", kept, changed_again, added)
+
+    with PackageDiff(a, b) as diff:
+        assert diff.summary() == {"added": 1, "removed": 1, "modified": 1}
+        assert [note["guid"] for note in diff.added_notes()] == [added.guid]
+        assert [note["guid"] for note in diff.removed_notes()] == [removed.guid]
+        assert list(diff.modified_notes()) == [{
+            "guid": changed.guid,
+            "fields": {"Answer": ["old", "new"]},
+            "tags": {"added": ["edited"], "removed": []},
+        }]
+        assert diff.notetypes() == {"added": [], "removed": [], "modified": []}
+
+
+def test_identical(tmp_path: Path):
+    a = write_package(tmp_path / "a.apkg", qa_note("q", "a"))
+
+    with PackageDiff(a, a) as diff:
+        assert diff.summary() == {"added": 0, "removed": 0, "modified": 0}
+        assert list(diff.modified_notes()) == []
@@ -0,0 +1,50 @@
+import json
+from pathlib import Path
+import sqlite3
+
+import pytest
+
+from genanki.bin import dump_apkg
+
+from tests.test_reader import write_legacy_package
+
+
+def test_sqlite(tmp_path: Path):
+    dump_apkg.main(write_legacy_package(tmp_path), output=tmp_path / "out.sqlite3")
+
+    assert sqlite3.connect(tmp_path / "out.sqlite3").execute("SELECT guid FROM notes").fetchall() == [("guid",)]
+
+
+def test_jsonl(tmp_path: Path):
+    dump_apkg.main(write_legacy_package(tmp_path), output=tmp_path / "notes.jsonl", format="jsonl")
+
+    [line] = (tmp_path / "notes.jsonl").read_text(encoding="utf-8").splitlines()
+    assert json.loads(line)["fields"] == ["front", "back"]
+
+
+def test_csv(tmp_path: Path):
+    dump_apkg.main(write_legacy_package(tmp_path), output=tmp_path / "csv", format="csv", tables=("notes",))
+
+    assert [path.name for path in (tmp_path / "csv").iterdir()] == ["notes.csv"]
+    assert (tmp_path / "csv" / "notes.csv").read_text(encoding="utf-8").startswith("id,guid,mid,")
+
+
+def test_media(tmp_path: Path, capsys: pytest.CaptureFixture[str]):
+    dump_apkg.main(write_legacy_package(tmp_path), format="media")
+
+    assert json.loads(capsys.readouterr().out) == {"member": "0", "filename": "dog.jpg", "size": None, "sha1": None}
+
+
+def test_stats_only(tmp_path: Path, capsys: pytest.CaptureFixture[str]):
+    dump_apkg.main(write_legacy_package(tmp_path), stats_only=True)
+
+    result = json.loads(capsys.readouterr().out)
+    assert result["media"] == 1
+    assert result["collection_size"] == (tmp_path / "collection.anki2").stat().st_size
+    assert "tables" not in result
+
+
+def test_stats_row_counts(tmp_path: Path, capsys: pytest.CaptureFixture[str]):
+    dump_apkg.main(write_legacy_package(tmp_path), stats_only=True, row_counts=True)
+
+    assert json.loads(capsys.readouterr().out)["tables"]["notes"] == 1
@@ -0,0 +1,104 @@
+from pathlib import Path
+from typing import Any
+import zipfile
+
+import pytest
+
+import genanki
+from genanki import model
+from genanki.reader import ApkgReader
+
+from tests.test_deck import qa_note
+from tests.test_diff import write_package
+
+
+def test_add_update_remove(tmp_path: Path):
+    kept, changed, removed = qa_note("kept", "1"), qa_note("changed", "2"), qa_note("removed", "3")
+    path = write_package(tmp_path / "deck.apkg", kept, changed, removed)
+    members = {info.filename: info.CRC for info in zipfile.ZipFile(path).infolist()}
+
+    with genanki.Package.open_existing(path) as package:
+        assert package.add_notes([qa_note("added", "4")], deck="Diff") == 1
+        assert package.update_notes([qa_note("changed", "two")]) == 1
+        assert package.remove_notes([removed.guid, "not a guid"]) == 1
+        package.save()
+
+    with ApkgReader(path) as reader:
+        assert [note.fields for note in reader.notes()] == [["kept", "1"], ["changed", "two"], ["added", "4"]]
+        assert reader.count("cards") == 3
+
+    # everything but the collection is copied as it was
+    for info in zipfile.ZipFile(path).infolist():
+        if info.filename != "collection.anki21b":
+            assert info.CRC == members[info.filename]
+
+
+def test_add_existing_guid(tmp_path: Path):
+    path = write_package(tmp_path / "deck.apkg", qa_note("q", "a"))
+
+    with genanki.Package.open_existing(path) as package, pytest.raises(ValueError, match="already in the package"):
+        package.add_notes([qa_note("q", "other")], deck="Diff")
+
+
+def test_close_without_saving(tmp_path: Path):
+    path = write_package(tmp_path / "deck.apkg", qa_note("q", "a"))
+    before = path.read_bytes()
+
+    with genanki.Package.open_existing(path) as package:
+        package.remove_notes([qa_note("q").guid])
+
+    assert path.read_bytes() == before
+
+
+class WordModelSpec(model.ModelSpec[Any]):
+    @model.spec
+    class fields(model.FieldSpec):
+        Word: str = model.field()
+
+    @model.spec
+    class templates(model.TemplateSpec[fields], fields=fields):
+        card1: str = model.template({"qfmt": "{{Word}}", "afmt": "{{FrontSide}}"})
+
+
+def test_add_notes_of_a_different_model_with_the_same_name(tmp_path: Path):
+    path = write_package(tmp_path / "deck.apkg", qa_note("q", "a"))
+    word_model = genanki.Model(name="QA", model_spec=WordModelSpec)
+
+    with genanki.Package.open_existing(path) as package:
+        package.add_notes([genanki.Note(model=word_model, fields=WordModelSpec.fields(Word="perro"))], deck="Diff")
+        package.add_notes([genanki.Note(model=word_model, fields=WordModelSpec.fields(Word="gato"))], deck="Diff")
+        package.save()
+
+    with ApkgReader(path) as reader:
+        notetypes = {notetype["id"]: [f["name"] for f in notetype["flds"]] for notetype in reader.notetypes()}
+        assert sorted(notetypes.values()) == [["Question", "Answer"], ["Word"]]
+        assert sorted((note.fields, notetypes[note.mid]) for note in reader.notes()) == [
+            (["gato"], ["Word"]), (["perro"], ["Word"]), (["q", "a"], ["Question", "Answer"]),
+        ]
+
+
+def test_add_notes_with_scheduling(tmp_path: Path):
+    path = write_package(tmp_path / "deck.apkg", qa_note("q", "a"))
+    suspended, queued = qa_note("suspended"), qa_note("queued")
+    suspended.cards[0].suspend = True
+    queued.due = 42
+
+    with genanki.Package.open_existing(path) as package:
+        package.add_notes([suspended, queued], deck="Diff")
+        package.save()
+
+    with ApkgReader(path) as reader:
+        scheduling = dict(reader.conn.execute(
+            "SELECT n.flds, c.queue || ':' || c.due FROM cards AS c JOIN notes AS n ON n.id = c.nid",
+        ).fetchall())
+    assert scheduling["suspended\x1f"].startswith("-1:")
+    assert scheduling["queued\x1f"] == "0:42"
+
+
+def test_add_repeated_guid(tmp_path: Path):
+    path = write_package(tmp_path / "deck.apkg", qa_note("q", "a"))
+
+    with genanki.Package.open_existing(path) as package:
+        with pytest.raises(ValueError, match="repeated"):
+            package.add_notes([qa_note("new", "1"), qa_note("new", "2")], deck="Diff")
+        assert len(list(package.notes())) == 1
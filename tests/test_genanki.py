@@ -524,6 +524,26 @@ def test_card_suspend():
             assert col.find_cards("is:suspended") == [3]
 
 
+def test_card_review_scheduling():
+    deck = genanki.Deck(deck_id=anki.decks.DeckId(123457), name="foodeck")
+    note = genanki.Note(model=TEST_CN_MODEL, fields=TEST_CN_MODEL.model_spec.fields(Traditional="中國", Simplified="中国", English="China"), guid="foo")
+    note.cards[0].ivl = 30
+    note.cards[0].ease = 2300
+    note.cards[0].due = 5
+    deck.add_note(note)
+
+    with tempfile.NamedTemporaryFile(delete=True, delete_on_close=False, suffix=".apkg") as tmpfile:
+        genanki.Package(deck).write_to_file(tmpfile.name)
+
+        with new_anki_collection() as col:
+            import_package(col, tmpfile.name)
+
+            [review] = col.find_cards("is:review")
+            card = col.get_card(review)
+            assert (card.ivl, card.factor, card.due) == (30, 2300, col.sched.today + 5)
+            assert len(col.find_cards("is:new")) == 1
+
+
 def test_deck_with_description():
     deck = genanki.Deck(
         deck_id=anki.decks.DeckId(112233),
@@ -0,0 +1,37 @@
+from pathlib import Path
+
+import genanki
+from genanki.loader import PackageLoader, load_package
+
+from tests.test_deck import qa_note
+from tests.test_diff import write_package
+
+
+def test_lazy_notes(tmp_path: Path):
+    tagged = qa_note("q1", "a1")
+    tagged.tags = ["verb"]
+    path = write_package(tmp_path / "deck.apkg", tagged, qa_note("q2", "a2"))
+
+    with PackageLoader(path) as loader:
+        [model] = loader.models.values()
+        assert model.name == "QA"
+        assert [f["name"] for f in model.fields] == ["Question", "Answer"]
+
+        notes = list(loader.notes())
+        assert [note.guid for note in notes] == [tagged.guid, qa_note("q2", "a2").guid]
+        # nothing is decoded until the fields are accessed
+        assert all(note._fields is None for note in notes)
+        assert [note.guid for note in notes if "verb" in note.tags] == [tagged.guid]
+        assert notes[0].fields.values() == ("q1", "a1")
+
+
+def test_round_trip(tmp_path: Path):
+    path = write_package(tmp_path / "deck.apkg", qa_note("q1", "a1"), qa_note("q2", "a2"))
+
+    [deck] = load_package(path)
+    assert deck.name == "Diff"
+    assert [note.fields.values() for note in deck.notes] == [("q1", "a1"), ("q2", "a2")]
+
+    genanki.Package(deck).write_to_file(str(tmp_path / "again.apkg"))
+    with PackageLoader(tmp_path / "again.apkg") as loader:
+        assert [note.values for note in loader.notes()] == [["q1", "a1"], ["q2", "a2"]]
@@ -0,0 +1,98 @@
+import io
+from pathlib import Path
+
+import pytest
+
+import genanki
+from genanki.cache import package_key
+from genanki.media import MediaFile, MissingMediaWarning, media_references, scan_media_references
+from genanki.reader import ApkgReader
+
+from tests.test_deck import qa_note
+
+
+def test_media_references():
+    text = (
+        '<img alt="x" src="a&amp;b.jpg"> <IMG SRC=c.png> [sound:s.mp3] <audio src=\'d.ogg\'></audio> '
+        'url("_font.ttf") url(https://example.com/x.png) <img src="data:image/png;base64,AAAA"> <img src="{{Image}}">'
+    )
+
+    assert media_references(text) == {"a&b.jpg", "c.png", "s.mp3", "d.ogg", "_font.ttf"}
+
+
+def test_scan_in_parallel():
+    values = [f'<img src="{i}.jpg">' for i in range(100)]
+
+    assert scan_media_references(values, max_workers=2, chunk_size=10) == {f"{i}.jpg" for i in range(100)}
+
+
+def test_media_root(tmp_path: Path):
+    root = tmp_path / "media"
+    root.mkdir()
+    for name in ["used.jpg", "unused.jpg"]:
+        (root / name).write_bytes(name.encode())
+    (tmp_path / "listed.mp3").write_bytes(b"listed")
+    (tmp_path / "dropped.mp3").write_bytes(b"dropped")
+
+    deck = genanki.Deck(name="Media")
+    deck.add_note(qa_note('<img src="used.jpg">', "[sound:listed.mp3] [sound:missing.mp3]"))
+    package = genanki.Package(
+        deck, media_files=[str(tmp_path / "listed.mp3"), str(tmp_path / "dropped.mp3")], media_root=root,
+    )
+    with pytest.warns(MissingMediaWarning, match="missing.mp3"):
+        package.write_to_file(str(tmp_path / "deck.apkg"))
+
+    with ApkgReader(tmp_path / "deck.apkg") as reader:
+        assert [entry.filename for entry in reader.media()] == ["listed.mp3", "used.jpg"]
+
+
+def test_media_from_memory(tmp_path: Path):
+    opened: list[io.BytesIO] = []
+
+    def synthesize() -> io.BytesIO:
+        opened.append(io.BytesIO(b"audio"))
+        return opened[-1]
+
+    stream = io.BytesIO(b"stream")
+    media = [MediaFile("gen.mp3", synthesize), MediaFile("s.ogg", stream), MediaFile("b.png", b"png")]
+    deck = genanki.Deck(name="Media")
+    deck.add_note(qa_note("[sound:gen.mp3] [sound:s.ogg]", '<img src="b.png">'))
+    genanki.Package(deck, media_files=media).write_to_file(str(tmp_path / "deck.apkg"))
+
+    # each source is read once: the function is called when the file is written, and the stream it opened closed
+    assert len(opened) == 1 and opened[0].closed
+    assert not stream.closed
+    with ApkgReader(tmp_path / "deck.apkg") as reader:
+        contents = {}
+        for entry in reader.media():
+            with reader.open_media(entry) as fp:
+                contents[entry.filename] = fp.read()
+    assert contents == {"gen.mp3": b"audio", "s.ogg": b"stream", "b.png": b"png"}
+
+
+class _UnseekableStream(io.BytesIO):
+    def seekable(self) -> bool:
+        return False
+
+
+def test_stream_media_written_twice(tmp_path: Path):
+    deck = genanki.Deck(name="Media")
+    deck.add_note(qa_note("[sound:s.ogg]"))
+    package = genanki.Package(deck, media_files=[MediaFile("s.ogg", io.BytesIO(b"stream"))])
+    for name in ("first.apkg", "second.apkg"):
+        package.write_to_file(str(tmp_path / name))
+        with ApkgReader(tmp_path / name) as reader, reader.open_media(reader.media()[0]) as fp:
+            assert fp.read() == b"stream"
+
+    package.media_files = [MediaFile("s.ogg", _UnseekableStream(b"stream"))]
+    package.write_to_file(str(tmp_path / "third.apkg"))
+    with pytest.raises(ValueError, match="already read"):
+        package.write_to_file(str(tmp_path / "fourth.apkg"))
+
+def test_stream_media_needs_key_to_cache():
+    package = genanki.Package(genanki.Deck(name="Media"), media_files=[MediaFile("gen.mp3", io.BytesIO(b"audio"))])
+    with pytest.raises(ValueError, match="needs a key"):
+        package_key(package)
+
+    keyed = genanki.Package(genanki.Deck(name="Media"), media_files=[MediaFile("gen.mp3", io.BytesIO(), key="v1")])
+    assert package_key(keyed) != package_key(genanki.Package(genanki.Deck(name="Media")))
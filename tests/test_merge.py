@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import pytest
+
+import genanki
+from genanki.media import MediaFile, media_references
+from genanki.merge import MergePolicy, merge_packages
+from genanki.reader import ApkgReader
+
+from tests.test_deck import qa_note
+from tests.test_diff import write_package
+
+
+@pytest.mark.parametrize(("policy", "answer"), [(MergePolicy.FIRST, "old"), (MergePolicy.LAST, "new")])
+def test_merge(tmp_path: Path, policy: MergePolicy, answer: str):
+    a = write_package(tmp_path / "a.apkg", qa_note("shared", "old"), qa_note("only a"))
+    b = write_package(tmp_path / "b.apkg", qa_note("shared", "new"), qa_note("only b"))
+
+    merge_packages(tmp_path / "out.apkg", [a, b], policy=policy, batch_size=1)
+
+    with ApkgReader(tmp_path / "out.apkg") as reader:
+        notes = {note.fields[0]: note for note in reader.notes()}
+        assert sorted(notes) == ["only a", "only b", "shared"]
+        assert notes["shared"].fields[1] == answer
+        assert reader.count("cards") == 3
+        # both packages use the same model, so it's shared rather than copied
+        assert [notetype["name"] for notetype in reader.notetypes()] == ["QA"]
+        assert len({note.mid for note in notes.values()}) == 1
+
+
+def media_contents(reader: ApkgReader) -> dict[str, bytes]:
+    contents = {}
+    for entry in reader.media():
+        with reader.open_media(entry) as fp:
+            contents[entry.filename] = fp.read()
+    return contents
+
+
+def test_merge_media(tmp_path: Path):
+    packages = [
+        ("a", {"shared.mp3": b"a", "_font.ttf": b"f"}),
+        ("b", {"shared.mp3": b"b", "b.mp3": b"b", "_font.ttf": b"f"}),
+    ]
+    for name, media in packages:
+        deck = genanki.Deck(name=name, notes=[qa_note(name, "[sound:shared.mp3]")])
+        media_files = [MediaFile(filename, data) for filename, data in media.items()]
+        genanki.Package(deck, media_files=media_files).write_to_file(str(tmp_path / f"{name}.apkg"))
+
+    merge_packages(tmp_path / "out.apkg", [tmp_path / "a.apkg", tmp_path / "b.apkg"], policy=MergePolicy.LAST)
+
+    with ApkgReader(tmp_path / "out.apkg") as reader:
+        contents = media_contents(reader)
+        # each note still plays its own package's file, and each content is stored once
+        assert {note.fields[0]: contents[media_references(note.fields[1]).pop()] for note in reader.notes()} == {
+            "a": b"a", "b": b"b",
+        }
+    assert contents == {"shared.mp3": b"a", "b.mp3": b"b", "_font.ttf": b"f"}
+
+
+def test_merge_media_name_clash(tmp_path: Path):
+    for name in ("a", "b"):
+        deck = genanki.Deck(name=name, notes=[qa_note(name, '<img src="a.png">')])
+        package = genanki.Package(deck, media_files=[MediaFile("a.png", name.encode())])
+        package.write_to_file(str(tmp_path / f"{name}.apkg"))
+
+    merge_packages(tmp_path / "out.apkg", [tmp_path / "a.apkg", tmp_path / "b.apkg"])
+
+    with ApkgReader(tmp_path / "out.apkg") as reader:
+        contents = media_contents(reader)
+        assert len(contents) == 2
+        assert {note.fields[0]: contents[media_references(note.fields[1]).pop()] for note in reader.notes()} == {
+            "a": b"a", "b": b"b",
+        }
+
+
+def test_merge_rejects_legacy_packages(tmp_path: Path):
+    from tests.test_reader import write_legacy_package
+
+    with pytest.raises(ValueError, match="legacy format"):
+        merge_packages(tmp_path / "out.apkg", [write_legacy_package(tmp_path)])
@@ -59,3 +59,41 @@ def test_model():
         "name": "front_back",
         "qfmt": "{{Front}}",
     }).items()
+
+
+def test_stable_id():
+    m = model.VirtualModel(name="A Model", model_spec=MSpec)
+    restyled = model.VirtualModel(name="A Model", model_spec=MSpec, css=".card { color: red }")
+    renamed = model.VirtualModel(name="Another Model", model_spec=MSpec)
+
+    assert (1 << 30) <= m.stable_id < (1 << 31)
+    # only the name, fields and templates make a different notetype
+    assert m.stable_id == restyled.stable_id != renamed.stable_id
+
+
+def test_values_accessor():
+    spec1 = MSpec.fields(Front="Front", Back="Back")
+
+    assert spec1.values() == ("Front", "Back")
+
+    spec1.Back = "Changed"
+    assert spec1.values() == ("Front", "Changed")
+
+
+def test_values_accessor_single_field():
+    @model.spec
+    class fields(model.FieldSpec):
+        Only: str = model.field()
+
+    assert fields(Only="x").values() == ("x",)
+
+
+def test_frozen_spec():
+    @model.spec(frozen=True)
+    class fields(model.FieldSpec):
+        Front: str = model.field()
+        Back: str = model.field()
+
+    assert fields.__genanki_frozen__
+    assert not MSpec.fields.__genanki_frozen__
+    assert fields(Front="a", Back="b").values() == ("a", "b")
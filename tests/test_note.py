@@ -1,4 +1,6 @@
+import gc
 import itertools
+import pickle
 import tempfile
 import textwrap
 import time
@@ -14,6 +16,8 @@ import pytest
 import genanki
 from genanki import builtin_models
 from genanki import model
+from genanki import note as note_module
+from genanki.note import Tag, check_invalid_html_tags, decode_notes, encode_notes
 from genanki.util import guid_for
 
 
@@ -130,6 +134,36 @@ class TestTags:
             n.tags.insert(0, "nerf joker pls")
 
 
+    def test_interned(self):
+        a = NoteSubclassWithGuid(
+            model=builtin_models.BASIC_MODEL,
+            fields=MyModelSpec.fields(Question="foo", Answer="bar"),
+            tags=["foo", "bar"],
+        )
+        b = NoteSubclassWithGuid(
+            model=builtin_models.BASIC_MODEL,
+            fields=MyModelSpec.fields(Question="baz", Answer="qux"),
+            tags=["bar"],
+        )
+
+        assert a._tags == (Tag("foo"), Tag("bar"))
+        assert a.tags[1] is b.tags[0]
+        assert a.tags == ["foo", "bar"]
+        assert a._format_tags() == " foo bar "
+
+    def test_released_when_unused(self):
+        note = NoteSubclassWithGuid(
+            model=builtin_models.BASIC_MODEL,
+            fields=MyModelSpec.fields(Question="foo", Answer="bar"),
+            tags=["only-on-this-note"],
+        )
+        assert "only-on-this-note" in note_module._TAG_TABLE
+
+        del note
+        gc.collect()
+        assert "only-on-this-note" not in note_module._TAG_TABLE
+
+
 class QuestionAnswerExtraModelSpec(model.ModelSpec[Any]):
     @model.spec
     class fields(model.FieldSpec):
@@ -255,6 +289,22 @@ class TestFindInvalidHtmlTagsInField:
         )
 
 
+    def test_ng_no_closing_bracket(self):
+        assert genanki.Note._find_invalid_html_tags_in_field("<$ <a b <c") == []
+
+    def test_ok_long_line(self):
+        # the old regex rescanned to the end of the line for every "<" here
+        assert genanki.Note._find_invalid_html_tags_in_field("<a " * 20000) == []
+
+    def test_cache_keeps_digests_not_fields(self):
+        with mock.patch.object(note_module, "_INVALID_HTML_TAGS_CACHE_SIZE", 2):
+            for i in range(3):
+                genanki.Note._find_invalid_html_tags_in_field(f"<b>{i}</b>" * 1000)
+
+        assert len(note_module._invalid_html_tags_cache) <= 2
+        assert all(len(key) == 16 for key in note_module._invalid_html_tags_cache)
+
+
 class SimpleModelSpec(model.ModelSpec[Any]):
     @model.spec
     class fields(model.FieldSpec):
@@ -359,3 +409,146 @@ def test_furigana_field():
 
         pkg.write_to_file(tempf.name)
         # test passes if there is no exception
+
+
+class FrozenModelSpec(model.ModelSpec[Any]):
+    @model.spec(frozen=True)
+    class fields(model.FieldSpec):
+        Question: str = model.field()
+        Answer: str = model.field()
+
+    @model.spec
+    class templates(model.TemplateSpec[fields], fields=fields):
+        card1: str = model.template({
+            "qfmt": "{{Question}}",
+            "afmt": '{{FrontSide}}<hr id="answer">{{Answer}}',
+        })
+
+
+def test_frozen_field_values_are_cached():
+    frozen_model = genanki.Model(name="Frozen Model", model_spec=FrozenModelSpec)
+
+    n = genanki.Note(model=frozen_model, fields=FrozenModelSpec.fields(Question="a", Answer="b"))
+    assert n._values == ("a", "b")
+    assert n._format_fields() == "a\x1fb"
+
+    n.fields = FrozenModelSpec.fields(Question="c", Answer="d")
+    assert n._format_fields() == "c\x1fd"
+
+
+class TestGuidStrategy:
+    def make_note(self, strategy: Any):
+        m = genanki.Model(name="Simple Model", model_spec=SimpleModelSpec, guid_strategy=strategy)
+        return genanki.Note(model=m, fields=SimpleModelSpec.fields(Question="Capital of Iowa", Answer="Des Moines"))
+
+    def test_repr_is_default(self):
+        n = genanki.Note(model=my_model, fields=MyModelSpec.fields(Question="a", Answer="b"))
+        assert n.guid == guid_for(n.fields)
+
+    def test_values(self):
+        assert self.make_note(genanki.GuidStrategy.VALUES).guid == guid_for("Capital of Iowa", "Des Moines")
+        assert self.make_note("values").guid == guid_for("Capital of Iowa", "Des Moines")
+
+    def test_key_fields(self):
+        assert self.make_note(("Question",)).guid == guid_for("Capital of Iowa")
+
+    def test_unknown_key_field(self):
+        with pytest.raises(ValueError):
+            self.make_note(("Nope",))
+
+    def test_callable(self):
+        assert self.make_note(lambda fields: fields.Answer.upper()).guid == "DES MOINES"
+
+    def test_cached_until_fields_change(self):
+        m = genanki.Model(name="Frozen Model", model_spec=FrozenModelSpec, guid_strategy=genanki.GuidStrategy.VALUES)
+        n = genanki.Note(model=m, fields=FrozenModelSpec.fields(Question="Capital of Iowa", Answer="Des Moines"))
+        assert n._guid_cache is None
+        assert n.guid == n._guid_cache
+
+        n.fields = FrozenModelSpec.fields(Question="Capital of Ohio", Answer="Columbus")
+        assert n._guid_cache is None
+        assert n.guid == guid_for("Capital of Ohio", "Columbus")
+
+    def test_not_cached_for_mutable_fields(self):
+        n = self.make_note(genanki.GuidStrategy.VALUES)
+        assert n.guid == guid_for("Capital of Iowa", "Des Moines")
+
+        n.fields.Question = "Capital of Ohio"
+        assert n.guid == guid_for("Capital of Ohio", "Des Moines")
+
+
+class TestHtmlValidation:
+    def make_model(self, policy: genanki.HtmlValidation | str):
+        return genanki.Model(name="Simple Model", model_spec=SimpleModelSpec, html_validation=policy)
+
+    def test_off(self):
+        genanki.Note(model=self.make_model("off"), fields=SimpleModelSpec.fields(Question="<$>", Answer=""))
+
+    def test_deferred(self):
+        deferred = self.make_model(genanki.HtmlValidation.DEFERRED)
+        ok = genanki.Note(model=deferred, fields=SimpleModelSpec.fields(Question="<b>ok</b>", Answer=""))
+        bad = genanki.Note(model=deferred, fields=SimpleModelSpec.fields(Question="Capital of <$> Argentina", Answer=""))
+
+        check_invalid_html_tags([ok])
+        with pytest.raises(ValueError, match="^Field contained the following invalid HTML tags.*<\\$>$"):
+            check_invalid_html_tags([ok, bad], max_workers=2, chunk_size=1)
+
+    def test_deferred_on_write(self):
+        deferred = self.make_model(genanki.HtmlValidation.DEFERRED)
+        deck = genanki.Deck(deck_id=DECK_ID, name="Deferred")
+        deck.add_note(genanki.Note(model=deferred, fields=SimpleModelSpec.fields(Question="<$>", Answer="")))
+
+        with tempfile.NamedTemporaryFile(delete=True, delete_on_close=False) as tempf:
+            with pytest.raises(ValueError):
+                genanki.Package(deck).write_to_file(tempf.name)
+
+
+def _questions(notes: list[genanki.Note[Any]]) -> list[str]:
+    return [note.fields.Question for note in notes]
+
+
+class TestWire:
+    def test_round_trip(self):
+        genanki.register_models(my_model)
+        note = genanki.Note(
+            model=my_model,
+            fields=MyModelSpec.fields(Question="q", Answer="a"),
+            tags=["foo"],
+            guid="explicit",
+            due=3,
+        )
+
+        [decoded] = decode_notes(encode_notes([note]))
+
+        assert decoded.model is my_model
+        assert decoded.fields == note.fields
+        assert decoded.tags == ["foo"]
+        assert (decoded.guid, decoded.due, decoded.sort_field) == ("explicit", 3, note.sort_field)
+
+    def test_pickle_is_compact(self):
+        note = NoteSubclassWithGuid(model=my_model, fields=MyModelSpec.fields(Question="q", Answer="a"))
+        genanki.register_models(my_model)
+
+        unpickled = pickle.loads(pickle.dumps(note))
+
+        assert type(unpickled) is NoteSubclassWithGuid
+        assert unpickled.model is my_model
+        assert unpickled.guid == note.guid
+        # the model isn't pickled along with the note
+        assert my_model.name.encode() not in pickle.dumps(note)
+
+    def test_pickle_keeps_card_scheduling(self):
+        note = genanki.Note(model=my_model, fields=MyModelSpec.fields(Question="q", Answer="a"))
+        note.cards[0].suspend = True
+        note.cards[0].ivl = 3
+        genanki.register_models(my_model)
+
+        unpickled = pickle.loads(pickle.dumps(note))
+
+        assert unpickled.cards == note.cards
+
+    def test_process_pool(self):
+        notes = [genanki.Note(model=my_model, fields=MyModelSpec.fields(Question=str(i), Answer="")) for i in range(10)]
+
+        with genanki.note_process_pool([my_model], max_workers=2) as pool:
+            assert list(pool.map(_questions, [notes[:5], notes[5:]])) == [_questions(notes[:5]), _questions(notes[5:])]
@@ -0,0 +1,81 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+import genanki
+from genanki.media import rename_media_references
+from genanki.optimize import CommandEncoder, ImageEncoder, MediaOptimizer
+from genanki.reader import ApkgReader
+
+from tests.test_deck import qa_note
+
+# stands in for a real encoder like ffmpeg: keeps the first half of the file
+_HALVE_SCRIPT = "import sys; data = open(sys.argv[1], 'rb').read(); open(sys.argv[2], 'wb').write(data[:len(data) // 2])"
+HALVE = CommandEncoder(
+    extensions=(".wav",), extension=".mp3", command=(sys.executable, "-c", _HALVE_SCRIPT, "{input}", "{output}"),
+)
+
+
+def test_rename_media_references():
+    text = '<img src="a.png"> [sound:b.wav] <img src=\'c.png\'> url(a.png)'
+
+    assert rename_media_references(text, {"a.png": "a.webp", "b.wav": "b.mp3"}) == (
+        '<img src="a.webp"> [sound:b.mp3] <img src=\'c.png\'> url(a.webp)'
+    )
+
+
+def test_optimize_and_cache(tmp_path: Path):
+    (tmp_path / "a.wav").write_bytes(b"x" * 1000)
+    (tmp_path / "_font.wav").write_bytes(b"x" * 1000)
+    optimizer = MediaOptimizer(encoders=[HALVE], cache_dir=tmp_path / "cache")
+
+    paths, renames = optimizer.optimize([str(tmp_path / "a.wav"), str(tmp_path / "_font.wav")], max_workers=2)
+
+    assert renames == {"a.wav": "a.mp3"}
+    assert Path(paths[0]).name == "a.mp3" and Path(paths[0]).stat().st_size == 500
+    assert paths[1] == str(tmp_path / "_font.wav")
+    # a second run is served from the cache
+    assert optimizer.optimize([str(tmp_path / "a.wav")]) == ([paths[0]], renames)
+
+
+def test_new_name_clash(tmp_path: Path):
+    (tmp_path / "a.wav").write_bytes(b"x" * 1000)
+    (tmp_path / "a.mp3").write_bytes(b"x")
+    optimizer = MediaOptimizer(encoders=[HALVE], cache_dir=tmp_path / "cache")
+
+    assert optimizer.optimize([str(tmp_path / "a.wav"), str(tmp_path / "a.mp3")])[1] == {}
+
+
+def test_keep_names(tmp_path: Path):
+    (tmp_path / "a.wav").write_bytes(b"x" * 1000)
+    (tmp_path / "b.wav").write_bytes(b"x" * 1000)
+    optimizer = MediaOptimizer(encoders=[HALVE], cache_dir=tmp_path / "cache")
+
+    paths, renames = optimizer.optimize([str(tmp_path / "a.wav"), str(tmp_path / "b.wav")], keep_names={"b.wav"})
+
+    assert renames == {"a.wav": "a.mp3"}
+    assert paths[1] == str(tmp_path / "b.wav")
+
+def test_image_encoder(tmp_path: Path):
+    image = pytest.importorskip("PIL.Image")
+    image.new("RGB", (800, 600), "red").save(tmp_path / "big.png")
+    optimizer = MediaOptimizer(encoders=[ImageEncoder(max_size=100, format="jpg")], cache_dir=tmp_path / "cache")
+
+    [path], renames = optimizer.optimize([str(tmp_path / "big.png")])
+
+    assert renames == {"big.png": "big.jpg"}
+    with image.open(path) as encoded:
+        assert encoded.size == (100, 75)
+
+
+def test_package_rewrites_fields(tmp_path: Path):
+    (tmp_path / "a.wav").write_bytes(b"x" * 1000)
+    deck = genanki.Deck(name="Optimize")
+    deck.add_note(qa_note("[sound:a.wav]"))
+    optimizer = MediaOptimizer(encoders=[HALVE], cache_dir=tmp_path / "cache")
+    genanki.Package(deck, media_root=tmp_path, media_optimizer=optimizer).write_to_file(str(tmp_path / "deck.apkg"))
+
+    with ApkgReader(tmp_path / "deck.apkg") as reader:
+        assert [note.fields[0] for note in reader.notes()] == ["[sound:a.mp3]"]
+        assert [(entry.filename, entry.size) for entry in reader.media()] == [("a.mp3", 500)]
@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+import sqlite3
+import zipfile
+
+import genanki
+from genanki.apkg_col import APKG_COL
+from genanki.apkg_schema import APKG_SCHEMA
+from genanki.reader import ApkgReader, MediaEntry
+
+from tests.test_deck import QA_MODEL, qa_note
+
+
+def test_read_written_package(tmp_path: Path):
+    deck = genanki.Deck(name="Reader")
+    for i in range(5):
+        deck.add_note(qa_note(f"q{i}", f"a{i}"))
+    genanki.Package(deck).write_to_file(str(tmp_path / "out.apkg"))
+
+    with ApkgReader(tmp_path / "out.apkg", fetch_size=2) as reader:
+        assert reader.collection_name == "collection.anki21b"
+        assert [note.fields for note in reader.notes()] == [[f"q{i}", f"a{i}"] for i in range(5)]
+        assert reader.count("cards") == 5
+        assert QA_MODEL.name in [notetype["name"] for notetype in reader.notetypes()]
+        assert "Reader" in [d["name"] for d in reader.decks()]
+
+
+def write_legacy_package(tmp_path: Path) -> Path:
+    """A package in the format of Anki before 2.1.50, with one note and one media file."""
+    conn = sqlite3.connect(tmp_path / "collection.anki2")
+    conn.executescript(APKG_SCHEMA)
+    conn.executescript(APKG_COL)
+    conn.execute("INSERT INTO notes VALUES (1, 'guid', 5, 0, 0, ' a b ', 'front\x1fback', '', 0, 0, '')")
+    conn.commit()
+    conn.close()
+
+    with zipfile.ZipFile(tmp_path / "legacy.apkg", "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.write(tmp_path / "collection.anki2", "collection.anki2")
+        zip_file.writestr("media", json.dumps({"0": "dog.jpg"}))
+        zip_file.writestr("0", b"woof")
+
+    return tmp_path / "legacy.apkg"
+
+
+def test_read_legacy_package(tmp_path: Path):
+    with ApkgReader(write_legacy_package(tmp_path)) as reader:
+        [note] = reader.notes()
+        assert (note.guid, note.tags, note.fields) == ("guid", ["a", "b"], ["front", "back"])
+        assert [d["name"] for d in reader.decks()] == ["Default"]
+
+        [entry] = reader.media()
+        assert entry == MediaEntry(member="0", filename="dog.jpg")
+        with reader.open_media(entry) as fp:
+            assert fp.read() == b"woof"
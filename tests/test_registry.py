@@ -0,0 +1,106 @@
+from pathlib import Path
+import time
+from typing import Any
+
+import genanki
+from genanki.reader import ApkgReader
+from genanki.store import NoteStore
+
+from tests.test_deck import QA_MODEL, QAModelSpec, qa_note
+
+
+def build(
+    path: Path, registry: Path, *notes: genanki.Note, batch: genanki.NoteBatch | None = None,
+    store: NoteStore | None = None,
+):
+    policy = genanki.DuplicatePolicy.RAISE if store is not None else genanki.DuplicatePolicy.ALLOW
+    deck = genanki.Deck(name="Registry", store=store, duplicate_policy=policy)
+    for note in notes:
+        deck.add_note(note)
+    if batch is not None:
+        deck.add_batch(batch)
+    genanki.Package(deck).write_to_file(str(path), registry=registry)
+
+    with ApkgReader(path) as reader:
+        return (
+            {note.fields[0]: (note.guid, note.id) for note in reader.notes()},
+            sorted(reader.conn.execute("SELECT id, nid, ord FROM cards").fetchall()),
+            {deck["name"]: deck["id"] for deck in reader.decks()},
+            {notetype["name"]: notetype["id"] for notetype in reader.notetypes()},
+        )
+
+
+def keyed_note(question: str, key: str) -> genanki.Note:
+    return genanki.Note(model=QA_MODEL, fields=QAModelSpec.fields(Question=question, Answer=""), source_key=key)
+
+
+def test_ids_are_stable(tmp_path: Path):
+    registry = tmp_path / "ids.db"
+    batch = genanki.NoteBatch(model=QA_MODEL, columns={"Question": ["b1", "b2"], "Answer": ["", ""]}, keys=["r1", "r2"])
+    notes, cards, decks, notetypes = build(tmp_path / "1.apkg", registry, qa_note("a"), batch=batch)
+    again = build(tmp_path / "2.apkg", registry, qa_note("a"), batch=batch)
+
+    assert again == (notes, cards, decks, notetypes)
+    with genanki.IdRegistry(registry) as ids:
+        assert len(ids) == 3
+
+
+def test_source_key_keeps_guid(tmp_path: Path):
+    registry = tmp_path / "ids.db"
+    before, _, _, _ = build(tmp_path / "1.apkg", registry, keyed_note("old", "row-1"))
+    after, _, _, _ = build(tmp_path / "2.apkg", registry, keyed_note("new", "row-1"), qa_note("added"))
+
+    assert after["new"] == before["old"]
+    assert after["added"][0] == qa_note("added").guid
+
+
+def test_source_keys_through_store(tmp_path: Path):
+    registry = tmp_path / "ids.db"
+
+    def build_stored(path: Path, suffix: str):
+        batch = genanki.NoteBatch(model=QA_MODEL, columns={"Question": ["b" + suffix], "Answer": [""]}, keys=["row-2"])
+        with NoteStore() as store:
+            notes, cards, _, _ = build(path, registry, keyed_note("a" + suffix, "row-1"), batch=batch, store=store)
+        return {question[0]: ids for question, ids in notes.items()}, cards
+
+    before = build_stored(tmp_path / "1.apkg", "-old")
+    after = build_stored(tmp_path / "2.apkg", "-new")
+
+    assert after == before
+    with genanki.IdRegistry(registry) as ids:
+        assert len(ids) == 2
+
+
+def notetype_mtime(path: Path) -> int:
+    with ApkgReader(path) as reader:
+        [(mtime,)] = reader.conn.execute("SELECT mtime_secs FROM notetypes WHERE name = 'QA'")
+        return mtime
+
+
+def test_notetype_added_once(tmp_path: Path):
+    decks = [genanki.Deck(name="One"), genanki.Deck(name="Two")]
+    decks[0].add_note(qa_note("one"))
+    decks[1].add_note(qa_note("two"))
+    start = int(time.time())
+    genanki.Package(decks).write_to_file(str(tmp_path / "deck.apkg"))
+
+    # without a registry, the notetype is as new as the build, so Anki takes its templates and styling
+    assert notetype_mtime(tmp_path / "deck.apkg") >= start
+    with ApkgReader(tmp_path / "deck.apkg") as reader:
+        assert reader.conn.execute("SELECT id FROM notetypes WHERE name = 'QA'").fetchall() == [(QA_MODEL.stable_id,)]
+        assert {note.mid for note in reader.notes()} == {QA_MODEL.stable_id}
+
+
+def test_notetype_mtime_moves_forward_on_change(tmp_path: Path):
+    registry = tmp_path / "ids.db"
+
+    def build(name: str, model: genanki.Model[Any]) -> int:
+        note = genanki.Note(model=model, fields=QAModelSpec.fields(Question="q", Answer=""))
+        deck = genanki.Deck(name="d", notes=[note])
+        genanki.Package(deck).write_to_file(str(tmp_path / name), registry=registry)
+        return notetype_mtime(tmp_path / name)
+
+    first = build("first.apkg", QA_MODEL)
+    assert build("unchanged.apkg", QA_MODEL) == first
+    restyled = genanki.Model(name="QA", model_spec=QAModelSpec, css=".card { color: red }")
+    assert build("restyled.apkg", restyled) > first
@@ -0,0 +1,84 @@
+import json
+from pathlib import Path
+from typing import Any
+
+import genanki
+from genanki import model
+from genanki.bin import preview
+from genanki.render import NoteToRender, RenderedCard, render_cards
+
+from tests.test_cloze import MY_CLOZE_MODEL
+from tests.test_deck import QA_MODEL, qa_note
+from tests.test_diff import write_package
+
+
+def test_front_back():
+    deck = genanki.Deck(name="Vocab::Verbs")
+    deck.add_note(qa_note("<b>hablar</b>", "to speak"))
+
+    assert list(genanki.Package(deck).render_cards()) == [
+        RenderedCard(
+            guid=qa_note("<b>hablar</b>").guid,
+            deck="Vocab::Verbs",
+            model="QA",
+            template="card1",
+            ord=0,
+            question="<b>hablar</b>",
+            answer='<b>hablar</b><hr id="answer">to speak',
+        ),
+    ]
+
+
+def test_empty_question_makes_no_card():
+    assert list(render_cards([NoteToRender(QA_MODEL, "guid", "d", [], ["", "answer"])])) == []
+
+
+def test_cloze():
+    text = "{{c1::Paris::city}} is in {{c2::France}}"
+    cards = render_cards([NoteToRender(MY_CLOZE_MODEL, "guid", "d", [], [text, "x"])])
+
+    assert [(card.ord, card.question, card.answer) for card in cards] == [
+        (0, '<span class="cloze">[city]</span> is in France', '<span class="cloze">Paris</span> is in France<br>x'),
+        (1, 'Paris is in <span class="cloze">[...]</span>', 'Paris is in <span class="cloze">France</span><br>x'),
+    ]
+
+
+class HintModelSpec(model.ModelSpec[Any]):
+    @model.spec
+    class fields(model.FieldSpec):
+        Question: str = model.field()
+        Answer: str = model.field()
+
+    @model.spec
+    class templates(model.TemplateSpec[fields], fields=fields):
+        card1: str = model.template({"qfmt": "{{Question}}{{hint:Answer}}", "afmt": "{{Answer}}"})
+
+
+def test_hint():
+    hint_model = genanki.Model(name="Hint", model_spec=HintModelSpec)
+    [card] = render_cards([NoteToRender(hint_model, "guid", "d", [], ["q", "<b>a</b>"])])
+
+    assert card.question.startswith('q<a class=hint href="#" onclick=')
+    assert '>Answer</a><div id="hint' in card.question
+    assert card.question.endswith('class=hint style="display: none"><b>a</b></div>')
+
+
+def test_parallel_matches_serial():
+    notes = [NoteToRender(QA_MODEL, str(i), "d", ["tag"], [f"q{i}", f"a{i}"]) for i in range(50)]
+
+    assert list(render_cards(notes, max_workers=2, chunk_size=7)) == list(render_cards(notes))
+
+
+def test_preview_jsonl(tmp_path: Path):
+    package = write_package(tmp_path / "deck.apkg", qa_note("q", "a"))
+    preview.main(package, output=tmp_path / "cards.jsonl")
+
+    [line] = (tmp_path / "cards.jsonl").read_text(encoding="utf-8").splitlines()
+    assert json.loads(line)["question"] == "q"
+
+
+def test_preview_html(tmp_path: Path):
+    package = write_package(tmp_path / "deck.apkg", qa_note("q", "a"))
+    preview.main(package, output=tmp_path / "cards.html")
+
+    assert (tmp_path / "cards.html").read_text(encoding="utf-8").count("<iframe") == 2
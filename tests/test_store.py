@@ -0,0 +1,76 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+import genanki
+from genanki.reader import ApkgReader
+from genanki.store import NoteStore
+
+from tests.test_deck import QA_MODEL, qa_note
+
+
+def test_insertion_order(tmp_path: Path):
+    with NoteStore(tmp_path / "notes.sqlite") as store:
+        deck = genanki.Deck(name="d", store=store, duplicate_policy=genanki.DuplicatePolicy.RAISE)
+        deck.add_note(qa_note("b", "1"))
+        deck.add_batch(genanki.NoteBatch(model=QA_MODEL, columns={"Question": ["a", "c"], "Answer": ["2", "3"]}, tags=["x y", ""]))
+
+        assert deck.notes == []
+        assert [(note.fields, note.tags) for note in store.notes(fetch_size=2)] == [
+            (["b", "1"], []),
+            (["a", "2"], ["x", "y"]),
+            (["c", "3"], []),
+        ]
+
+
+def test_duplicates():
+    with NoteStore() as store:
+        deck = genanki.Deck(name="d", store=store, duplicate_policy=genanki.DuplicatePolicy.RAISE)
+        deck.add_note(qa_note("a", "1"))
+
+        with pytest.raises(ValueError, match="duplicates a note"):
+            deck.add_note(qa_note("a", "2"))
+        with pytest.raises(ValueError, match="already in the store"):
+            deck.add_batch(genanki.NoteBatch(model=QA_MODEL, columns={"Question": ["b", "a"], "Answer": ["", ""]}))
+        assert len(store) == 1
+
+        deck.duplicate_policy = genanki.DuplicatePolicy.REPLACE
+        deck.add_note(qa_note("a", "3"))
+        assert [note.fields for note in store.notes()] == [["a", "3"]]
+
+
+def test_store_rejects_allow():
+    with NoteStore() as store:
+        with pytest.raises(ValueError, match="must be RAISE, SKIP or REPLACE"):
+            genanki.Deck(name="d", store=store)
+
+        deck = genanki.Deck(name="d", store=store, duplicate_policy=genanki.DuplicatePolicy.SKIP)
+        with pytest.raises(ValueError, match="rather than ALLOW"):
+            deck.duplicate_policy = genanki.DuplicatePolicy.ALLOW
+
+
+def test_temporary_file_removed():
+    store = NoteStore()
+    store.add(qa_note("a"))
+    path: Any = store.path
+    store.close()
+
+    assert not Path(path).exists()
+
+
+def test_card_scheduling(tmp_path: Path):
+    note = qa_note("a")
+    note.cards[0].suspend = True
+    note.cards[0].ivl = 3
+
+    with NoteStore() as store:
+        deck = genanki.Deck(name="d", store=store, duplicate_policy=genanki.DuplicatePolicy.RAISE)
+        deck.add_note(note)
+        deck.add_note(qa_note("b"))
+        assert [stored.cards for stored in store.notes()] == [note.cards, None]
+
+        genanki.Package(deck).write_to_file(str(tmp_path / "deck.apkg"))
+
+    with ApkgReader(tmp_path / "deck.apkg") as reader:
+        assert sorted((card.queue, card.ivl) for card in reader.cards()) == [(-1, 3), (0, 0)]
@@ -0,0 +1,44 @@
+import pytest
+
+from genanki.util import field_checksum, guid_for, guid_for_many, strip_html_media
+
+
+# generated by the original, byte-at-a-time implementation of guid_for
+KNOWN_GUIDS = [
+    (("THE NOTE GUID",), "j-Nb}4rY7s"),
+    (("a", "b"), "q/([o$8RAO"),
+    (("Capital of Argentina", "Buenos Aires"), "HSnG{z%dU<"),
+    (("Costa Rica", "San José"), "Gs4!v]Z%E]"),
+    (("", ""), "z+VBQ9+v.E"),
+    ((1, 2.5), "f-,K:Pm9v0"),
+]
+
+
+def test_guid_for_known_values():
+    assert [guid_for(*values) for values, _ in KNOWN_GUIDS] == [guid for _, guid in KNOWN_GUIDS]
+    assert guid_for("a", "b") == guid_for("a__b")
+
+
+@pytest.mark.parametrize("use_numpy", [False, True, None])
+def test_guid_for_many_known_values(use_numpy: bool | None):
+    if use_numpy:
+        pytest.importorskip("numpy")
+
+    assert guid_for_many([values for values, _ in KNOWN_GUIDS], use_numpy=use_numpy) == [
+        guid for _, guid in KNOWN_GUIDS
+    ]
+
+
+def test_guid_for_many_str_rows():
+    assert guid_for_many(["foo", "bar"], use_numpy=False) == [guid_for("foo"), guid_for("bar")]
+
+
+def test_guid_for_many_empty():
+    assert guid_for_many([]) == []
+
+
+def test_field_checksum():
+    # int(sha1("dog").hexdigest()[:8], 16), as stored in Anki's notes.csum
+    assert field_checksum("dog") == 3834974802
+    assert field_checksum("<b>dog</b><!-- comment -->") == field_checksum("dog")
+    assert strip_html_media('<img src="dog.jpg">&amp;&nbsp;') == " dog.jpg & "